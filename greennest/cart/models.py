@@ -5,19 +5,28 @@ from products.models import ProductVariant
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every CartItem add/update/remove (cart/signals.py), part of the priced cart cache key
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"Cart of {self.user.username}"
 
+    def get_pricing(self):
+        """PricedCart for this cart (see cart/pricing.py), computed once per instance."""
+        if getattr(self, "_priced", None) is None:
+            from .pricing import get_priced_cart
+            self._priced = get_priced_cart(self)
+        return self._priced
+
     @property
     def total_price(self):
-        """Sum of cart item prices (with discounts applied in view)."""
-        return sum(getattr(item, "final_total", item.total_price) for item in self.items.all())
+        """Sum of cart item prices, offers applied."""
+        return self.get_pricing().items_total
     
     @property
     def shipping_charge(self):
         """Shipping: Free if subtotal > 500, else ₹50"""
-        return 0 if self.total_price > 500 else 50
+        return self.get_pricing().shipping
     
     @property
     def grand_total(self):
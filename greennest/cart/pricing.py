@@ -0,0 +1,202 @@
+from dataclasses import dataclass, field, replace
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from offer.utils import get_best_offers
+from products.cache import catalog_cache_timeout, catalog_version
+from products.models import ProductVariant, VariantImage
+
+
+# Shipping: free above ₹500 (on the offer price), else ₹50
+FREE_SHIPPING_ABOVE = Decimal("500")
+SHIPPING_CHARGE = Decimal("50")
+
+
+def shipping_for(items_total):
+    return Decimal("0") if items_total > FREE_SHIPPING_ABOVE else SHIPPING_CHARGE
+
+
+@dataclass(frozen=True)
+class PricedLine:
+    # Attribute names match what the cart templates already read from CartItem
+    item: object = field(repr=False, compare=False)
+    quantity: int
+    unit_price: Decimal
+    discounted_price: Decimal
+    final_total: Decimal
+    offer_applied: dict = None
+    is_available: bool = True
+
+    @property
+    def id(self):
+        return self.item.id
+
+    @property
+    def variant(self):
+        return self.item.variant
+
+    @property
+    def variant_id(self):
+        return self.item.variant_id
+
+    @property
+    def savings(self):
+        return (self.unit_price - self.discounted_price) * self.quantity
+
+
+@dataclass(frozen=True)
+class PricedCart:
+    cart_id: int
+    lines: tuple
+    subtotal: Decimal            # before offers
+    offer_discount: Decimal      # saved through product/category offers
+    items_total: Decimal         # after offers, what coupons and shipping are computed on
+    shipping: Decimal
+    coupon: object = None        # only set when it applies to this cart
+    coupon_discount: Decimal = Decimal("0")
+    total: Decimal = Decimal("0")
+    out_of_stock: bool = False
+
+    @property
+    def is_empty(self):
+        return not self.lines
+
+    def line(self, item_id):
+        for line in self.lines:
+            if line.id == item_id:
+                return line
+        return None
+
+
+class CartPricing:
+    """
+    Prices a cart in a fixed number of queries: cart lines (with variant, product,
+    category), their images, and the offers for all of them in one batch.
+    """
+
+    def __init__(self, cart, coupon=None):
+        self.cart = cart
+        self.coupon = coupon
+
+    def load_items(self):
+        return list(
+            self.cart.items.select_related("variant__product__category")
+            .prefetch_related(Prefetch("variant__images", queryset=VariantImage.objects.order_by("id")))
+            .order_by("id")
+        )
+
+    def price(self, items=None):
+        items = self.load_items() if items is None else items
+        offers = get_best_offers(item.variant for item in items)
+
+        lines = []
+        for item in items:
+            variant = item.variant
+            offer_info = offers.get(variant.id)
+            final_price = offer_info["final_price"] if offer_info else variant.price
+            lines.append(PricedLine(
+                item=item,
+                quantity=item.quantity,
+                unit_price=variant.price,
+                discounted_price=final_price,
+                final_total=final_price * item.quantity,
+                offer_applied=offer_info,
+                is_available=0 < item.quantity <= variant.stock,
+            ))
+        return self.totals(lines)
+
+    def totals(self, lines):
+        """Build the PricedCart (totals, shipping, coupon) for already priced lines."""
+        lines = tuple(lines)
+        subtotal = sum((line.unit_price * line.quantity for line in lines), Decimal("0"))
+        items_total = sum((line.final_total for line in lines), Decimal("0"))
+        shipping = shipping_for(items_total) if lines else Decimal("0")
+
+        coupon, coupon_discount = None, Decimal("0")
+        if self.coupon and self.coupon_applies(self.coupon, items_total):
+            coupon = self.coupon
+            coupon_discount = self.coupon.calculate_discount(items_total)
+
+        return PricedCart(
+            cart_id=self.cart.id,
+            lines=lines,
+            subtotal=subtotal,
+            offer_discount=subtotal - items_total,
+            items_total=items_total,
+            shipping=shipping,
+            coupon=coupon,
+            coupon_discount=coupon_discount,
+            total=items_total + shipping - coupon_discount,
+            out_of_stock=any(not line.is_available for line in lines),
+        )
+
+    @staticmethod
+    def coupon_applies(coupon, items_total):
+        return coupon.is_valid() and items_total >= (coupon.min_order_value or 0)
+
+
+# Priced cart snapshots.
+# The coupon-free PricedCart is cached per (cart, cart version, catalog version): a cart
+# edit bumps Cart.version, a price/offer change bumps the catalog version, and the timeout
+# stops at the next offer start/end. Coupons are applied on top of the snapshot in Python,
+# and stock (which changes with every order) is re-read with one query.
+def _snapshot_key(cart):
+    return f"cart:priced:{cart.id}:{cart.version}:{catalog_version()}"
+
+
+def _with_current_stock(lines):
+    stocks = dict(
+        ProductVariant.objects.filter(id__in=[line.item.variant_id for line in lines]).values_list("id", "stock")
+    )
+    refreshed = []
+    for line in lines:
+        stock = stocks.get(line.item.variant_id, 0)
+        line.variant.stock = stock
+        refreshed.append(replace(line, is_available=0 < line.quantity <= stock))
+    return refreshed
+
+
+def get_cart_snapshot(cart):
+    """(snapshot, created): the cart's coupon-free PricedCart for its current version, priced on a miss."""
+    key = _snapshot_key(cart)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot, False
+    snapshot = CartPricing(cart).price()
+    cache.set(key, snapshot, catalog_cache_timeout())
+    return snapshot, True
+
+
+def get_priced_cart(cart, coupon=None):
+    """CartPricing(cart, coupon).price(), served from the cart's cached snapshot when it is current."""
+    snapshot, created = get_cart_snapshot(cart)
+    lines = snapshot.lines
+    if lines and not created:
+        lines = _with_current_stock(lines)
+    return CartPricing(cart, coupon=coupon).totals(lines)
+
+
+def reprice_line(cart, item, previous, previous_version):
+    """
+    Quantity change on one line: patch that line in `previous` (the snapshot taken at
+    `previous_version`) instead of re-pricing the whole cart, and cache the result under
+    the cart's new version. Anything else (new line, concurrent edit) is priced in full.
+    """
+    if cart.version == previous_version:
+        return previous
+    line = previous.line(item.id)
+    if line is None or cart.version != previous_version + 1:
+        return get_priced_cart(cart)
+
+    line.item.quantity = item.quantity
+    patched = replace(
+        line,
+        quantity=item.quantity,
+        final_total=line.discounted_price * item.quantity,
+        is_available=0 < item.quantity <= item.variant.stock,
+    )
+    snapshot = CartPricing(cart).totals(patched if other.id == item.id else other for other in previous.lines)
+    cache.set(_snapshot_key(cart), snapshot, catalog_cache_timeout())
+    return snapshot
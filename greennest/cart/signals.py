@@ -0,0 +1,18 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Cart, CartItem
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, origin=None, **kwargs):
+    # The whole cart is being deleted (order placed): nothing left to version
+    if isinstance(origin, Cart) or getattr(origin, "model", None) is Cart:
+        return
+    Cart.objects.filter(pk=instance.cart_id).update(version=F("version") + 1)
+    # Keep an already loaded cart in step, so this request does not read the old snapshot
+    if CartItem.cart.is_cached(instance):
+        instance.cart.version += 1
+        instance.cart._priced = None
@@ -1,3 +1,241 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from coupon.models import Coupon
+from offer.index import mark_offer_index_stale
+from offer.models import CategoryOffer, ProductOffer
+from offer.utils import get_best_offers
+from products.cache import bump_catalog_version
+from products.models import Category, Product, ProductVariant
+from users.models import User
+from .models import Cart, CartItem
+from .pricing import CartPricing, get_cart_snapshot, get_priced_cart, reprice_line
+
+
+def old_view_totals(cart, coupon=None):
+    """The totals cart_detail and checkout_payment worked out inline before CartPricing."""
+    items = cart.items.select_related("variant__product")
+    offers = get_best_offers(item.variant for item in items)
+
+    subtotal = total_discount = grand_total = Decimal("0")
+    out_of_stock = False
+    for item in items:
+        variant = item.variant
+        offer_info = offers.get(variant.id)
+        final_price = offer_info["final_price"] if offer_info else variant.price
+        if variant.stock == 0 or item.quantity > variant.stock:
+            out_of_stock = True
+        subtotal += variant.price * item.quantity
+        total_discount += (variant.price - final_price) * item.quantity
+        grand_total += final_price * item.quantity
+
+    shipping = 0 if grand_total > 500 else 50
+    discount = coupon.calculate_discount(grand_total) if coupon and coupon.is_valid() else 0
+    return {
+        "subtotal": subtotal,
+        "offer_discount": total_discount,
+        "items_total": grand_total,
+        "shipping": shipping,
+        "coupon_discount": discount,
+        "total": grand_total + shipping - discount,
+        "out_of_stock": out_of_stock,
+    }
+
+
+class CartPricingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        window = {"start_date": now - timedelta(days=1), "end_date": now + timedelta(days=1)}
+        indoor = Category.objects.create(name="Indoor")
+        outdoor = Category.objects.create(name="Outdoor")
+        fern = Product.objects.create(category=indoor, name="Fern")
+        palm = Product.objects.create(category=indoor, name="Palm")
+        rose = Product.objects.create(category=outdoor, name="Rose")
+        ProductOffer.objects.create(product=fern, discount_percentage=15, **window)
+        CategoryOffer.objects.create(category=indoor, discount_percentage=10, **window)
+
+        cls.fern = ProductVariant.objects.create(product=fern, variant_type="Small", price=Decimal("199.99"), stock=10)
+        cls.palm = ProductVariant.objects.create(product=palm, variant_type="Large", price=Decimal("349.50"), stock=1)
+        cls.rose = ProductVariant.objects.create(product=rose, variant_type="Red", price=Decimal("45.25"), stock=0)
+
+        cls.coupon = Coupon.objects.create(
+            code="GREEN10", discount=10, max_discount_amount=60, min_order_value=100,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+        user = User.objects.create_user(username="shopper", email="shopper@example.com", password="x")
+        cls.cart = Cart.objects.create(user=user)
+
+    def setUp(self):
+        # offers were created in setUpTestData, the in-process index may predate them
+        mark_offer_index_stale()
+
+    def add(self, variant, quantity):
+        CartItem.objects.create(cart=self.cart, variant=variant, quantity=quantity)
+
+    def assertMatchesOldViews(self, coupon=None):
+        priced = CartPricing(Cart.objects.get(pk=self.cart.pk), coupon=coupon).price()
+        expected = old_view_totals(self.cart, coupon)
+        self.assertEqual({name: getattr(priced, name) for name in expected}, expected)
+        return priced
+
+    def test_offers_and_free_shipping(self):
+        self.add(self.fern, 2)
+        self.add(self.palm, 1)
+        priced = self.assertMatchesOldViews()
+        self.assertEqual(priced.shipping, 0)
+        self.assertGreater(priced.offer_discount, 0)
+
+    def test_shipping_charged_at_or_below_500(self):
+        self.add(self.fern, 1)
+        priced = self.assertMatchesOldViews()
+        self.assertEqual(priced.shipping, 50)
+
+    def test_coupon(self):
+        self.add(self.fern, 3)
+        priced = self.assertMatchesOldViews(coupon=self.coupon)
+        self.assertEqual(priced.coupon, self.coupon)
+        self.assertGreater(priced.coupon_discount, 0)
+
+    def test_out_of_stock_lines(self):
+        self.add(self.palm, 2)
+        self.add(self.rose, 1)
+        priced = self.assertMatchesOldViews()
+        self.assertTrue(priced.out_of_stock)
+        self.assertEqual([line.is_available for line in priced.lines], [False, False])
+
+    def test_coupon_below_minimum_order_is_not_applied(self):
+        # The one deliberate difference: the old checkout applied it anyway
+        self.add(self.rose, 1)
+        priced = CartPricing(self.cart, coupon=self.coupon).price()
+        self.assertIsNone(priced.coupon)
+        self.assertEqual(priced.coupon_discount, 0)
+
+    def test_empty_cart(self):
+        priced = CartPricing(self.cart).price()
+        self.assertTrue(priced.is_empty)
+        self.assertEqual((priced.shipping, priced.total), (0, 0))
+
+
+# A private cache: cart ids and versions repeat from one test database to the next
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class PricedCartTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        category = Category.objects.create(name="Indoor")
+        fern = Product.objects.create(category=category, name="Fern")
+        palm = Product.objects.create(category=category, name="Palm")
+        ProductOffer.objects.create(
+            product=fern, discount_percentage=20, start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+        )
+        cls.fern = ProductVariant.objects.create(product=fern, variant_type="Small", price=Decimal("150.00"), stock=10)
+        cls.palm = ProductVariant.objects.create(product=palm, variant_type="Large", price=Decimal("220.50"), stock=4)
+        user = User.objects.create_user(username="shopper", email="shopper@example.com", password="x")
+        cls.cart = Cart.objects.create(user=user)
+        cls.fern_item = CartItem.objects.create(cart=cls.cart, variant=cls.fern, quantity=1)
+        cls.palm_item = CartItem.objects.create(cart=cls.cart, variant=cls.palm, quantity=1)
+
+    def setUp(self):
+        cache.clear()
+        mark_offer_index_stale()
+
+    def current_cart(self):
+        return Cart.objects.get(pk=self.cart.pk)
+
+
+class PricedCartCacheTests(PricedCartTestCase):
+
+    def test_snapshot_is_served_from_the_cache(self):
+        first = get_priced_cart(self.current_cart())
+        cart = self.current_cart()
+        with self.assertNumQueries(1):  # stock only
+            second = get_priced_cart(cart)
+        self.assertEqual(second, first)
+
+    def test_cart_edit_prices_again(self):
+        get_priced_cart(self.current_cart())
+        item = CartItem.objects.get(pk=self.palm_item.pk)
+        item.quantity = 3
+        item.save()
+        priced = get_priced_cart(self.current_cart())
+        self.assertEqual(priced.line(self.palm_item.pk).quantity, 3)
+        self.assertEqual(priced, CartPricing(self.current_cart()).price())
+
+    def test_catalog_change_prices_again(self):
+        get_priced_cart(self.current_cart())
+        # No signals: only the catalog version tells the cache
+        ProductVariant.objects.filter(pk=self.palm.pk).update(price=Decimal("100.00"))
+        self.assertEqual(get_priced_cart(self.current_cart()).line(self.palm_item.pk).unit_price, Decimal("220.50"))
+        bump_catalog_version()
+        self.assertEqual(get_priced_cart(self.current_cart()).line(self.palm_item.pk).unit_price, Decimal("100.00"))
+
+    def test_stock_is_read_on_a_hit(self):
+        get_priced_cart(self.current_cart())
+        ProductVariant.objects.filter(pk=self.palm.pk).update(stock=0)
+        priced = get_priced_cart(self.current_cart())
+        self.assertFalse(priced.line(self.palm_item.pk).is_available)
+        self.assertTrue(priced.out_of_stock)
+
+    def test_coupon_is_applied_on_top_of_the_snapshot(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code="TEN", discount=10, max_discount_amount=100, min_order_value=100,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+        get_priced_cart(self.current_cart())
+        self.assertEqual(
+            get_priced_cart(self.current_cart(), coupon=coupon), CartPricing(self.current_cart(), coupon=coupon).price()
+        )
+
+
+class RepriceLineTests(PricedCartTestCase):
+    # What update_cart_quantity does around a quantity change
+
+    def change(self, item_id, quantity):
+        item = CartItem.objects.select_related("variant").get(pk=item_id)
+        item.quantity = quantity
+        item.save()
+        return item
+
+    def test_patched_totals_match_a_full_price(self):
+        for quantity in (2, 4, 1):  # over the free shipping threshold and back
+            cart = self.current_cart()
+            previous_version = cart.version
+            previous, _ = get_cart_snapshot(cart)
+            item = self.change(self.palm_item.pk, quantity)
+            cart.refresh_from_db(fields=["version"])
+
+            patched = reprice_line(cart, item, previous, previous_version)
+            self.assertEqual(patched, CartPricing(self.current_cart()).price())
+            # and is what the next request is served
+            self.assertEqual(get_cart_snapshot(cart), (patched, False))
+
+    def test_unchanged_cart_keeps_the_snapshot(self):
+        cart = self.current_cart()
+        previous, _ = get_cart_snapshot(cart)
+        item = CartItem.objects.select_related("variant").get(pk=self.palm_item.pk)
+        self.assertIs(reprice_line(cart, item, previous, cart.version), previous)
+
+    def test_concurrent_edit_is_priced_in_full(self):
+        cart = self.current_cart()
+        previous_version = cart.version
+        previous, _ = get_cart_snapshot(cart)
+        # Another tab changed the fern line in between
+        self.change(self.fern_item.pk, 5)
+        item = self.change(self.palm_item.pk, 2)
+        cart.refresh_from_db(fields=["version"])
+        self.assertEqual(cart.version, previous_version + 2)
+
+        with mock.patch("cart.pricing.get_priced_cart", wraps=get_priced_cart) as full:
+            priced = reprice_line(cart, item, previous, previous_version)
+        full.assert_called_once_with(cart)
+        self.assertEqual(priced.line(self.fern_item.pk).quantity, 5)
+        self.assertEqual(priced, CartPricing(self.current_cart()).price())
@@ -6,6 +6,7 @@ from django.http import JsonResponse
 from products.models import ProductVariant
 from wishlist.models import WishlistItem
 from .models import Cart, CartItem
+from .pricing import get_cart_snapshot, get_priced_cart, reprice_line
 
 MAX_QTY_PER_PRODUCT = 5  
 
@@ -49,42 +50,16 @@ def add_to_cart(request, variant_id):
 @never_cache
 def cart_detail(request):
     cart, _ = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
-
-    subtotal = 0
-    total_discount = 0
-    grand_total = 0
-    out_of_stock_items = False  
-
-
-    for item in cart_items:
-        variant = item.variant
-        offer_info = getattr(variant, "best_offer_info", None)  
-        final_price = offer_info["final_price"] if offer_info else variant.price
-
-        item.offer_applied = offer_info
-        item.discounted_price = final_price
-        item.final_total = final_price * item.quantity  
-       
-       
-        if variant.stock == 0 or item.quantity > variant.stock:
-            item.is_available = False
-            out_of_stock_items = True
-        else:
-            item.is_available = True
-
-
-        subtotal += variant.price * item.quantity
-        total_discount += (variant.price - final_price) * item.quantity
-        grand_total += item.final_total
+    priced = get_priced_cart(cart)
 
     context = {
         "cart": cart,
-        "cart_items": cart_items,
-        "subtotal": subtotal,
-        "total_discount": total_discount,
-        "grand_total": grand_total + getattr(cart, "shipping_charge", 0),
-        "out_of_stock_items": out_of_stock_items,
+        "cart_items": priced.lines,
+        "subtotal": priced.subtotal,
+        "total_discount": priced.offer_discount,
+        "shipping": priced.shipping,
+        "grand_total": priced.items_total + priced.shipping,
+        "out_of_stock_items": priced.out_of_stock,
     }
 
     return render(request, "cart/cart_detail.html", context)
@@ -104,7 +79,14 @@ def remove_from_cart(request, item_id):
 @login_required
 @never_cache
 def update_cart_quantity(request, item_id, action):
-    item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    item = get_object_or_404(
+        CartItem.objects.select_related("cart", "variant"), id=item_id, cart__user=request.user
+    )
+    cart = item.cart
+
+    # Snapshot from before the change; only this line gets re-priced below
+    previous_version = cart.version
+    previous, _ = get_cart_snapshot(cart)
 
     if action == "increment" and item.quantity < item.variant.stock and item.quantity < MAX_QTY_PER_PRODUCT:
         item.quantity += 1
@@ -113,32 +95,27 @@ def update_cart_quantity(request, item_id, action):
         item.quantity -= 1
         item.save()
 
-    cart = item.cart
-    cart_items = cart.items.all()
-
-    subtotal = 0
-    total_discount = 0
-    grand_total = 0
-
-    for ci in cart_items:
-        variant = ci.variant
-        offer_info = getattr(variant, "best_offer_info", None)
-        final_price = offer_info["final_price"] if offer_info else variant.price
-
-        subtotal += variant.price * ci.quantity
-        total_discount += (variant.price - final_price) * ci.quantity
-        grand_total += final_price * ci.quantity
+    cart.refresh_from_db(fields=["version"])
+    priced = reprice_line(cart, item, previous, previous_version)
+    line = priced.line(item.id)
 
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        # Patch for the changed line and the cart totals
         return JsonResponse({
             "success": True,
-            "item_id": item.id,
-            "quantity": item.quantity,
-            "item_total": item.quantity * (getattr(item.variant, "best_offer_info", {"final_price": item.variant.price})["final_price"]),
-            "subtotal": subtotal,
-            "total_discount": total_discount,
-            "grand_total": grand_total + getattr(cart, "shipping_charge", 0),
-            "can_increment": item.quantity < item.variant.stock and item.quantity < MAX_QTY_PER_PRODUCT,
+            "version": cart.version,
+            "line": {
+                "item_id": item.id,
+                "quantity": line.quantity,
+                "item_total": line.final_total,
+                "can_increment": item.quantity < item.variant.stock and item.quantity < MAX_QTY_PER_PRODUCT,
+            },
+            "totals": {
+                "subtotal": priced.subtotal,
+                "total_discount": priced.offer_discount,
+                "shipping": priced.shipping,
+                "grand_total": priced.items_total + priced.shipping,
+            },
         })
 
     return redirect("cart_detail")
\ No newline at end of file
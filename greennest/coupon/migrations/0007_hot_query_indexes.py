@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupon', '0006_coupon_is_referral'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='couponusage',
+            index=models.Index(fields=['user', 'used'], name='couponusage_user_used_idx'),
+        ),
+    ]
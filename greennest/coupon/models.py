@@ -59,6 +59,9 @@ class CouponUsage(models.Model):
 
     class Meta:
         unique_together = ("user", "coupon") 
+        indexes = [
+            models.Index(fields=["user", "used"], name="couponusage_user_used_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.coupon.code} ({'used' if self.used else 'not used'})"
@@ -1,3 +1,20 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.utils import timezone
+
+from greennest.testing import ExplainTestCase
+from users.models import User
+from .models import Coupon, CouponUsage
+
+
+class CouponUsageIndexTests(ExplainTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="shopper", email="shopper@example.com", password="x")
+        now = timezone.now()
+        coupon = Coupon.objects.create(code="GREEN10", discount=10, valid_from=now, valid_to=now + timedelta(days=7))
+        CouponUsage.objects.create(user=cls.user, coupon=coupon)
+
+    def test_unused_coupons_of_a_user(self):
+        self.assertUsesIndex(CouponUsage.objects.filter(user=self.user, used=False), "couponusage_user_used_idx")
@@ -4,7 +4,7 @@ from django.views.decorators.cache import never_cache
 from django.utils import timezone
 from django.contrib import messages
 from .models import Coupon, CouponUsage
-from offer.utils import get_best_offer
+from cart.pricing import CartPricing, get_priced_cart
 from decimal import Decimal
 from cart.models import Cart 
 
@@ -78,14 +78,9 @@ def apply_coupon(request):
             messages.error(request, "Your cart is empty.")
             return redirect("checkout_address")
 
-        subtotal = 0
-        for item in cart.items.all():
-            variant = item.variant
-            best_offer = get_best_offer(variant)
-            final_price = best_offer["final_price"] if best_offer else variant.price
-            subtotal += final_price * item.quantity
+        subtotal = get_priced_cart(cart).items_total
 
-        if subtotal < coupon.min_order_value:
+        if not CartPricing.coupon_applies(coupon, subtotal):
             messages.warning(
                 request,
                 f"⚠️ Minimum order of ₹{coupon.min_order_value} required to use this coupon."
@@ -8,12 +8,13 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
 from datetime import timedelta
-from django.utils.timezone import now
+from django.utils.timezone import localdate
 from django.db.models import Sum
 from functools import wraps
 
 from users.views import User
-from orders.models import Order
+from orders.models import Order, SalesDailySummary
+from orders.summary import sales_by_day, sales_by_month
 
 User = get_user_model()
 
@@ -61,55 +62,30 @@ def admin_logout(request):
 @admin_required
 @never_cache
 def admin_dashboard(request):
-    order_count = Order.objects.count()
+    today = localdate()
+    # Counts and chart data come from the daily rollup (orders/summary.py), not the Order table
+    totals = SalesDailySummary.objects.aggregate(
+        order_count=Sum("order_count"),
+        current_month_total=Sum("total_amount", filter=Q(date__year=today.year, date__month=today.month)),
+    )
+    order_count = totals["order_count"] or 0
+    current_month_total = totals["current_month_total"] or 0
     user_count = User.objects.filter(is_superuser=False).count()
-    orders = Order.objects.select_related('user').all().order_by('-created_at')
-    today = now()
-    current_month_total = (
-        Order.objects.filter(created_at__year=today.year, created_at__month=today.month)
-        .aggregate(total_amount=Sum("total_amount"))
-    )["total_amount"] or 0
+    orders = Order.objects.select_related('user').prefetch_related('items__variant__product').order_by('-created_at')
 
     filter_type = request.GET.get("filter", "monthly")
-    today = now().date()
 
     if filter_type == "daily":
-        data = (
-            Order.objects.filter(created_at__date=today)
-            .values("created_at__date")
-            .annotate(total_sales=Sum("total_amount"))
-        )
+        data = [(str(day), total) for day, total in sales_by_day(today, today)]
     elif filter_type == "weekly":
-        start_week = today - timedelta(days=7)
-        data = (
-            Order.objects.filter(created_at__date__gte=start_week)
-            .values("created_at__date")
-            .annotate(total_sales=Sum("total_amount"))
-        )
+        data = [(str(day), total) for day, total in sales_by_day(today - timedelta(days=7))]
     elif filter_type == "yearly":
-        data = (
-            Order.objects.filter(created_at__year=today.year)
-            .values("created_at__month")
-            .annotate(total_sales=Sum("total_amount"))
-            .order_by("created_at__month")
-        )
+        data = [(f"Month {month}", total) for month, total in sales_by_month(today.year)]
     else:  # monthly
-        data = (
-            Order.objects.filter(created_at__month=today.month)
-            .values("created_at__day")
-            .annotate(total_sales=Sum("total_amount"))
-            .order_by("created_at__day")
-        )
+        data = [(f"Day {day.day}", total) for day, total in sales_by_day(today.replace(day=1), today)]
 
-    labels, sales = [], []
-    for d in data:
-        if "created_at__month" in d:
-            labels.append(f"Month {d['created_at__month']}")
-        elif "created_at__day" in d:
-            labels.append(f"Day {d['created_at__day']}")
-        else:
-            labels.append(str(d["created_at__date"]))
-        sales.append(float(d["total_sales"]))
+    labels = [label for label, _ in data]
+    sales = [float(total) for _, total in data]
 
     context = {
         'order_count': order_count,
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'home',
     'users',
     'products',
@@ -53,6 +54,8 @@ INSTALLED_APPS = [
     'payments',
     'coupon',
     'offer',
+    'jobs',
+    'mailer',
     
     # Needed for allauth 
     'django.contrib.sites',
@@ -96,6 +99,7 @@ MIDDLEWARE = [
     'allauth.account.middleware.AccountMiddleware', # Needed for allauth
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'offer.middleware.OfferMemoMiddleware', # per-request offer memo
 ]
 
 ROOT_URLCONF = 'greennest.urls'
@@ -187,6 +191,40 @@ DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 # media files (user uploads)
 MEDIA_URL = '/media/'
 
+# Generated files served only through views (sales report PDFs), never from MEDIA_URL
+REPORTS_ROOT = os.getenv("REPORTS_ROOT", str(BASE_DIR / "reports"))
+
+
+# Background jobs (jobs app): `manage.py run_worker` must run next to the web process,
+# views only queue the work. Defaults for its pool, overridable on the command line.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "thread")
+
+
+# Caches shared by every gunicorn worker on the box. Point <PREFIX>_BACKEND/<PREFIX>_LOCATION
+# (CACHE_, OTP_CACHE_, FILE_CACHE_) at memcached/redis when running on more than one host.
+# The file/locmem backends evict a third of their entries at random once MAX_ENTRIES is
+# reached, and FileBasedCache lists its whole directory on every write to find out, so a
+# file store is kept to a few thousand entries at most. Stores are split by what eviction costs:
+#   default - catalog version, offer index, page fragments, cart snapshots (all rebuildable)
+#   otp     - OTP digests and rate limit buckets: short lived, must not be culled. The worker
+#             deletes expired entries every minute (users/tasks.py), so it holds only live ones
+#   files   - rendered invoice PDFs: big, kept away from the two above. Written only when an
+#             invoice is rendered and capped at 500; a culled invoice is just rendered again
+def _cache(prefix, location, max_entries):
+    backend = os.getenv(f"{prefix}_BACKEND", 'django.core.cache.backends.filebased.FileBasedCache')
+    config = {'BACKEND': backend, 'LOCATION': os.getenv(f"{prefix}_LOCATION", location)}
+    if backend.endswith(("FileBasedCache", "LocMemCache")):
+        config['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv(f"{prefix}_MAX_ENTRIES", max_entries))}
+    return config
+
+
+CACHES = {
+    'default': _cache("CACHE", str(BASE_DIR / "django_cache"), 2000),
+    'otp': _cache("OTP_CACHE", str(BASE_DIR / "django_cache" / "otp"), 5000),
+    'files': _cache("FILE_CACHE", str(BASE_DIR / "django_cache" / "files"), 500),
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -204,13 +242,24 @@ MESSAGE_TAGS = {
 
 #Configure email-OTP verification
 
+# Where users/otp.py reads the client address for its per-IP rate limits. Behind a proxy
+# REMOTE_ADDR is the proxy, so name the header it sets (e.g. HTTP_X_REAL_IP); REMOTE_ADDR
+# only when clients connect directly. Unset: per-IP limits are off.
+OTP_CLIENT_IP_HEADER = os.getenv("OTP_CLIENT_IP_HEADER") or None
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend' # This Send Otp via SMTP 
 #EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend' # This will print the email to console instead of sending it
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_HOST = os.getenv("EMAIL_HOST", 'smtp.gmail.com')
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True") == "True"
 EMAIL_HOST_USER = 'greennest.ecom@gmail.com'
 EMAIL_HOST_PASSWORD = 'kevj relf fcql jgtv'  
+EMAIL_TIMEOUT = 10  # seconds, a hung SMTP server must not hang a worker
+DEFAULT_FROM_EMAIL = 'greennest.ecom@gmail.com'
+
+# Mail is queued as jobs (mailer app) and sent by `manage.py run_worker`, each worker thread
+# over one SMTP connection it keeps open.
+# Offline: `manage.py smtp_sink` and EMAIL_HOST=127.0.0.1 EMAIL_PORT=1025 EMAIL_USE_TLS=False
 
 
 # Redirect after login
@@ -236,6 +285,11 @@ LOGIN_URL = '/users/login/'  # default redirect for admin_required decorator
 # Razorpay settings
 RAZORPAY_KEY_ID = 'rzp_test_R7V0e5hoyTOTHo'
 RAZORPAY_KEY_SECRET = 'zFFwYLsv9IpSGyzpKcn2mUsF'
+# e.g. http://127.0.0.1:8765 for `manage.py fake_razorpay`, see payments/gateway.py
+RAZORPAY_BASE_URL = os.getenv("RAZORPAY_BASE_URL", "https://api.razorpay.com")
+RAZORPAY_TIMEOUT = (3.05, float(os.getenv("RAZORPAY_READ_TIMEOUT", "10")))
+# Secret set on the Razorpay dashboard for the /users/payments/razorpay/webhook/ endpoint
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET", "")
 
 
 
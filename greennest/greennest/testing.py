@@ -0,0 +1,18 @@
+from django.db import connection
+from django.test import TestCase
+
+
+class ExplainTestCase(TestCase):
+    """TestCase asserting on the database's query plan (EXPLAIN on PostgreSQL, EXPLAIN QUERY PLAN on SQLite)."""
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == "postgresql":
+            # Test tables hold a few rows, where a seq scan is always cheapest. Rule it out
+            # so the plan shows which index the query would use on real data.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"{index_name} is not used by:\n{queryset.query}\n\nPlan:\n{plan}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.prerender import render_home_page
+
+
+class Command(BaseCommand):
+    help = "Render the anonymous home page into the cache for the current catalog version (e.g. after a deploy)."
+
+    def handle(self, *args, **options):
+        html = render_home_page()
+        self.stdout.write(self.style.SUCCESS(f"Prerendered home page ({len(html)} bytes)."))
@@ -0,0 +1,28 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from products.cache import catalog_cache_timeout, catalog_version
+from products.utils import get_featured_products
+
+
+# The anonymous home page is the same for every visitor, so it is rendered once per
+# catalog version and served from the cache. A catalog change moves the version on,
+# the next visitor (or `manage.py prerender_home`) renders the new page.
+def _page_key(version):
+    return f"home:anonymous:{version}"
+
+
+def render_home_page():
+    """Render the anonymous home page and store it for the current catalog version."""
+    version = catalog_version()
+    html = render_to_string("home.html", {"products": get_featured_products()})
+    cache.set(_page_key(version), html, catalog_cache_timeout())
+    return html
+
+
+def get_home_page():
+    """Prerendered HTML, rendering it first when this catalog version has none yet."""
+    html = cache.get(_page_key(catalog_version()))
+    if html is None:
+        html = render_home_page()
+    return html
@@ -1,7 +1,9 @@
 from django.shortcuts import render, redirect
-from django.db.models import Min
+from django.contrib.messages import get_messages
+from django.http import HttpResponse
 
-from products.models import Product
+from products.utils import get_featured_products
+from .prerender import get_home_page
 
 
 # Create your views here.
@@ -9,21 +11,9 @@ from products.models import Product
 def home(request):
     if request.user.is_authenticated:
         return redirect('user_home')
-    products = Product.objects.prefetch_related("variants__images").annotate(
-        min_price=Min("variants__price")  
-    )
 
-    # Attach a main_image property 
-    for product in products:
-        
-        cheapest_variant = (
-            product.variants.order_by("price").prefetch_related("images").first()
-        )
-        if cheapest_variant and cheapest_variant.images.exists():
-            product.main_image = cheapest_variant.images.first()  
-        else:
-            product.main_image = None  
+    # Flash messages (e.g. after logout) belong to one visitor: render those pages live
+    if len(get_messages(request)):
+        return render(request, "home.html", {"products": get_featured_products()})
 
-    
-    return render(request, "home.html", {"products": products})
-    
\ No newline at end of file
+    return HttpResponse(get_home_page())
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (payments, OTP mails, report PDFs) and periodic tasks (offer price "
+        "refresh, expired stock holds, expired OTP cache entries) until stopped with SIGINT/SIGTERM. "
+        "Run one per box next to the web workers (systemd/supervisor), more for more throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=getattr(settings, "JOB_WORKERS", 4),
+            help="Jobs run at the same time.",
+        )
+        parser.add_argument(
+            "--mode", choices=("thread", "process"), default=getattr(settings, "JOB_WORKER_MODE", "thread"),
+            help="Run jobs on a thread pool, or a process pool for CPU heavy work.",
+        )
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between looks at the queue when idle.")
+        parser.add_argument("--once", action="store_true", help="Run the jobs that are due, then exit.")
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options["concurrency"],
+            mode=options["mode"],
+            poll_interval=options["poll"],
+            stdout=self.stdout,
+        )
+        worker.run(once=options["once"])
@@ -0,0 +1,42 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+# Background job queue, no broker: jobs/queue.py writes a row, `manage.py run_worker` runs it.
+# The row is written in the same transaction as the change that asked for it, so a job is
+# never lost, and never run for a change that was rolled back. Workers claim queued rows
+# whose run_at has come, lowest priority number first. A failed run is queued again with
+# a backoff until max_attempts. idempotency_key makes enqueueing the same work twice a no-op.
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker's claim query; only queued rows are in it, so it stays small
+            models.Index(fields=["priority", "run_at", "id"], name="job_queued_idx", condition=Q(status="queued")),
+            # jobs of a worker that died
+            models.Index(fields=["locked_at"], name="job_running_idx", condition=Q(status="running")),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
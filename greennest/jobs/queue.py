@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Job
+
+
+# Lower runs first
+PRIORITY_HIGH = 10      # a customer is waiting on it (OTP mail, order after payment)
+PRIORITY_NORMAL = 50
+PRIORITY_LOW = 90       # admin side, heavy (report PDFs)
+
+_registry = {}
+
+
+class UnknownTask(LookupError):
+    pass
+
+
+class PermanentFailure(Exception):
+    """Raise from a task to fail its job now: another attempt would fail the same way."""
+
+
+class Task:
+    """A function the worker can run. Call it to run it here, .enqueue(...) to run it in the worker."""
+
+    def __init__(self, func, name, priority=PRIORITY_NORMAL, max_attempts=5, retry_delay=10, every=None):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay  # seconds before the first retry, doubled for every one after
+        self.every = every              # seconds, for periodic tasks: the worker queues a run this often
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<Task {self.name}>"
+
+    def enqueue(self, *args, key=None, priority=None, delay=None, **kwargs):
+        return enqueue(self, args, kwargs, key=key, priority=priority, delay=delay)
+
+
+def task(name=None, priority=PRIORITY_NORMAL, max_attempts=5, retry_delay=10, every=None):
+    """
+    Register a function as a task, under `name` (default "module.function"). Arguments
+    and keyword arguments go through a JSONField, so pass ids and plain values, not objects.
+    A task with `every` (seconds, no arguments) is also run that often by the workers.
+    """
+    def decorator(func):
+        registered = Task(func, name or f"{func.__module__}.{func.__name__}", priority, max_attempts, retry_delay, every)
+        _registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise UnknownTask(f"No task registered as {name!r}") from None
+
+
+def periodic_tasks():
+    return [registered for registered in _registry.values() if registered.every]
+
+
+def enqueue(task, args=(), kwargs=None, key=None, priority=None, delay=None):
+    """
+    Queue a run of `task` (a Task or a registered name) as part of the current transaction.
+    With a `key`, a job already queued (or run) under the same key is returned instead
+    of adding another one. `delay` is a timedelta or seconds.
+    """
+    if not isinstance(task, Task):
+        task = get_task(task)
+    if delay is not None and not isinstance(delay, timedelta):
+        delay = timedelta(seconds=delay)
+
+    job = Job(
+        task=task.name,
+        args=list(args),
+        kwargs=kwargs or {},
+        priority=task.priority if priority is None else priority,
+        max_attempts=task.max_attempts,
+        idempotency_key=key,
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        job = Job.objects.get(idempotency_key=key)
+    return job
@@ -0,0 +1,205 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from .models import Job
+from .queue import PRIORITY_HIGH, PRIORITY_LOW, enqueue, task
+from .worker import claim, heartbeat, requeue_stale_jobs, retry_delay, run_job, schedule_periodic_tasks
+
+calls = []
+
+
+@task("jobs.tests.record")
+def record(value):
+    calls.append(value)
+
+
+@task("jobs.tests.explode", max_attempts=2, retry_delay=10)
+def explode():
+    raise RuntimeError("boom")
+
+
+@task("jobs.tests.tick", every=60, max_attempts=1)
+def tick():
+    calls.append("tick")
+
+
+class EnqueueTests(TestCase):
+
+    def test_idempotency_key_returns_the_existing_job(self):
+        first = record.enqueue(1, key="record:1")
+        second = record.enqueue(2, key="record:1")
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.filter(idempotency_key="record:1").count(), 1)
+        self.assertEqual(Job.objects.get(pk=first.pk).args, [1])
+
+    def test_key_stays_taken_once_the_job_ran(self):
+        job = record.enqueue(1, key="record:ran")
+        Job.objects.filter(pk=job.pk).update(status="done")
+        self.assertEqual(record.enqueue(1, key="record:ran").pk, job.pk)
+
+    def test_job_is_rolled_back_with_its_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                record.enqueue(1, key="record:rolled-back")
+                raise RuntimeError
+        self.assertFalse(Job.objects.filter(idempotency_key="record:rolled-back").exists())
+
+    def test_enqueue_by_name_with_delay(self):
+        job = enqueue("jobs.tests.record", args=[3], delay=60)
+        self.assertEqual(job.task, "jobs.tests.record")
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=50))
+
+
+class ClaimTests(TestCase):
+
+    def test_lowest_priority_number_first_then_oldest(self):
+        low = record.enqueue("low", priority=PRIORITY_LOW)
+        normal_old = record.enqueue("normal-old")
+        normal_new = record.enqueue("normal-new")
+        Job.objects.filter(pk=normal_old.pk).update(run_at=timezone.now() - timedelta(minutes=1))
+        high = record.enqueue("high", priority=PRIORITY_HIGH)
+
+        self.assertEqual(claim("w1", 3), [high.pk, normal_old.pk, normal_new.pk])
+        self.assertEqual(claim("w1", 3), [low.pk])
+
+    def test_claim_marks_jobs_running(self):
+        job = record.enqueue(1)
+        claim("w1", 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), ("running", "w1", 1))
+        self.assertIsNotNone(job.locked_at)
+
+    def test_claimed_and_future_jobs_are_not_claimed(self):
+        record.enqueue(1)
+        record.enqueue(2, delay=60)
+        self.assertEqual(len(claim("w1", 5)), 1)
+        self.assertEqual(claim("w2", 5), [])
+
+
+class RunJobTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_success_marks_done(self):
+        job = record.enqueue("ok")
+        claim("w1", 1)
+        run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, ["ok"])
+
+    def test_failure_is_retried_with_backoff_then_failed(self):
+        job = explode.enqueue()
+        claim("w1", 1)
+        with mock.patch("jobs.worker.random.uniform", return_value=1), self.assertLogs("jobs.worker", "WARNING"):
+            run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ("queued", 1, ""))
+        self.assertIn("boom", job.last_error)
+        self.assertAlmostEqual((job.run_at - timezone.now()).total_seconds(), 10, delta=2)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        claim("w1", 1)
+        with self.assertLogs("jobs.worker", "ERROR"):
+            run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+
+    def test_unknown_task_fails_without_retry(self):
+        job = Job.objects.create(task="jobs.tests.missing")
+        claim("w1", 1)
+        with self.assertLogs("jobs.worker", "ERROR"):
+            run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+
+    def test_retry_delay_doubles_and_is_capped(self):
+        with mock.patch("jobs.worker.random.uniform", return_value=1):
+            self.assertEqual([retry_delay(explode, n) for n in (1, 2, 3)], [10, 20, 40])
+            self.assertEqual(retry_delay(explode, 30), 60 * 60)
+
+
+class StaleJobTests(TestCase):
+
+    def _running(self, attempts=1, age=timedelta(minutes=10)):
+        job = record.enqueue(1)
+        Job.objects.filter(pk=job.pk).update(
+            status="running", locked_by="dead", locked_at=timezone.now() - age, attempts=attempts,
+        )
+        return job
+
+    def test_stale_job_is_requeued(self):
+        job = self._running()
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=5)), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ("queued", ""))
+
+    def test_stale_job_out_of_attempts_fails(self):
+        job = self._running(attempts=5)
+        requeue_stale_jobs(timedelta(minutes=5))
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+
+    def test_heartbeat_keeps_a_long_job(self):
+        job = self._running()
+        Job.objects.filter(pk=job.pk).update(locked_by="alive")
+        heartbeat("alive")
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=5)), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "running")
+
+
+class PeriodicTaskTests(TestCase):
+
+    def ticks(self):
+        return Job.objects.filter(task="jobs.tests.tick")
+
+    def test_one_job_per_window(self):
+        now = timezone.now().replace(second=30)
+        schedule_periodic_tasks(now)
+        schedule_periodic_tasks(now + timedelta(seconds=20))
+        self.assertEqual(self.ticks().count(), 1)
+        schedule_periodic_tasks(now + timedelta(seconds=40))
+        self.assertEqual(self.ticks().count(), 2)
+
+    def test_scheduled_run_is_claimed_and_run(self):
+        calls.clear()
+        schedule_periodic_tasks()
+        for job_id in claim("w1", 10):
+            run_job(job_id)
+        self.assertEqual(calls, ["tick"])
+        self.assertEqual(self.ticks().get().status, "done")
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+class SkipLockedTests(TransactionTestCase):
+
+    def test_concurrent_claims_take_different_jobs(self):
+        first, second = record.enqueue(1), record.enqueue(2)
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_first():
+            # Another worker, mid-claim with the first job locked
+            try:
+                with transaction.atomic():
+                    list(Job.objects.select_for_update().filter(pk=first.pk))
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_first)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            self.assertEqual(claim("w1", 2), [second.pk])
+        finally:
+            release.set()
+            thread.join()
@@ -0,0 +1,239 @@
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+from .queue import PermanentFailure, UnknownTask, get_task, periodic_tasks
+
+logger = logging.getLogger(__name__)
+
+
+MAX_RETRY_DELAY = 60 * 60                                                          # seconds
+HEARTBEAT_EVERY = 30                                                               # seconds
+JOB_TIMEOUT = timedelta(minutes=getattr(settings, "JOB_TIMEOUT_MINUTES", 5))       # no heartbeat this long: worker died
+JOB_KEEP = timedelta(days=getattr(settings, "JOB_KEEP_DAYS", 7))                   # finished jobs kept this long
+HOUSEKEEPING_EVERY = 60                                                            # seconds
+SCHEDULE_EVERY = 5                                                                 # seconds between looks for due periodic tasks
+
+
+def retry_delay(task, attempts):
+    """Seconds before retry number `attempts`: exponential, capped, with some jitter so failures don't retry in step."""
+    delay = min(task.retry_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim(worker_id, limit):
+    """Mark up to `limit` due jobs as running for `worker_id`; returns their ids."""
+    now = timezone.now()
+    with transaction.atomic():
+        # SKIP LOCKED: concurrent workers take different rows instead of queueing on the same ones
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status="queued", run_at__lte=now)
+            .order_by("priority", "run_at", "id")
+            .values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # status="queued" again: on SQLite (no row locks) another worker may have won the row
+        Job.objects.filter(id__in=ids, status="queued").update(
+            status="running", locked_by=worker_id, locked_at=now, attempts=F("attempts") + 1,
+        )
+    return list(
+        Job.objects.filter(id__in=ids, status="running", locked_by=worker_id, locked_at=now)
+        .order_by("priority", "run_at", "id")
+        .values_list("id", flat=True)
+    )
+
+
+def run_job(job_id):
+    """Run a claimed job and record the outcome: done, queued again for a retry, or failed."""
+    try:
+        job = Job.objects.filter(pk=job_id, status="running").first()
+        if job is None:
+            return
+        claimed = Job.objects.filter(pk=job.pk, status="running", locked_by=job.locked_by)
+
+        try:
+            task = get_task(job.task)
+        except UnknownTask as e:
+            claimed.update(status="failed", last_error=str(e), finished_at=timezone.now())
+            logger.error("Job %s: %s", job.pk, e)
+            return
+
+        try:
+            task.func(*job.args, **job.kwargs)
+        except PermanentFailure as e:
+            claimed.update(status="failed", last_error=str(e), finished_at=timezone.now())
+            logger.error("Job %s (%s) failed, not retried: %s", job.pk, job.task, e)
+            return
+        except Exception:
+            error = traceback.format_exc()
+            if job.attempts < job.max_attempts:
+                delay = retry_delay(task, job.attempts)
+                claimed.update(
+                    status="queued", run_at=timezone.now() + timedelta(seconds=delay),
+                    locked_by="", locked_at=None, last_error=error,
+                )
+                logger.warning("Job %s (%s) failed, attempt %s of %s, retrying in %.0fs",
+                               job.pk, job.task, job.attempts, job.max_attempts, delay)
+            else:
+                claimed.update(status="failed", last_error=error, finished_at=timezone.now())
+                logger.error("Job %s (%s) failed after %s attempts:\n%s", job.pk, job.task, job.attempts, error)
+            return
+
+        claimed.update(status="done", last_error="", finished_at=timezone.now())
+    finally:
+        # Pool threads/processes outlive jobs, don't leave their connection open
+        connection.close()
+
+
+def heartbeat(worker_id):
+    """Refresh locked_at on `worker_id`'s running jobs, so a long job isn't taken for one whose worker died."""
+    return Job.objects.filter(status="running", locked_by=worker_id).update(locked_at=timezone.now())
+
+
+def requeue_stale_jobs(timeout=JOB_TIMEOUT):
+    """
+    Give jobs left "running" by a worker that died back to the queue (or fail them, out of
+    attempts). A live worker's jobs never get here: Worker.run heartbeats them every HEARTBEAT_EVERY.
+    """
+    cutoff = timezone.now() - timeout
+    stale = Job.objects.filter(status="running", locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="failed", last_error="Worker stopped while running the job", finished_at=timezone.now(),
+    )
+    requeued = stale.update(status="queued", locked_by="", locked_at=None, run_at=timezone.now())
+    return requeued + failed
+
+
+def schedule_periodic_tasks(now=None):
+    """
+    Queue a run of every periodic task whose `every` window started since its last run. The
+    idempotency key names the window, so however many workers call this, each window gets one
+    job. Returns the jobs queued.
+    """
+    now = now or timezone.now()
+    keys = {
+        f"{periodic.name}:every:{int(now.timestamp() // periodic.every)}": periodic
+        for periodic in periodic_tasks()
+    }
+    if not keys:
+        return 0
+    queued = set(Job.objects.filter(idempotency_key__in=list(keys)).values_list("idempotency_key", flat=True))
+    for key, periodic in keys.items():
+        if key not in queued:
+            periodic.enqueue(key=key)
+    return len(keys) - len(queued)
+
+
+def prune_jobs(keep=JOB_KEEP):
+    """Delete finished jobs older than `keep` (their idempotency keys can be used again)."""
+    deleted, _ = Job.objects.filter(status__in=("done", "failed"), finished_at__lt=timezone.now() - keep).delete()
+    return deleted
+
+
+def _noop():
+    return os.getpid()
+
+
+class Worker:
+    """
+    Claims due jobs and runs them on a pool of `concurrency` threads, or processes
+    (mode="process", for CPU heavy tasks: ReportLab holds the GIL). Stops on SIGINT/SIGTERM
+    after the jobs it is running have finished.
+    """
+
+    def __init__(self, concurrency=4, mode="thread", poll_interval=1.0, stdout=None):
+        self.concurrency = max(1, concurrency)
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stdout = stdout
+        self.stopping = threading.Event()
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def _pool(self):
+        if self.mode == "process":
+            # Forked children must not share the parent's database socket: close it,
+            # then start every child up front, before the parent queries again
+            connections.close_all()
+            pool = ProcessPoolExecutor(self.concurrency, mp_context=multiprocessing.get_context("fork"))
+            for future in [pool.submit(_noop) for _ in range(self.concurrency)]:
+                future.result()
+            return pool
+        return ThreadPoolExecutor(self.concurrency, thread_name_prefix="jobs")
+
+    def run(self, once=False):
+        # every app's tasks.py registers its tasks on import
+        autodiscover_modules("tasks")
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.stop)
+
+        pool = self._pool()
+        self.log(f"Worker {self.worker_id} running jobs on a {self.mode} pool of {self.concurrency}")
+        running = set()
+        next_housekeeping = 0
+        next_heartbeat = 0
+        next_schedule = 0
+        try:
+            while not self.stopping.is_set():
+                running = {future for future in running if not future.done()}
+
+                # The loop wakes at least every poll_interval, also while the pool is busy
+                if running and time.monotonic() >= next_heartbeat:
+                    heartbeat(self.worker_id)
+                    next_heartbeat = time.monotonic() + HEARTBEAT_EVERY
+
+                if time.monotonic() >= next_housekeeping:
+                    requeue_stale_jobs()
+                    prune_jobs()
+                    next_housekeeping = time.monotonic() + HOUSEKEEPING_EVERY
+
+                if time.monotonic() >= next_schedule:
+                    schedule_periodic_tasks()
+                    next_schedule = time.monotonic() + SCHEDULE_EVERY
+
+                free = self.concurrency - len(running)
+                ids = claim(self.worker_id, free) if free else []
+                for job_id in ids:
+                    running.add(pool.submit(run_job, job_id))
+
+                if once and not ids and not running:
+                    break
+                if not ids or len(running) >= self.concurrency:
+                    # sleep until a slot frees up or it's time to look for new jobs
+                    if running:
+                        wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    else:
+                        self.stopping.wait(self.poll_interval)
+        finally:
+            # Let the running jobs finish, still heartbeating them
+            while running:
+                _, running = wait(running, timeout=HEARTBEAT_EVERY)
+                if running:
+                    heartbeat(self.worker_id)
+            pool.shutdown(wait=True)
+            connection.close()
+        self.log(f"Worker {self.worker_id} stopped")
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.models import Job
+from jobs.worker import Worker
+from mailer import sender
+from mailer.services import queue_email
+
+
+DOMAIN = "benchmark.greennest.invalid"
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue --count test mails and time the job worker sending them, with reused SMTP connections and "
+        "with one connection per mail. Run against `manage.py smtp_sink`, never the real SMTP server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=4, help="Worker threads.")
+
+    def handle(self, *args, **options):
+        if settings.EMAIL_BACKEND.endswith("smtp.EmailBackend") and settings.EMAIL_HOST not in ("localhost", "127.0.0.1"):
+            raise CommandError(f"EMAIL_HOST is {settings.EMAIL_HOST}: point it at a local smtp_sink first.")
+        if Job.objects.filter(status__in=("queued", "running")).exists():
+            raise CommandError("There are jobs waiting: run the benchmark on an idle queue.")
+        self.stdout.write(f"Sending through {settings.EMAIL_BACKEND} at {settings.EMAIL_HOST}:{settings.EMAIL_PORT}")
+
+        per_connection = sender.MESSAGES_PER_CONNECTION
+        try:
+            for reuse in (True, False):
+                sender.MESSAGES_PER_CONNECTION = per_connection if reuse else 1
+                ids = [
+                    queue_email(f"customer{n}@{DOMAIN}", "Your OTP Code", f"Your OTP is {1000 + n % 9000}.").pk
+                    for n in range(options["count"])
+                ]
+                started = time.perf_counter()
+                Worker(concurrency=options["concurrency"], poll_interval=0.1).run(once=True)
+                elapsed = time.perf_counter() - started
+
+                jobs = Job.objects.filter(pk__in=ids)
+                sent = jobs.filter(status="done").count()
+                self.stdout.write(
+                    f"{'reused connection' if reuse else 'connection per mail':<20} "
+                    f"{sent} sent, {jobs.exclude(status='done').count()} not sent in {elapsed:.2f}s "
+                    f"({sent / elapsed if elapsed else 0:.0f} mails/s)"
+                )
+                jobs.delete()
+        finally:
+            sender.MESSAGES_PER_CONNECTION = per_connection
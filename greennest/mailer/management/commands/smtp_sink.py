@@ -0,0 +1,102 @@
+import socketserver
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib / Django's SMTP backend: no TLS, any AUTH PLAIN is accepted
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        if server.connect_delay:
+            time.sleep(server.connect_delay)  # stands in for the TCP + TLS + AUTH round trips of a real server
+        self.reply("220 greennest smtp sink")
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line in (b".\r\n", b".\n"):
+                    in_data = False
+                    if server.delay:
+                        time.sleep(server.delay)
+                    server.received()
+                    self.reply("250 OK: queued")
+                continue
+
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-greennest\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif command.startswith(("HELO", "MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command.startswith("AUTH"):
+                self.reply("235 Authentication successful")
+            elif command == "DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, delay=0, connect_delay=0):
+        super().__init__(address, SinkHandler)
+        self.delay = delay
+        self.connect_delay = connect_delay
+        self.lock = threading.Lock()
+        self.count = 0
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def received(self):
+        with self.lock:
+            self.count += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Local SMTP server that accepts and discards every message, for benchmarking the mailer offline. "
+        "Point EMAIL_HOST/EMAIL_PORT at it with EMAIL_USE_TLS=False."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=1025)
+        parser.add_argument("--delay", type=float, default=0, help="Seconds to wait before accepting each message.")
+        parser.add_argument("--connect-delay", type=float, default=0, help="Seconds to wait before greeting a new connection.")
+
+    def handle(self, *args, **options):
+        server = SinkServer(
+            (options["host"], options["port"]), delay=options["delay"], connect_delay=options["connect_delay"],
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.stdout.write(f"SMTP sink on {options['host']}:{options['port']}, Ctrl+C to stop")
+        last = 0
+        try:
+            while True:
+                time.sleep(5)
+                if server.count != last:
+                    self.stdout.write(f"{server.count} messages over {server.connections} connections "
+                                      f"({(server.count - last) / 5:.1f}/s)")
+                    last = server.count
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.stdout.write(f"Received {server.count} messages over {server.connections} connections")
@@ -0,0 +1,77 @@
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from jobs.queue import PermanentFailure
+
+
+# SMTP connection reuse for mail sent from job worker threads.
+# Each thread keeps the connection it opened and sends its next mails over it: the
+# handshake (TCP, STARTTLS, AUTH) is paid once per MESSAGES_PER_CONNECTION mails instead of
+# once per mail. Claiming, retries and backoff are the job queue's.
+MESSAGES_PER_CONNECTION = getattr(settings, "MAIL_MESSAGES_PER_CONNECTION", 100)   # Gmail caps a session at 100
+IDLE_TIMEOUT = 30  # seconds unused after which the connection is replaced, servers drop idle sessions
+
+# The server refused this one message. Anything else (every smtplib error is an OSError)
+# means the connection is gone or unusable.
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+_local = threading.local()
+
+
+def _is_permanent(error):
+    # 5xx for this message (bad address, rejected content): another try won't help
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return error.smtp_code >= 500
+
+
+def _connection():
+    connection = getattr(_local, "connection", None)
+    if connection is not None and (
+        _local.sent >= MESSAGES_PER_CONNECTION or time.monotonic() - _local.last_used > IDLE_TIMEOUT
+    ):
+        close()
+        connection = None
+    if connection is None:
+        connection = get_connection(fail_silently=False)
+        connection.open()
+        _local.connection = connection
+        _local.sent = 0
+    return connection
+
+
+def close():
+    """Close this thread's connection, if it has one."""
+    connection = getattr(_local, "connection", None)
+    _local.connection = None
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def send_message(to, subject, body, from_email=None):
+    """
+    Send a plain text mail over this thread's connection. Raises PermanentFailure when the
+    server refuses it for good (5xx); other errors raise as they are and the job is retried,
+    a dropped connection is replaced on the next send.
+    """
+    message = EmailMessage(subject, body, from_email or settings.DEFAULT_FROM_EMAIL, [to])
+    connection = _connection()
+    try:
+        connection.send_messages([message])
+    except MESSAGE_ERRORS as e:
+        _local.last_used = time.monotonic()
+        if _is_permanent(e):
+            raise PermanentFailure(f"Refused by the mail server: {e}") from e
+        raise
+    except Exception:
+        close()
+        raise
+    _local.sent += 1
+    _local.last_used = time.monotonic()
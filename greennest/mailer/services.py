@@ -0,0 +1,6 @@
+from .tasks import send_email
+
+
+def queue_email(to, subject, body, from_email=None):
+    """Queue a plain text mail for the job worker, with the current transaction: no SMTP in the request."""
+    return send_email.enqueue(to, subject, body, from_email)
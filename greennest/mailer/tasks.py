@@ -0,0 +1,8 @@
+from jobs.queue import task
+from .sender import send_message
+
+
+# Run by `manage.py run_worker`, see mailer/sender.py for the connection handling
+@task("mailer.send_email", max_attempts=5, retry_delay=30)
+def send_email(to, subject, body, from_email=None):
+    send_message(to, subject, body, from_email)
@@ -0,0 +1,112 @@
+import smtplib
+from unittest import mock
+
+from django.test import TestCase
+
+from jobs.models import Job
+from jobs.queue import PermanentFailure
+from jobs.worker import claim, run_job
+from . import sender
+from .services import queue_email
+
+
+class FakeConnection:
+    """Stands in for Django's SMTP backend: send_messages raises the queued errors in turn."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+        self.closed = False
+
+    def open(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def send_messages(self, messages):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.extend(messages)
+        return len(messages)
+
+
+def refused(code):
+    return smtplib.SMTPRecipientsRefused({"a@example.com": (code, b"mailbox unavailable")})
+
+
+class FakeSMTPMixin:
+
+    def setUp(self):
+        sender.close()
+        self.connections = []
+
+    def tearDown(self):
+        sender.close()
+
+    def connect(self, *errors):
+        # get_connection() hands out a new FakeConnection per call, the first one failing with `errors`
+        def get_connection(**kwargs):
+            connection = FakeConnection(errors if not self.connections else ())
+            self.connections.append(connection)
+            return connection
+        return mock.patch("mailer.sender.get_connection", side_effect=get_connection)
+
+
+class SenderTests(FakeSMTPMixin, TestCase):
+
+    def test_connection_is_reused(self):
+        with self.connect():
+            for n in range(3):
+                sender.send_message("a@example.com", "Hi", str(n))
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(len(self.connections[0].sent), 3)
+
+    def test_connection_is_replaced_after_messages_per_connection(self):
+        with self.connect(), mock.patch("mailer.sender.MESSAGES_PER_CONNECTION", 2):
+            for n in range(3):
+                sender.send_message("a@example.com", "Hi", str(n))
+        self.assertEqual(len(self.connections), 2)
+        self.assertTrue(self.connections[0].closed)
+
+    def test_5xx_fails_for_good_and_keeps_the_connection(self):
+        with self.connect(refused(550)):
+            with self.assertRaises(PermanentFailure):
+                sender.send_message("a@example.com", "Hi", "x")
+            sender.send_message("b@example.com", "Hi", "y")
+        self.assertEqual(len(self.connections), 1)
+
+    def test_4xx_is_retried(self):
+        with self.connect(refused(451)):
+            with self.assertRaises(smtplib.SMTPRecipientsRefused):
+                sender.send_message("a@example.com", "Hi", "x")
+        self.assertFalse(self.connections[0].closed)
+
+    def test_dropped_connection_is_replaced(self):
+        with self.connect(smtplib.SMTPServerDisconnected("gone")):
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                sender.send_message("a@example.com", "Hi", "x")
+            sender.send_message("a@example.com", "Hi", "x")
+        self.assertTrue(self.connections[0].closed)
+        self.assertEqual(len(self.connections[1].sent), 1)
+
+
+class SendEmailJobTests(FakeSMTPMixin, TestCase):
+
+    def run_mail(self):
+        job = queue_email("a@example.com", "Hi", "x")
+        claim("w1", 1)
+        with self.assertLogs("jobs.worker", "WARNING"):
+            run_job(job.pk)
+        return Job.objects.get(pk=job.pk)
+
+    def test_5xx_fails_the_job_without_retry(self):
+        with self.connect(refused(550)):
+            job = self.run_mail()
+        self.assertEqual((job.status, job.attempts), ("failed", 1))
+
+    def test_dropped_connection_retries_the_job(self):
+        with self.connect(ConnectionResetError("reset by peer")):
+            job = self.run_mail()
+        self.assertEqual(job.status, "queued")
+        self.assertIn("reset by peer", job.last_error)
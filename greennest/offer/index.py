@@ -0,0 +1,109 @@
+import threading
+import time
+import uuid
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ProductOffer, CategoryOffer
+
+
+# In-process index of every enabled Product/Category offer that has not ended yet.
+# Each worker keeps its own copy and reloads it when:
+#   - an offer is saved/deleted/toggled (any worker bumps VERSION_KEY in the shared cache),
+#   - the next offer start/end boundary passes (ended offers are dropped on reload).
+VERSION_KEY = "offer_index_version"
+VERSION_CHECK_INTERVAL = 1.0  # seconds between version checks outside of requests
+
+
+class OfferIndex:
+    def __init__(self, product_offers, category_offers, loaded_at):
+        self.products = self._group(product_offers)
+        self.categories = self._group(category_offers)
+        self.loaded_at = loaded_at
+
+        boundaries = [
+            boundary
+            for _, start, end, _ in list(product_offers) + list(category_offers)
+            for boundary in (start, end)
+            if boundary >= loaded_at
+        ]
+        self.expires_at = min(boundaries) if boundaries else None
+
+    @staticmethod
+    def _group(offers):
+        # key -> (sorted start dates, [(start, end, discount)] in the same order)
+        grouped = {}
+        for key, start, end, discount in offers:
+            grouped.setdefault(key, []).append((start, end, discount))
+        index = {}
+        for key, intervals in grouped.items():
+            intervals.sort(key=lambda interval: interval[0])
+            index[key] = ([interval[0] for interval in intervals], intervals)
+        return index
+
+    @classmethod
+    def load(cls):
+        now = timezone.now()
+        fields = ("start_date", "end_date", "discount_percentage")
+        product_offers = list(
+            ProductOffer.objects.filter(is_active=True, end_date__gte=now).values_list("product_id", *fields)
+        )
+        category_offers = list(
+            CategoryOffer.objects.filter(is_active=True, end_date__gte=now).values_list("category_id", *fields)
+        )
+        return cls(product_offers, category_offers, now)
+
+    def is_expired(self, at):
+        return self.expires_at is not None and at > self.expires_at
+
+    @staticmethod
+    def _best(entry, at):
+        if entry is None:
+            return None
+        starts, intervals = entry
+        best = None
+        for start, end, discount in intervals[:bisect_right(starts, at)]:
+            if end >= at and (best is None or discount > best):
+                best = discount
+        return best
+
+    def best_discounts(self, product_id, category_id, at):
+        """Highest running (product discount, category discount) at time `at`; None where no offer runs."""
+        return (
+            self._best(self.products.get(product_id), at),
+            self._best(self.categories.get(category_id), at),
+        )
+
+
+_lock = threading.Lock()
+_index = None
+_version = None
+_checked_at = 0.0
+
+
+def mark_offer_index_stale():
+    """Called after an offer change commits: reload here, and tell the other workers to reload."""
+    global _index, _version
+    version = uuid.uuid4().hex
+    cache.set(VERSION_KEY, version, None)
+    with _lock:
+        _index = None
+        _version = version
+
+
+def get_offer_index(check_version=False):
+    global _index, _version, _checked_at
+    now = timezone.now()
+    with _lock:
+        if check_version or time.monotonic() - _checked_at >= VERSION_CHECK_INTERVAL:
+            version = cache.get(VERSION_KEY)
+            _checked_at = time.monotonic()
+            if version != _version:
+                _index = None
+                _version = version
+
+        if _index is None or _index.is_expired(now):
+            _index = OfferIndex.load()
+        return _index
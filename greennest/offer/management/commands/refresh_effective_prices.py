@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from offer.services import refresh_effective_prices, refresh_expired_effective_prices
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh materialized variant prices whose offer window started/ended. run_worker does this every "
+        "minute (offer.tasks); --all rebuilds every row by hand."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebuild every row instead of only expired ones.")
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            count = refresh_effective_prices()
+        else:
+            count = refresh_expired_effective_prices()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} variant price(s)."))
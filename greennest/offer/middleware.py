@@ -0,0 +1,17 @@
+from .index import get_offer_index
+from .utils import offer_memo
+
+
+class OfferMemoMiddleware:
+    """
+    Resolve each variant's best offer at most once per request (see offer.utils.offer_memo),
+    and pick up offer changes made by other workers before the request starts.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        get_offer_index(check_version=True)
+        with offer_memo():
+            return self.get_response(request)
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _running_offers(model, field, now):
+    # ({key: highest running discount}, {key: next start/end boundary}) of the enabled offers
+    best, boundaries = {}, {}
+    offers = model.objects.filter(is_active=True, end_date__gte=now).values_list(
+        field, "start_date", "end_date", "discount_percentage"
+    )
+    for key, start, end, discount in offers:
+        if start <= now and discount > best.get(key, -1):
+            best[key] = discount
+        boundary = start if start > now else end
+        if key not in boundaries or boundary < boundaries[key]:
+            boundaries[key] = boundary
+    return best, boundaries
+
+
+def _discounted(price, discount):
+    # 1-90% only, like offer.utils._apply_best_offer
+    if discount is not None and 1 <= discount <= 90:
+        return price - (price * discount / 100)
+    return price
+
+
+def seed_effective_prices(apps, schema_editor):
+    # Rows with the offer prices running now, so listing filters and sorting are right from the
+    # first request after deploy. The rules of offer.utils.get_best_offer are spelled out here
+    # (highest running discount per product/category, 1-90% clamp, product offer wins ties,
+    # round to paise) as a migration can't import app code that may change after it.
+    ProductVariant = apps.get_model("products", "ProductVariant")
+    ProductOffer = apps.get_model("offer", "ProductOffer")
+    CategoryOffer = apps.get_model("offer", "CategoryOffer")
+    VariantEffectivePrice = apps.get_model("offer", "VariantEffectivePrice")
+    now = timezone.now()
+    product_discounts, product_boundaries = _running_offers(ProductOffer, "product_id", now)
+    category_discounts, category_boundaries = _running_offers(CategoryOffer, "category_id", now)
+
+    rows = []
+    variants = ProductVariant.objects.filter(
+        is_active=True, product__is_active=True, product__category__is_active=True
+    ).values_list("id", "price", "product_id", "product__category_id")
+    for variant_id, price, product_id, category_id in variants.iterator():
+        product_discount = product_discounts.get(product_id)
+        category_discount = category_discounts.get(category_id)
+        product_price = _discounted(price, product_discount)
+        category_price = _discounted(price, category_discount)
+        if product_price <= category_price:
+            final_price, discount, offer_type = product_price, product_discount, "Product Offer"
+        else:
+            final_price, discount, offer_type = category_price, category_discount, "Category Offer"
+        boundaries = [
+            boundary for boundary in (product_boundaries.get(product_id), category_boundaries.get(category_id))
+            if boundary is not None
+        ]
+        rows.append(VariantEffectivePrice(
+            variant_id=variant_id,
+            final_price=round(final_price, 2),
+            discount=discount or 0,
+            offer_type=offer_type if discount is not None else None,
+            valid_until=min(boundaries) if boundaries else None,
+        ))
+    VariantEffectivePrice.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offer', '0002_categoryoffer_is_active_productoffer_is_active_and_more'),
+        ('products', '0009_productvariant_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariantEffectivePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('final_price', models.DecimalField(db_index=True, decimal_places=2, max_digits=8)),
+                ('discount', models.PositiveIntegerField(default=0)),
+                ('offer_type', models.CharField(blank=True, max_length=20, null=True)),
+                ('valid_until', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('variant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='effective_price', to='products.productvariant')),
+            ],
+        ),
+        migrations.RunPython(seed_effective_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offer', '0003_varianteffectiveprice'),
+        ('products', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='categoryoffer',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'start_date', 'end_date'], name='categoryoffer_running_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoffer',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['product', 'start_date', 'end_date'], name='productoffer_running_idx'),
+        ),
+    ]
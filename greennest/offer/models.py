@@ -1,6 +1,7 @@
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
-from products.models import Product, Category
+from products.models import Product, Category, ProductVariant
 from django.conf import settings
 
 class ProductOffer(models.Model):
@@ -10,6 +11,12 @@ class ProductOffer(models.Model):
     end_date = models.DateTimeField()
     is_active = models.BooleanField(default=True) 
 
+    class Meta:
+        indexes = [
+            # Running offers of a product: product = x AND is_active AND start_date <= now AND end_date >= now
+            models.Index(fields=["product", "start_date", "end_date"], condition=Q(is_active=True), name="productoffer_running_idx"),
+        ]
+
     def active(self):
         """Check if the offer is currently active and within date range."""
         return self.is_active and self.start_date <= timezone.now() <= self.end_date
@@ -25,6 +32,11 @@ class CategoryOffer(models.Model):
     end_date = models.DateTimeField()
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["category", "start_date", "end_date"], condition=Q(is_active=True), name="categoryoffer_running_idx"),
+        ]
+
     def active(self):
         return self.is_active and self.start_date <= timezone.now() <= self.end_date
 
@@ -40,3 +52,18 @@ class Referral(models.Model):
     
     def __str__(self):
         return f"Referral({self.user.username})"
+
+
+class VariantEffectivePrice(models.Model):
+    """
+    Denormalized best-offer price for every sellable variant (variant, product and category active).
+    Maintained by offer/signals.py; valid_until is the next offer start/end that can change the row.
+    """
+    variant = models.OneToOneField(ProductVariant, on_delete=models.CASCADE, related_name="effective_price")
+    final_price = models.DecimalField(max_digits=8, decimal_places=2, db_index=True)
+    discount = models.PositiveIntegerField(default=0)
+    offer_type = models.CharField(max_length=20, null=True, blank=True)
+    valid_until = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.variant} -> ₹{self.final_price}"
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import ProductVariant
+from .models import ProductOffer, CategoryOffer, VariantEffectivePrice
+
+
+def _next_boundaries(model, field, ids, now):
+    # {id: earliest upcoming start/end among enabled offers}
+    boundaries = {}
+    offers = model.objects.filter(
+        **{f"{field}__in": ids}, is_active=True, end_date__gte=now
+    ).values_list(field, "start_date", "end_date")
+    for key, start, end in offers:
+        boundary = start if start > now else end
+        if key not in boundaries or boundary < boundaries[key]:
+            boundaries[key] = boundary
+    return boundaries
+
+
+def refresh_effective_prices(variant_ids=None, product_ids=None, category_ids=None):
+    """
+    Recompute VariantEffectivePrice rows for the given variants/products/categories (all when no filter).
+    Prices come from ProductVariant.objects.with_effective_price(), i.e. straight from the offer tables
+    in the same query, which is also what offer signals need before the offer index reloads.
+    """
+    now = timezone.now()
+    variants = ProductVariant.objects.select_related("product__category").with_effective_price(now)
+    if variant_ids is not None:
+        variants = variants.filter(id__in=variant_ids)
+    if product_ids is not None:
+        variants = variants.filter(product_id__in=product_ids)
+    if category_ids is not None:
+        variants = variants.filter(product__category_id__in=category_ids)
+
+    sellable, unsellable = [], []
+    for variant in variants:
+        if variant.is_active and variant.product.is_active and variant.product.category.is_active:
+            sellable.append(variant)
+        else:
+            unsellable.append(variant.id)
+
+    product_boundaries = _next_boundaries(ProductOffer, "product_id", {v.product_id for v in sellable}, now)
+    category_boundaries = _next_boundaries(CategoryOffer, "category_id", {v.product.category_id for v in sellable}, now)
+
+    rows = []
+    for variant in sellable:
+        candidates = [
+            b for b in (product_boundaries.get(variant.product_id), category_boundaries.get(variant.product.category_id))
+            if b is not None
+        ]
+        rows.append(VariantEffectivePrice(
+            variant=variant,
+            final_price=variant.final_price,
+            discount=variant.best_discount,
+            offer_type=variant.best_offer_type,
+            valid_until=min(candidates) if candidates else None,
+        ))
+
+    with transaction.atomic():
+        if unsellable:
+            VariantEffectivePrice.objects.filter(variant_id__in=unsellable).delete()
+        VariantEffectivePrice.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["variant"],
+            update_fields=["final_price", "discount", "offer_type", "valid_until"],
+        )
+    return len(rows)
+
+
+def refresh_expired_effective_prices():
+    """Refresh rows whose offer start/end boundary has passed. One indexed query when nothing expired."""
+    expired = list(
+        VariantEffectivePrice.objects.filter(valid_until__lte=timezone.now()).values_list("variant_id", flat=True)
+    )
+    if expired:
+        return refresh_effective_prices(variant_ids=expired)
+    return 0
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from products.cache import bump_catalog_version
+from products.models import Category, Product, ProductVariant
+from .models import ProductOffer, CategoryOffer
+from .index import mark_offer_index_stale
+from .services import refresh_effective_prices
+from .utils import invalidate_offer_memo
+
+
+# Offers edited in the admin can be moved to another product/category: remember the old one
+@receiver(pre_save, sender=ProductOffer)
+def remember_offer_product(sender, instance, **kwargs):
+    instance._previous_target = (
+        ProductOffer.objects.filter(pk=instance.pk).values_list("product_id", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(pre_save, sender=CategoryOffer)
+def remember_offer_category(sender, instance, **kwargs):
+    instance._previous_target = (
+        CategoryOffer.objects.filter(pk=instance.pk).values_list("category_id", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=ProductOffer)
+@receiver(post_delete, sender=ProductOffer)
+def product_offer_changed(sender, instance, **kwargs):
+    invalidate_offer_memo()
+    transaction.on_commit(mark_offer_index_stale)
+    transaction.on_commit(bump_catalog_version)
+    product_ids = {instance.product_id, getattr(instance, "_previous_target", None)} - {None}
+    refresh_effective_prices(product_ids=product_ids)
+
+
+@receiver(post_save, sender=CategoryOffer)
+@receiver(post_delete, sender=CategoryOffer)
+def category_offer_changed(sender, instance, **kwargs):
+    invalidate_offer_memo()
+    transaction.on_commit(mark_offer_index_stale)
+    transaction.on_commit(bump_catalog_version)
+    category_ids = {instance.category_id, getattr(instance, "_previous_target", None)} - {None}
+    refresh_effective_prices(category_ids=category_ids)
+
+
+# Moving a product to another category changes which category offer applies
+@receiver(post_save, sender=Product)
+def product_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_offer_memo()
+        refresh_effective_prices(product_ids=[instance.id])
+
+
+@receiver(post_save, sender=Category)
+def category_changed(sender, instance, created, **kwargs):
+    if not created:
+        refresh_effective_prices(category_ids=[instance.id])
+
+
+@receiver(post_save, sender=ProductVariant)
+def variant_changed(sender, instance, created, **kwargs):
+    if getattr(instance, "pricing_changed", True):
+        refresh_effective_prices(variant_ids=[instance.id])
@@ -0,0 +1,11 @@
+from jobs.queue import task
+
+
+# Run by `manage.py run_worker` every minute. Offer saves refresh the materialized prices
+# themselves (offer/signals.py); this picks up offers starting or ending on their own. A
+# failed run is not retried, the next minute's run does the same work.
+@task("offer.refresh_expired_effective_prices", max_attempts=1, every=60)
+def refresh_expired_prices():
+    from .services import refresh_expired_effective_prices
+
+    refresh_expired_effective_prices()
@@ -1,3 +1,299 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as global_apps
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from greennest.testing import ExplainTestCase
+from jobs.models import Job
+from jobs.worker import claim, run_job, schedule_periodic_tasks
+from products.models import Category, Product, ProductVariant
+from . import utils
+from .index import VERSION_KEY, OfferIndex, get_offer_index, mark_offer_index_stale
+from .middleware import OfferMemoMiddleware
+from .models import CategoryOffer, ProductOffer, VariantEffectivePrice
+from .services import refresh_effective_prices
+from .tasks import refresh_expired_prices
+from .utils import get_best_offer, get_best_offers, offer_memo
+
+
+class OfferIndexTests(ExplainTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Succulents")
+        cls.product = Product.objects.create(category=cls.category, name="Jade")
+        now = timezone.now()
+        ProductOffer.objects.create(product=cls.product, discount_percentage=10, start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        CategoryOffer.objects.create(category=cls.category, discount_percentage=5, start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+
+    def test_running_product_offers(self):
+        now = timezone.now()
+        offers = ProductOffer.objects.filter(
+            product=self.product, is_active=True, start_date__lte=now, end_date__gte=now
+        ).order_by("-discount_percentage")
+        self.assertUsesIndex(offers, "productoffer_running_idx")
+
+    def test_running_category_offers(self):
+        now = timezone.now()
+        offers = CategoryOffer.objects.filter(
+            category=self.category, is_active=True, start_date__lte=now, end_date__gte=now
+        ).order_by("-discount_percentage")
+        self.assertUsesIndex(offers, "categoryoffer_running_idx")
+
+
+class BestOffersTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        running = {"start_date": now - timedelta(days=1), "end_date": now + timedelta(days=1)}
+        ended = {"start_date": now - timedelta(days=3), "end_date": now - timedelta(days=1)}
+        upcoming = {"start_date": now + timedelta(days=1), "end_date": now + timedelta(days=3)}
+
+        herbs = Category.objects.create(name="Herbs")
+        trees = Category.objects.create(name="Trees")
+        pots = Category.objects.create(name="Pots")
+        CategoryOffer.objects.create(category=herbs, discount_percentage=10, **running)
+        CategoryOffer.objects.create(category=trees, discount_percentage=15, **running)
+        CategoryOffer.objects.create(category=pots, discount_percentage=40, **ended)
+
+        basil = Product.objects.create(category=herbs, name="Basil")
+        mint = Product.objects.create(category=herbs, name="Mint")
+        olive = Product.objects.create(category=trees, name="Olive")
+        clay = Product.objects.create(category=pots, name="Clay pot")
+        fig = Product.objects.create(category=trees, name="Fig")
+
+        # Product offer beats its category, a bigger one is not running yet
+        ProductOffer.objects.create(product=basil, discount_percentage=20, **running)
+        ProductOffer.objects.create(product=basil, discount_percentage=30, **upcoming)
+        # Same discount as its category: the product offer wins the tie
+        ProductOffer.objects.create(product=olive, discount_percentage=15, **running)
+        # Ended, disabled and out-of-range (1-90%) offers don't count
+        ProductOffer.objects.create(product=clay, discount_percentage=25, **ended)
+        ProductOffer.objects.create(product=clay, discount_percentage=35, is_active=False, **running)
+        ProductOffer.objects.create(product=fig, discount_percentage=95, **running)
+
+        for product, price in ((basil, "80.00"), (mint, "45.50"), (olive, "999.99"), (clay, "120.00"), (fig, "333.33")):
+            ProductVariant.objects.create(product=product, variant_type="Default", price=Decimal(price), stock=3)
+
+    def setUp(self):
+        mark_offer_index_stale()
+
+    def variants(self):
+        # Fresh instances each time, so no resolution is served from an earlier one
+        return list(ProductVariant.objects.select_related("product").order_by("id"))
+
+    def single(self, use_index):
+        return {variant.id: get_best_offer(variant, use_index=use_index) for variant in self.variants()}
+
+    def test_batch_matches_single_variant_resolution(self):
+        expected = self.single(use_index=False)
+        self.assertEqual(self.single(use_index=True), expected)
+        self.assertEqual(get_best_offers(self.variants(), use_index=False), expected)
+        self.assertEqual(get_best_offers(self.variants(), use_index=True), expected)
+
+    def test_cases(self):
+        offers = {variant.product.name: get_best_offers([variant])[variant.id] for variant in self.variants()}
+        self.assertEqual(
+            {name: (offer["offer_type"], offer["discount"]) for name, offer in offers.items()},
+            {
+                "Basil": ("Product Offer", 20),
+                "Mint": ("Category Offer", 10),
+                "Olive": ("Product Offer", 15),
+                "Clay pot": (None, 0),
+                "Fig": ("Category Offer", 15),
+            },
+        )
+        self.assertEqual(offers["Clay pot"]["final_price"], Decimal("120.00"))
+
+    def test_migration_seeds_the_refreshed_prices(self):
+        fields = ("variant_id", "final_price", "discount", "offer_type", "valid_until")
+        refresh_effective_prices()
+        expected = list(VariantEffectivePrice.objects.order_by("variant_id").values_list(*fields))
+        VariantEffectivePrice.objects.all().delete()
+
+        migration = import_module("offer.migrations.0003_varianteffectiveprice")
+        migration.seed_effective_prices(global_apps, None)
+        self.assertEqual(list(VariantEffectivePrice.objects.order_by("variant_id").values_list(*fields)), expected)
+
+    def test_products_not_loaded(self):
+        variants = list(ProductVariant.objects.order_by("id"))
+        get_offer_index()
+        with self.assertNumQueries(1):
+            offers = get_best_offers(variants)
+        self.assertEqual(offers, self.single(use_index=False))
+
+
+class OfferMemoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(category=Category.objects.create(name="Ferns"), name="Boston fern")
+        cls.variant = ProductVariant.objects.create(product=cls.product, variant_type="Small", price=Decimal("200"), stock=3)
+
+    def setUp(self):
+        mark_offer_index_stale()
+        patcher = mock.patch("offer.utils.get_best_offer", wraps=utils.get_best_offer)
+        self.resolve = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fresh(self):
+        return ProductVariant.objects.select_related("product").get(pk=self.variant.pk)
+
+    def add_offer(self, discount=25):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductOffer.objects.create(
+                product=self.product, discount_percentage=discount,
+                start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1),
+            )
+
+    def test_template_reads_resolve_once_per_instance(self):
+        variant = self.fresh()
+        variant.discounted_price, variant.discount_percent, variant.offer_type, variant.best_offer_info
+        self.assertEqual(self.resolve.call_count, 1)
+
+    def test_request_memo_is_shared_by_instances(self):
+        with offer_memo():
+            self.fresh().discounted_price
+            self.fresh().discounted_price
+        self.assertEqual(self.resolve.call_count, 1)
+
+    def test_without_request_memo_each_instance_resolves(self):
+        self.fresh().discounted_price
+        self.fresh().discounted_price
+        self.assertEqual(self.resolve.call_count, 2)
+
+    def test_price_change_is_resolved_again(self):
+        with offer_memo():
+            variant = self.fresh()
+            self.assertEqual(variant.discounted_price, Decimal("200"))
+            variant.price = Decimal("150")
+            self.assertEqual(variant.discounted_price, Decimal("150"))
+
+    def test_saved_offer_clears_the_memo(self):
+        with offer_memo():
+            variant = self.fresh()
+            self.assertIsNone(variant.offer_type)
+            offer = self.add_offer()
+            self.assertEqual((variant.offer_type, self.fresh().offer_type), ("Product Offer", "Product Offer"))
+
+            offer.discount_percentage = 50
+            with self.captureOnCommitCallbacks(execute=True):
+                offer.save()
+            self.assertEqual(variant.discounted_price, Decimal("100"))
+
+    def test_deleted_offer_clears_the_memo(self):
+        offer = self.add_offer()
+        with offer_memo():
+            variant = self.fresh()
+            self.assertEqual(variant.discount_percent, 25)
+            with self.captureOnCommitCallbacks(execute=True):
+                offer.delete()
+            self.assertEqual((variant.discount_percent, self.fresh().discount_percent), (0, 0))
+
+    def test_request_memo_ends_with_the_request(self):
+        seen = []
+
+        def view(request):
+            self.fresh().discounted_price
+            seen.append(utils._local.offers)
+            return HttpResponse()
+
+        middleware = OfferMemoMiddleware(view)
+        middleware(RequestFactory().get("/"))
+        self.assertIsNone(getattr(utils._local, "offers", None))
+        middleware(RequestFactory().get("/"))
+        self.assertEqual(self.resolve.call_count, 2)
+        self.assertIsNot(seen[0], seen[1])
+
+
+class EffectivePriceRefreshTests(TestCase):
+
+    def test_worker_picks_up_an_offer_that_started(self):
+        product = Product.objects.create(category=Category.objects.create(name="Cacti"), name="Barrel")
+        variant = ProductVariant.objects.create(product=product, variant_type="Small", price=Decimal("300"), stock=3)
+        now = timezone.now()
+        offer = ProductOffer.objects.create(
+            product=product, discount_percentage=20, start_date=now + timedelta(hours=1), end_date=now + timedelta(days=1),
+        )
+        row = VariantEffectivePrice.objects.get(variant=variant)
+        self.assertEqual((row.final_price, row.valid_until), (Decimal("300"), offer.start_date))
+
+        # The start date comes, with no save to refresh the row
+        ProductOffer.objects.filter(pk=offer.pk).update(start_date=now - timedelta(minutes=1))
+        VariantEffectivePrice.objects.filter(variant=variant).update(valid_until=now - timedelta(minutes=1))
+
+        schedule_periodic_tasks()
+        for job_id in claim("w1", 10):
+            run_job(job_id)
+        row.refresh_from_db()
+        self.assertEqual((row.final_price, row.offer_type, row.valid_until), (Decimal("240"), "Product Offer", offer.end_date))
+        self.assertTrue(Job.objects.filter(task=refresh_expired_prices.name, status="done").exists())
+
+
+class OfferIntervalIndexTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.start, self.end = self.now + timedelta(hours=1), self.now + timedelta(hours=2)
+        mark_offer_index_stale()
+
+    def test_offer_runs_from_start_to_end_inclusive(self):
+        index = OfferIndex([(1, self.start, self.end, 10)], [(7, self.start, self.end, 5)], self.now)
+        tick = timedelta(microseconds=1)
+        self.assertEqual(index.best_discounts(1, 7, self.start - tick), (None, None))
+        self.assertEqual(index.best_discounts(1, 7, self.start), (10, 5))
+        self.assertEqual(index.best_discounts(1, 7, self.end), (10, 5))
+        self.assertEqual(index.best_discounts(1, 7, self.end + tick), (None, None))
+        self.assertEqual(index.best_discounts(2, 8, self.start), (None, None))
+
+    def test_highest_running_offer(self):
+        index = OfferIndex(
+            [(1, self.now, self.end, 10), (1, self.now, self.start, 30), (1, self.end, self.end + timedelta(hours=1), 50)],
+            [], self.now,
+        )
+        self.assertEqual(index.best_discounts(1, None, self.now)[0], 30)
+        self.assertEqual(index.best_discounts(1, None, self.start + timedelta(minutes=1))[0], 10)
+
+    def test_expires_at_the_next_boundary(self):
+        index = OfferIndex([(1, self.start, self.end, 10)], [], self.now)
+        self.assertEqual(index.expires_at, self.start)
+        self.assertFalse(index.is_expired(self.start))
+        self.assertTrue(index.is_expired(self.start + timedelta(microseconds=1)))
+        # Loaded once the offer started, only its end is left
+        loaded_later = self.start + timedelta(minutes=1)
+        self.assertEqual(OfferIndex([(1, self.start, self.end, 10)], [], loaded_later).expires_at, self.end)
+        self.assertIsNone(OfferIndex([], [], self.now).expires_at)
+
+    def test_reload_when_an_offer_starts(self):
+        product = Product.objects.create(category=Category.objects.create(name="Palms"), name="Areca")
+        ProductOffer.objects.create(product=product, discount_percentage=15, start_date=self.start, end_date=self.end)
+        index = get_offer_index()
+        self.assertEqual(index.best_discounts(product.id, product.category_id, self.now), (None, None))
+
+        with mock.patch("offer.index.timezone.now", return_value=self.start + timedelta(seconds=1)):
+            reloaded = get_offer_index()
+        self.assertIsNot(reloaded, index)
+        self.assertEqual(reloaded.best_discounts(product.id, product.category_id, self.start), (15, None))
+
+    def test_reload_when_another_worker_bumps_the_version(self):
+        product = Product.objects.create(category=Category.objects.create(name="Palms"), name="Areca")
+        index = get_offer_index(check_version=True)
+        # Saved by another worker: the on_commit reload of this one never runs here
+        ProductOffer.objects.create(
+            product=product, discount_percentage=15, start_date=self.now - timedelta(hours=1), end_date=self.end,
+        )
+        self.assertIs(get_offer_index(check_version=True), index)
+
+        cache.set(VERSION_KEY, "from-another-worker", None)
+        reloaded = get_offer_index(check_version=True)
+        self.assertIsNot(reloaded, index)
+        self.assertEqual(reloaded.best_discounts(product.id, product.category_id, timezone.now()), (15, None))
+        self.assertIs(get_offer_index(check_version=True), reloaded)
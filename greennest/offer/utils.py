@@ -1,17 +1,111 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Max
 from django.utils import timezone
 from .models import ProductOffer, CategoryOffer
+from .index import get_offer_index
+
+
+# Offer resolution memo.
+# _generation is bumped whenever offers change (see offer/signals.py); it is part of every
+# memo key, so results cached before a change are never served after it. The request memo
+# only exists inside offer_memo() (OfferMemoMiddleware wraps every request in it).
+_generation = 0
+_local = threading.local()
+
+
+def invalidate_offer_memo():
+    global _generation
+    _generation += 1
+
+
+@contextmanager
+def offer_memo():
+    previous = getattr(_local, "offers", None)
+    _local.offers = {}
+    try:
+        yield
+    finally:
+        _local.offers = previous
+
+
+def _memo_key(variant):
+    # Price is part of the key so a price edit inside the request is re-resolved
+    return (variant.pk, variant.product_id, variant.price, _generation)
+
+
+def _remember(variant, offer_info):
+    key = _memo_key(variant)
+    variant._best_offer_info = offer_info
+    variant._best_offer_key = key
+    memo = getattr(_local, "offers", None)
+    if memo is not None:
+        memo[key] = offer_info
+
+
+def _recall(variant):
+    key = _memo_key(variant)
+    if variant.__dict__.get("_best_offer_key") == key:
+        return variant._best_offer_info
+    memo = getattr(_local, "offers", None)
+    if memo is not None and key in memo:
+        variant._best_offer_info = memo[key]
+        variant._best_offer_key = key
+        return memo[key]
+    return None
+
+
+def _apply_best_offer(original_price, product_discount, category_discount):
+
+    # Compare Product Offer vs Category Offer discounts (None = no offer) for a price.
+
+    product_price = original_price
+    category_price = original_price
+
+    # Apply product offer
+    if product_discount is not None and 1 <= product_discount <= 90:
+        product_price = original_price - (original_price * product_discount / 100)
+
+    # Apply category offer
+    if category_discount is not None and 1 <= category_discount <= 90:
+        category_price = original_price - (original_price * category_discount / 100)
+
+    # Choose best
+    if product_price <= category_price:
+        final_price = product_price
+        discount = product_discount if product_discount is not None else 0
+        offer_type = "Product Offer" if product_discount is not None else None
+    else:
+        final_price = category_price
+        discount = category_discount if category_discount is not None else 0
+        offer_type = "Category Offer" if category_discount is not None else None
+
+    return {
+        "original_price": original_price,
+        "final_price": round(final_price, 2),
+        "discount": discount,
+        "offer_type": offer_type,
+    }
+
+
+def get_best_offer(variant, use_index=True):
 
-def get_best_offer(variant):
-   
     #Return best offer (Product Offer vs Category Offer) for a given ProductVariant.
-   
-    original_price = variant.price
+
     now = timezone.now()
 
+    # Answered from the in-process offer index (offer/index.py) without touching the DB
+    if use_index:
+        product_discount, category_discount = get_offer_index().best_discounts(
+            variant.product_id, variant.product.category_id, now
+        )
+        return _apply_best_offer(variant.price, product_discount, category_discount)
+
     # Get active product offers
     product_offer = (
         ProductOffer.objects.filter(
-            product=variant.product,
+            product_id=variant.product_id,
             start_date__lte=now,
             end_date__gte=now,
             is_active=True
@@ -21,37 +115,113 @@ def get_best_offer(variant):
     # Get active category offers
     category_offer = (
         CategoryOffer.objects.filter(
-            category=variant.product.category,
+            category_id=variant.product.category_id,
             start_date__lte=now,
             end_date__gte=now,
             is_active=True
         ).order_by("-discount_percentage").first()
     )
 
-    product_price = original_price
-    category_price = original_price
+    return _apply_best_offer(
+        variant.price,
+        product_offer.discount_percentage if product_offer else None,
+        category_offer.discount_percentage if category_offer else None,
+    )
 
-    # Apply product offer
-    if product_offer and 1 <= product_offer.discount_percentage <= 90:
-        product_price = original_price - (original_price * product_offer.discount_percentage / 100)
 
-    # Apply category offer
-    if category_offer and 1 <= category_offer.discount_percentage <= 90:
-        category_price = original_price - (original_price * category_offer.discount_percentage / 100)
+def get_cached_best_offer(variant):
 
-    # Choose best
-    if product_price <= category_price:
-        final_price = product_price
-        discount = product_offer.discount_percentage if product_offer else 0
-        offer_type = "Product Offer" if product_offer else None
-    else:
-        final_price = category_price
-        discount = category_offer.discount_percentage if category_offer else 0
-        offer_type = "Category Offer" if category_offer else None
+    # get_best_offer, resolved at most once per variant per request (backs ProductVariant.best_offer_info).
 
-    return {
-        "original_price": original_price,
-        "final_price": round(final_price, 2),
-        "discount": discount,
-        "offer_type": offer_type,
-    }
+    offer_info = _recall(variant)
+    if offer_info is None:
+        offer_info = get_best_offer(variant)
+        _remember(variant, offer_info)
+    return offer_info
+
+
+def get_best_offers(variants, use_index=True):
+
+    # Batched get_best_offer: {variant_id: offer_info} for many variants in at most three queries
+    # (one with the offer index). Variants already resolved in this request are served from the memo.
+    # use_index=False reads offers straight from the DB, e.g. inside a transaction that just changed them.
+
+    from products.models import Product, ProductVariant
+
+    result = {}
+    pending = []
+    for variant in variants:
+        if variant is None:
+            continue
+        offer_info = _recall(variant)
+        if offer_info is None:
+            pending.append(variant)
+        else:
+            result[variant.id] = offer_info
+
+    variants = pending
+    if not variants:
+        return result
+
+    now = timezone.now()
+
+    # product_id -> category_id, only hitting the DB for products not already loaded
+    category_ids = {}
+    missing = set()
+    for variant in variants:
+        if ProductVariant.product.is_cached(variant):
+            category_ids[variant.product_id] = variant.product.category_id
+        else:
+            missing.add(variant.product_id)
+    missing -= category_ids.keys()
+    if missing:
+        category_ids.update(
+            Product.objects.filter(id__in=missing).values_list("id", "category_id")
+        )
+
+    if use_index:
+        index = get_offer_index()
+        for variant in variants:
+            offer_info = _apply_best_offer(
+                variant.price,
+                *index.best_discounts(variant.product_id, category_ids[variant.product_id], now)
+            )
+            _remember(variant, offer_info)
+            result[variant.id] = offer_info
+        return result
+
+    # Highest active discount per product / per category
+    product_discounts = dict(
+        ProductOffer.objects.filter(
+            product_id__in=category_ids.keys(),
+            start_date__lte=now,
+            end_date__gte=now,
+            is_active=True
+        ).values("product_id").annotate(best=Max("discount_percentage")).values_list("product_id", "best")
+    )
+    category_discounts = dict(
+        CategoryOffer.objects.filter(
+            category_id__in=set(category_ids.values()),
+            start_date__lte=now,
+            end_date__gte=now,
+            is_active=True
+        ).values("category_id").annotate(best=Max("discount_percentage")).values_list("category_id", "best")
+    )
+
+    for variant in variants:
+        offer_info = _apply_best_offer(
+            variant.price,
+            product_discounts.get(variant.product_id),
+            category_discounts.get(category_ids[variant.product_id]),
+        )
+        _remember(variant, offer_info)
+        result[variant.id] = offer_info
+    return result
+
+
+def attach_best_offers(variants):
+
+    # Resolve offers in bulk up front, so best_offer_info (and discounted_price /
+    # discount_percent / offer_type) on these variants never queries from the template.
+
+    return get_best_offers(variants)
@@ -7,4 +7,9 @@ urlpatterns = [
 
     path('sales-report/', views.sales_report, name='sales_report'),
     path("sales-report/pdf/", views.download_sales_report_pdf, name="download_sales_report_pdf"),
+    path("sales-report/pdf/<int:report_id>/status/", views.sales_report_pdf_status, name="sales_report_pdf_status"),
+    path("sales-report/pdf/<int:report_id>/", views.sales_report_pdf_file, name="sales_report_pdf_file"),
+
+    path("export/orders/", views.export_orders, name="export_orders"),
+    path("export/items/", views.export_order_items, name="export_order_items"),
 ]
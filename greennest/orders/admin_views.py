@@ -1,29 +1,38 @@
 from django.db.models import Q
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.cache import never_cache
 from django.db.models import Q, Exists, OuterRef
 from django.contrib import messages
+from django.contrib.auth import get_user_model
 from django.utils import timezone
 from orders.models import Order, OrderItem
 
 
 from django.db.models import Sum, Count
 from datetime import datetime, timedelta
-import pandas as pd
-from io import BytesIO
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+from django.http import FileResponse, JsonResponse
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from urllib.parse import urlencode
 
 from django.db.models import Q, Exists, OuterRef
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import never_cache
-from orders.models import Order, OrderItem
+from orders.models import Order, OrderItem, SalesReport
+from orders.reports import request_sales_report
+from orders.summary import SALES_STATUSES, sales_totals
+from greennest.exports import EXPORT_CHUNK_SIZE, export_response
 from wallet.models import Wallet, WalletTransaction
 
+User = get_user_model()
+
+# Admin check
+def is_admin(user):
+    return user.is_staff or user.is_superuser
+
 
 @login_required(login_url='admin_login')
 @never_cache
@@ -42,12 +51,17 @@ def admin_order_list(request):
     # --- Search ---
     search_query = request.GET.get('search', '').strip()
     if search_query:
-        orders = orders.filter(
-            Q(id__icontains=search_query) |
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(user__username__icontains=search_query)
-        )
+        # Names are matched on users_user alone, where each icontains has its trigram index,
+        # then orders come in through the user_id index. An OR across the join can't use either.
+        matching_users = User.objects.filter(
+            Q(first_name__icontains=search_query) |
+            Q(last_name__icontains=search_query) |
+            Q(username__icontains=search_query)
+        ).values('id')
+        search = Q(user_id__in=matching_users)
+        if search_query.isdecimal() and len(search_query) <= 18:  # an order number, within bigint
+            search |= Q(id=int(search_query))
+        orders = orders.filter(search)
 
     # --- Filter by status ---
     status_filter = request.GET.get('status', '')
@@ -251,28 +265,15 @@ def admin_order_detail(request, order_id):
 @never_cache
 def sales_report(request):
     # only completed/delivered orders count as sales
-    orders = Order.objects.filter(status__in=["completed", "delivered"])
+    orders = Order.objects.filter(status__in=SALES_STATUSES)
 
-    # summary numbers
-    total_orders = orders.count()
-    total_revenue = orders.aggregate(Sum("final_amount"))["final_amount__sum"] or 0
-    total_discount = orders.aggregate(Sum("discount"))["discount__sum"] or 0
-    total_tax = orders.aggregate(Sum("tax"))["tax__sum"] or 0
-    total_shipping = orders.aggregate(Sum("shipping_charge"))["shipping_charge__sum"] or 0
-
-    # date filters
-    today = datetime.today().date()
-    last_week = today - timedelta(days=7)
-    last_month = today - timedelta(days=30)
-
-    daily_sales = orders.filter(created_at__date=today).aggregate(Sum("final_amount"))["final_amount__sum"] or 0
-    weekly_sales = orders.filter(created_at__date__gte=last_week).aggregate(Sum("final_amount"))["final_amount__sum"] or 0
-    monthly_sales = orders.filter(created_at__date__gte=last_month).aggregate(Sum("final_amount"))["final_amount__sum"] or 0
+    # summary numbers and today / last 7 / last 30 days, from the daily rollup
+    totals = sales_totals()
 
     # custom date range filter
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
-    filtered_orders = orders
+    filtered_orders = orders.select_related("user")
     if start_date and end_date:
         filtered_orders = orders.filter(
             created_at__date__range=[start_date, end_date]
@@ -280,14 +281,7 @@ def sales_report(request):
 
     context = {
         "orders": filtered_orders,
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-        "total_discount": total_discount,
-        "total_tax": total_tax,
-        "total_shipping": total_shipping,
-        "daily_sales": daily_sales,
-        "weekly_sales": weekly_sales,
-        "monthly_sales": monthly_sales,
+        **totals,
         "start_date": start_date,
         "end_date": end_date,
     }
@@ -296,88 +290,108 @@ def sales_report(request):
 
 
 
-from django.utils.dateparse import parse_date
+def _report_state(report):
+    return {
+        "status": report.status,
+        "status_url": reverse("sales_report_pdf_status", args=[report.id]),
+        "download_url": reverse("sales_report_pdf_file", args=[report.id]) if report.status == "ready" else None,
+    }
 
-def download_sales_report_pdf(request):
-    orders = Order.objects.filter(status__in=["completed", "delivered"])
 
+# Sales report PDF: built in the background (orders/reports.py). The page asks for it
+# with fetch and polls sales_report_pdf_status until it can download the file.
+@login_required(login_url='admin_login')
+@user_passes_test(is_admin)
+@never_cache
+def download_sales_report_pdf(request):
     # Apply custom date range filter (same as sales_report)
-    start_date = request.GET.get("start_date")
-    end_date = request.GET.get("end_date")
+    try:
+        start_date = parse_date(request.GET.get("start_date") or "")
+        end_date = parse_date(request.GET.get("end_date") or "")
+    except ValueError:
+        # Well formed but no such day (2024-02-30): the whole range, like no dates
+        start_date = end_date = None
+    if not (start_date and end_date):
+        start_date = end_date = None
+
+    report = request_sales_report(start_date, end_date)
+    if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        return JsonResponse(_report_state(report))
+    if report.status == "ready":
+        return redirect("sales_report_pdf_file", report_id=report.id)
+
+    messages.info(request, "The sales report PDF is being prepared, try the download again in a moment.")
+    query = urlencode({"start_date": request.GET.get("start_date", ""), "end_date": request.GET.get("end_date", "")})
+    return redirect(f"{reverse('sales_report')}?{query}")
 
-    if start_date and end_date:
-        orders = orders.filter(
-            created_at__date__range=[parse_date(start_date), parse_date(end_date)]
-        )
 
-    # Create a PDF in memory
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Title
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(200, height - 50, "Sales Report")
-
-    # Date
-    p.setFont("Helvetica", 10)
-    p.drawString(50, height - 80, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-
-    # Summary
-    total_orders = orders.count()
-    total_revenue = orders.aggregate(Sum("final_amount"))["final_amount__sum"] or 0
-    total_discount = orders.aggregate(Sum("discount"))["discount__sum"] or 0
-    total_tax = orders.aggregate(Sum("tax"))["tax__sum"] or 0
-    total_shipping = orders.aggregate(Sum("shipping_charge"))["shipping_charge__sum"] or 0
-
-    y = height - 120
-    summary = [
-        f"Total Orders: {total_orders}",
-        f"Total Revenue: Rs.{total_revenue:.2f}",
-        f"Total Discount: Rs.{total_discount:.2f}",
-        f"Total Tax: Rs.{total_tax:.2f}",
-        f"Total Shipping: Rs.{total_shipping:.2f}",
+@login_required(login_url='admin_login')
+@user_passes_test(is_admin)
+@never_cache
+def sales_report_pdf_status(request, report_id):
+    report = get_object_or_404(SalesReport.objects.only("id", "status"), id=report_id)
+    return JsonResponse(_report_state(report))
+
+
+@login_required(login_url='admin_login')
+@user_passes_test(is_admin)
+@never_cache
+def sales_report_pdf_file(request, report_id):
+    report = get_object_or_404(SalesReport, id=report_id, status="ready")
+    return FileResponse(report.file.open("rb"), as_attachment=True, filename="sales_report.pdf", content_type="application/pdf")
+
+
+# CSV/XLSX exports for finance (?start_date=&end_date=&status=&format=xlsx), streamed
+def _export_filters(request, orders, prefix=""):
+    try:
+        start_date = parse_date(request.GET.get("start_date") or "")
+        end_date = parse_date(request.GET.get("end_date") or "")
+    except ValueError:
+        # Well formed but no such day (2024-02-30): no date filter, like no dates
+        start_date = end_date = None
+    if start_date:
+        orders = orders.filter(**{f"{prefix}created_at__date__gte": start_date})
+    if end_date:
+        orders = orders.filter(**{f"{prefix}created_at__date__lte": end_date})
+    if request.GET.get("status"):
+        orders = orders.filter(**{f"{prefix}status": request.GET["status"]})
+    return orders
+
+
+@login_required(login_url='admin_login')
+@user_passes_test(is_admin)
+@never_cache
+def export_orders(request):
+    orders = _export_filters(request, Order.objects.all()).order_by("created_at", "id").values_list(
+        "id", "created_at", "user__email", "user__first_name", "status", "payment_method",
+        "total_amount", "discount", "tax", "shipping_charge", "final_amount", "coupon__code",
+    )
+
+    def rows():
+        for order_id, created_at, *rest in orders.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            # same as Order.display_id
+            yield (f"OID{order_id}-{created_at.strftime('%d%m%Y')}", created_at, *rest)
+
+    header = [
+        "Order ID", "Date", "Email", "Customer", "Status", "Payment Method",
+        "Total", "Discount", "Tax", "Shipping", "Final Amount", "Coupon",
     ]
-    p.setFont("Helvetica", 11)
-    for line in summary:
-        p.drawString(50, y, line)
-        y -= 20
-
-    # Table Header
-    y -= 20
-    p.setFont("Helvetica-Bold", 10)
-    p.drawString(50, y, "Order ID")
-    p.drawString(150, y, "User")
-    p.drawString(230, y, "Status")
-    p.drawString(330, y, "Final Amount")
-    p.drawString(400, y, "Date")
-    y -= 15
-    p.line(50, y, 500, y)
-    y -= 15
-
-    p.setFont("Helvetica", 10)
-    if start_date and end_date:
-        p.drawString(50, height - 95, f"Date Range: {start_date} to {end_date}")
-        
-    # Orders list
-    p.setFont("Helvetica", 9)
-    for order in orders:
-        if y < 80:  
-            p.showPage()
-            y = height - 50
-            p.setFont("Helvetica", 9)
-
-        p.drawString(50, y, str(order.display_id))
-        p.drawString(150, y, str(order.user.first_name))
-        p.drawString(230, y, str(order.status))
-        p.drawString(330, y, f"Rs.{order.final_amount:.2f}")
-        p.drawString(400, y, order.created_at.strftime("%Y-%m-%d"))
-        y -= 20
-
-    p.save()
-    buffer.seek(0)
-
-    # Return response
-    response = HttpResponse(buffer, content_type="application/pdf")
-    response["Content-Disposition"] = 'attachment; filename="sales_report.pdf"'
-    return response
+    return export_response(header, rows(), "orders", request.GET.get("format"), title="Orders")
+
+
+@login_required(login_url='admin_login')
+@user_passes_test(is_admin)
+@never_cache
+def export_order_items(request):
+    items = (
+        OrderItem.objects.filter(order__in=_export_filters(request, Order.objects.all()))
+        .order_by("order_id", "id")
+        .values_list(
+            "order_id", "order__created_at", "order__user__email", "variant__product__name",
+            "variant__variant_type", "quantity", "price", "total_price", "status",
+        )
+    )
+    header = ["Order", "Order Date", "Email", "Product", "Variant", "Quantity", "Price", "Total", "Item Status"]
+    return export_response(
+        header, items.iterator(chunk_size=EXPORT_CHUNK_SIZE), "order_items", request.GET.get("format"), title="Order items"
+    )
@@ -0,0 +1,232 @@
+import hashlib
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+from io import BytesIO
+
+from django.core.cache import caches
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+
+# Invoice / order summary PDFs.
+# The font is parsed from disk once per process, not on every download. A rendered PDF
+# is cached in the "files" cache under (order id, order version), where the version is a
+# hash of everything the PDF shows: order status and amounts, the address, and each
+# item's status, price, quantity and product. Downloading again after a delivery batch serves the cached bytes
+# without touching ReportLab; any change to the order gives a new version (and a new render).
+INVOICE_FONT = "Arial"
+INVOICE_FONT_FILE = "arial.ttf"
+FALLBACK_FONT = "Helvetica"
+INVOICE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+_font_name = None
+_font_lock = threading.Lock()
+
+
+def register_fonts():
+    """Register the invoice font on first use; the name to use (Helvetica if the TTF isn't there)."""
+    global _font_name
+    if _font_name is None:
+        with _font_lock:
+            if _font_name is None:
+                try:
+                    pdfmetrics.registerFont(TTFont(INVOICE_FONT, INVOICE_FONT_FILE))
+                    _font_name = INVOICE_FONT
+                except Exception:
+                    _font_name = FALLBACK_FONT
+    return _font_name
+
+
+def invoice_items(order):
+    return list(order.items.select_related("variant__product").order_by("id"))
+
+
+def _item_product(item):
+    # variant is SET_NULL: an item whose variant was deleted since keeps its own price and
+    # quantity, but no longer has a name, type or tax rate to show
+    return item.variant.product if item.variant_id else None
+
+
+def _item_label(item):
+    if not item.variant_id:
+        return "Item no longer available"
+    return f"{item.variant.product.name} ({item.variant.variant_type})"
+
+
+def _item_tax_rate(item):
+    return getattr(_item_product(item), "tax_rate", 0)
+
+
+def invoice_version(order, items):
+    address = order.address
+    parts = [
+        order.status, order.created_at.isoformat(), order.shipping_charge, order.discount, order.coupon_id,
+        getattr(order, "other_discount", ""),
+    ]
+    if address:
+        parts += [address.full_name, address.line1, address.line2, address.city, address.state,
+                  address.postal_code, address.phone]
+    for item in items:
+        parts += [item.id, item.status, item.price, item.quantity, item.total_price, _item_label(item),
+                  _item_tax_rate(item)]
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _invoice_key(order, version):
+    return f"orders:invoice:{order.id}:{version}"
+
+
+def invoice_pdf(order):
+    """The PDF bytes of `order`'s invoice (order summary until delivered), rendered once per order version."""
+    items = invoice_items(order)
+    key = _invoice_key(order, invoice_version(order, items))
+    cache = caches["files"]
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render_invoice(order, items)
+        cache.set(key, pdf, INVOICE_CACHE_TIMEOUT)
+    return pdf
+
+
+def render_invoice(order, items):
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    font_name_to_use = register_fonts()
+    p.setFont(font_name_to_use, 12)
+
+    def q2(val):
+        return Decimal(val).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    items_to_show = [item for item in items if item.status not in ("cancelled", "returned")]
+
+    # --- Totals ---
+    if items_to_show:
+        subtotal = sum(item.total_price for item in items_to_show)
+        tax = sum(q2(item.total_price * _item_tax_rate(item) / 100) for item in items_to_show)
+        shipping = order.shipping_charge or Decimal("0.00")
+    else:
+        subtotal = Decimal("0.00")
+        tax = Decimal("0.00")
+        shipping = Decimal("0.00")
+
+    # --- Discounts ---
+    coupon_discount = Decimal("0.00")
+    other_discount = getattr(order, "other_discount", Decimal("0.00"))
+
+    if order.coupon_id and subtotal > 0:
+        original_subtotal = sum(item.price * item.quantity for item in items)
+        coupon_discount = (subtotal / original_subtotal * order.discount) if original_subtotal > 0 else order.discount
+
+    # --- Final Amount ---
+    final_amount = q2(subtotal + shipping - coupon_discount - other_discount + tax)
+
+    # ------------------ HEADER ------------------
+    company_name = "GreenNest Pvt Ltd"
+    company_address = "123, MG Road, TVPM, Kerala, 682001"
+    company_phone = "+91-9876543210"
+    company_email = "greennest.ecom@gmail.com"
+
+    p.setFont(font_name_to_use, 14)
+    p.drawCentredString(width / 2, height - 50, company_name)
+
+    p.setFont(font_name_to_use, 10)
+    p.drawCentredString(width / 2, height - 65, company_address)
+    p.drawCentredString(width / 2, height - 80, f"Phone: {company_phone} | Email: {company_email}")
+
+    p.setLineWidth(1)
+    p.line(40, height - 90, width - 40, height - 90)
+
+    p.setFont(font_name_to_use, 14)
+    if order.status.lower() == "delivered":
+        title_text = f"Invoice No: {order.display_id}"
+    else:
+        title_text = f"Order Summary ({order.status.capitalize()})"
+    p.drawCentredString(width / 2, height - 110, title_text)
+
+    p.setFont(font_name_to_use, 10)
+    p.drawString(50, height - 115, f"Date: {order.created_at.strftime('%d %b %Y')}")
+    p.drawString(50, height - 130, f"Status: {order.status}")
+
+    # ------------------ CUSTOMER ADDRESS ------------------
+    y = height - 160
+    p.setFont(font_name_to_use, 12)
+    p.drawString(50, y, "Shipping Address:")
+    y -= 15
+    p.setFont(font_name_to_use, 10)
+    p.drawString(50, y, order.address.full_name)
+    y -= 15
+    p.drawString(50, y, f"{order.address.line1}, {order.address.line2}")
+    y -= 15
+    p.drawString(50, y, f"{order.address.city}, {order.address.state}")
+    y -= 15
+    p.drawString(50, y, f"Phone: {order.address.phone}")
+
+    # ------------------ ITEMS TABLE ------------------
+    y -= 30
+    p.setFont(font_name_to_use, 12)
+    p.drawString(50, y, "Product")
+    p.drawString(250, y, "Price")
+    p.drawString(350, y, "Qty")
+    p.drawString(400, y, "Total")
+    y -= 20
+
+    p.setFont(font_name_to_use, 10)
+
+    for item in items_to_show:
+        p.drawString(50, y, _item_label(item))
+        p.drawRightString(320, y, f"{item.price:.2f}")
+        p.drawRightString(370, y, str(item.quantity))
+        p.drawRightString(470, y, f"{item.total_price:.2f}")
+        y -= 15
+        if y < 100:
+            p.showPage()
+            y = height - 50
+            p.setFont(font_name_to_use, 10)
+
+    # ------------------ TOTALS ------------------
+    y -= 20
+    line_height = 15
+    p.setFont(font_name_to_use, 10)
+
+    p.drawString(350, y, "Subtotal:")
+    p.drawRightString(width - 50, y, f"{subtotal:.2f}")
+    y -= line_height
+
+    p.drawString(350, y, "Shipping:")
+    p.drawRightString(width - 50, y, f"{shipping:.2f}")
+    y -= line_height
+
+    if coupon_discount > 0:
+        p.drawString(350, y, "Coupon Discount:")
+        p.drawRightString(width - 50, y, f"-{coupon_discount:.2f}")
+        y -= line_height
+
+    if other_discount > 0:
+        p.drawString(350, y, "Other Discount:")
+        p.drawRightString(width - 50, y, f"-{other_discount:.2f}")
+        y -= line_height
+
+    p.drawString(350, y, "Tax:")
+    p.drawRightString(width - 50, y, f"{tax:.2f}")
+    y -= line_height + 5
+
+    p.setFont(font_name_to_use, 12)
+    if order.status.lower() == "delivered":
+        p.drawString(350, y, "Final Amount:")
+        p.drawRightString(width - 50, y, f"{final_amount:.2f}")
+    else:
+        p.drawString(350, y, "Payable Amount:")
+        p.drawRightString(width - 50, y, f"{final_amount:.2f}")
+
+    # ------------------ FOOTER ------------------
+    p.setFont(font_name_to_use, 8)
+    p.drawString(50, 50, "Thank you for shopping with us!")
+
+    p.showPage()
+    p.save()
+
+    return buffer.getvalue()
@@ -0,0 +1,246 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import Client
+from django.urls import resolve, reverse
+
+from orders.models import OrderItem
+from products.models import Category, Product, ProductVariant
+from users.models import Address, Profile, User
+from wallet.models import Wallet
+
+
+# Seeded rows are recognised by these, and wiped at the start of every run
+CATEGORY_NAME = "Load test"
+EMAIL_DOMAIN = "loadtest.greennest.invalid"
+
+PRICE = Decimal("200")  # keeps a 2-unit basket under the ₹1000 COD limit
+WALLET_BALANCE = Decimal("100000")
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _is_deadlock(exc):
+    cause = exc.__cause__ or exc
+    return getattr(cause, "pgcode", None) == "40P01" or "deadlock detected" in str(exc)
+
+
+class Stats:
+    """Numbers collected by every customer thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {"add_to_cart": [], "checkout_address": [], "checkout_payment": [], "checkout": []}
+        self.lock_waits = []
+        self.deadlocks = 0
+        self.outcomes = {"placed": 0, "rejected": 0, "error": 0}
+        self.errors = []
+
+    def add_latency(self, step, seconds):
+        with self.lock:
+            self.latencies[step].append(seconds)
+
+    def add_outcome(self, outcome, error=None):
+        with self.lock:
+            self.outcomes[outcome] += 1
+            if error:
+                self.errors.append(error)
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper: time row-lock statements, count deadlocks
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except Exception as exc:
+            if _is_deadlock(exc):
+                with self.lock:
+                    self.deadlocks += 1
+            raise
+        finally:
+            if "FOR UPDATE" in sql:
+                with self.lock:
+                    self.lock_waits.append(time.perf_counter() - start)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent simulated customers through add to cart -> checkout address -> checkout payment "
+        "(COD and wallet) against the configured database and check that nothing is oversold. "
+        "Meant for a local PostgreSQL copy, never production: it creates and deletes its own data, so it "
+        "only runs with DEBUG on or --i-know-this-is-not-production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=100, help="Simulated customers (one checkout each).")
+        parser.add_argument("--concurrency", type=int, default=20, help="Customers checking out at the same time.")
+        parser.add_argument("--variants", type=int, default=3, help="Seeded variants the customers compete for.")
+        parser.add_argument("--stock", type=int, default=20, help="Starting stock of every seeded variant.")
+        parser.add_argument("--max-items", type=int, default=2, help="Most variants one customer buys.")
+        parser.add_argument("--methods", default="cod,wallet", help="Payment methods to pick from.")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed, for repeatable baskets.")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded data after the run.")
+        parser.add_argument(
+            "--i-know-this-is-not-production", action="store_true", dest="not_production",
+            help="Run with DEBUG off, e.g. against a staging copy.",
+        )
+
+    def handle(self, *args, **options):
+        if not (settings.DEBUG or options["not_production"]):
+            raise CommandError(
+                "DEBUG is off, this may be production: the load test writes to and deletes from "
+                f"{connection.settings_dict['NAME']}. Pass --i-know-this-is-not-production if it is not."
+            )
+        if connection.vendor != "postgresql":
+            self.stderr.write(self.style.WARNING(
+                f"Database is {connection.vendor}: row locks and concurrency will not match production (PostgreSQL)."
+            ))
+        methods = [method.strip() for method in options["methods"].split(",") if method.strip()]
+        if not set(methods) <= {"cod", "wallet"}:
+            raise CommandError("--methods takes cod and/or wallet.")
+
+        rng = random.Random(options["seed"])
+        self.cleanup()
+        variants, users = self.seed(options["variants"], options["stock"], options["customers"])
+        baskets = [
+            (user, rng.sample(variants, rng.randint(1, min(options["max_items"], len(variants)))), rng.choice(methods))
+            for user in users
+        ]
+
+        stats = Stats()
+        pending = list(baskets)
+        pending_lock = threading.Lock()
+
+        def worker():
+            try:
+                with connection.execute_wrapper(stats):
+                    while True:
+                        with pending_lock:
+                            if not pending:
+                                return
+                            basket = pending.pop()
+                        self.checkout(stats, *basket)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(max(1, options["concurrency"]))]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.report(stats, elapsed)
+        oversold = self.verify(variants, options["stock"])
+        if not options["keep"]:
+            self.cleanup()
+        if oversold:
+            raise CommandError("Oversold: " + "; ".join(oversold))
+        self.stdout.write(self.style.SUCCESS("No variant was oversold."))
+
+    def seed(self, variant_count, stock, customer_count):
+        category = Category.objects.create(name=CATEGORY_NAME)
+        product = Product.objects.create(category=category, name="Load test plant", light_requirement="Low")
+        variants = [
+            ProductVariant.objects.create(product=product, variant_type=f"Size {n + 1}", price=PRICE, stock=stock)
+            for n in range(variant_count)
+        ]
+
+        # bulk_create skips password hashing and the profile signal (the profile is added below)
+        User.objects.bulk_create([
+            User(username=f"loadtest{n}", email=f"customer{n}@{EMAIL_DOMAIN}", password="!")
+            for n in range(customer_count)
+        ])
+        users = list(User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").order_by("id"))
+        Profile.objects.bulk_create([Profile(user=user) for user in users])
+        Wallet.objects.bulk_create([Wallet(user=user, balance=WALLET_BALANCE) for user in users])
+        addresses = Address.objects.bulk_create([
+            Address(
+                user=user, full_name=user.username, phone="9999999999", line1="1 Test Street",
+                city="Kochi", state="Kerala", postal_code="682001", is_default=True,
+            )
+            for user in users
+        ])
+        for user, address in zip(users, addresses):
+            user.loadtest_address_id = address.id
+        return variants, users
+
+    def checkout(self, stats, user, variants, method):
+        client = Client()
+        started = time.perf_counter()
+        try:
+            client.force_login(user)
+            for variant in variants:
+                step = time.perf_counter()
+                client.post(reverse("add_to_cart", args=[variant.id]), {"quantity": 1})
+                stats.add_latency("add_to_cart", time.perf_counter() - step)
+
+            step = time.perf_counter()
+            client.get(reverse("checkout_address"))
+            stats.add_latency("checkout_address", time.perf_counter() - step)
+
+            step = time.perf_counter()
+            response = client.post(
+                reverse("checkout_payment"),
+                {"address_id": user.loadtest_address_id, "payment_method": method},
+            )
+            # COD/wallet orders redirect to the payment step, which records the Payment
+            location = response.get("Location", "")
+            if response.status_code == 302 and resolve(location).url_name in ("cod_payment", "wallet_payment"):
+                client.get(location)
+                outcome = "placed"
+            else:
+                outcome = "rejected"
+            stats.add_latency("checkout_payment", time.perf_counter() - step)
+            stats.add_latency("checkout", time.perf_counter() - started)
+            stats.add_outcome(outcome)
+        except Exception as exc:
+            stats.add_outcome("error", f"{type(exc).__name__}: {exc}")
+
+    def report(self, stats, elapsed):
+        placed = stats.outcomes["placed"]
+        self.stdout.write(
+            f"{sum(stats.outcomes.values())} checkouts in {elapsed:.2f}s: "
+            f"{placed} placed, {stats.outcomes['rejected']} rejected (out of stock), {stats.outcomes['error']} errors"
+        )
+        self.stdout.write(f"Throughput: {placed / elapsed if elapsed else 0:.1f} orders/s")
+        for step, values in stats.latencies.items():
+            self.stdout.write(
+                f"  {step:<17} p50 {_percentile(values, 50) * 1000:7.1f} ms"
+                f"  p95 {_percentile(values, 95) * 1000:7.1f} ms"
+                f"  p99 {_percentile(values, 99) * 1000:7.1f} ms  (n={len(values)})"
+            )
+        self.stdout.write(
+            f"Lock wait (SELECT ... FOR UPDATE): total {sum(stats.lock_waits):.3f}s, "
+            f"p95 {_percentile(stats.lock_waits, 95) * 1000:.1f} ms, max {max(stats.lock_waits, default=0) * 1000:.1f} ms"
+        )
+        self.stdout.write(f"Deadlocks: {stats.deadlocks}")
+        for error in stats.errors[:5]:
+            self.stderr.write(f"  error: {error}")
+
+    def verify(self, variants, stock):
+        sold = dict(
+            OrderItem.objects.filter(variant__in=variants).values("variant").annotate(sold=Sum("quantity")).values_list("variant", "sold")
+        )
+        oversold = []
+        for variant in ProductVariant.objects.filter(id__in=[variant.id for variant in variants]).order_by("id"):
+            units = sold.get(variant.id, 0)
+            self.stdout.write(f"  {variant.variant_type}: sold {units} of {stock}, {variant.stock} left")
+            if units > stock or variant.stock != stock - units:
+                oversold.append(f"{variant.variant_type} sold {units} of {stock} with {variant.stock} left")
+        return oversold
+
+    def cleanup(self):
+        User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").delete()
+        Category.objects.filter(name=CATEGORY_NAME).delete()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from orders.summary import rebuild_sales_summary
+
+
+class Command(BaseCommand):
+    help = "Recompute SalesDailySummary from the Order table (after a deploy, a bulk import or to fix drift)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First day to rebuild (YYYY-MM-DD), default: the first order.")
+        parser.add_argument("--end", help="Last day to rebuild (YYYY-MM-DD), default: today.")
+
+    def handle(self, *args, **options):
+        start = parse_date(options["start"]) if options["start"] else None
+        end = parse_date(options["end"]) if options["end"] else None
+        if (options["start"] and not start) or (options["end"] and not end):
+            raise CommandError("Dates must be YYYY-MM-DD.")
+        count = rebuild_sales_summary(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} summary row(s)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from orders.services import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Give back the stock of Razorpay holds that were not paid in time. run_worker does this every "
+        "minute (orders.tasks); this runs it by hand."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Holds released per transaction.")
+
+    def handle(self, *args, **options):
+        count = release_expired_reservations(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {count} expired stock hold(s)."))
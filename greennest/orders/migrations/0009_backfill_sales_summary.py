@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:45
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+AMOUNT_FIELDS = ("total_amount", "final_amount", "discount", "tax", "shipping_charge")
+
+
+# SalesDailySummary only follows orders saved after 0007, fill it in for the ones before.
+# What `manage.py rebuild_sales_summary` does, written out on the historical models so later
+# changes to orders.summary can't break this migration.
+def backfill_sales_summary(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    SalesDailySummary = apps.get_model("orders", "SalesDailySummary")
+
+    totals = (
+        Order.objects.annotate(day=TruncDate("created_at", tzinfo=timezone.get_current_timezone()))
+        .order_by()
+        .values("day", "status")
+        .annotate(order_count=Count("id"), **{f"sum_{name}": Sum(name) for name in AMOUNT_FIELDS})
+    )
+    SalesDailySummary.objects.all().delete()
+    SalesDailySummary.objects.bulk_create([
+        SalesDailySummary(
+            date=row["day"],
+            status=row["status"],
+            order_count=row["order_count"],
+            **{name: row[f"sum_{name}"] or 0 for name in AMOUNT_FIELDS},
+        )
+        for row in totals
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_salesreport'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sales_summary, migrations.RunPython.noop),
+    ]
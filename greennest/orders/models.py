@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 
 from products.models import ProductVariant
 from users.models import Address
@@ -19,7 +20,8 @@ class Order(models.Model):
         ('returned', 'Returned'),
         ("partially_returned", "Partially Returned"),
     ]
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Indexed by Meta.indexes (user, created_at)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     tax = models.DecimalField(max_digits=8, decimal_places=2, default=0)
@@ -48,9 +50,23 @@ class Order(models.Model):
     return_approved_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='approved_returns')
     return_approved_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="order_user_created_idx"),        # My Orders
+            models.Index(fields=["status", "-created_at"], name="order_status_created_idx"),    # admin list, sales report
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What this order adds to SalesDailySummary as loaded, see orders/summary.py
+        from .summary import order_contribution
+        instance._loaded_contribution = order_contribution(instance)
+        return instance
+
     def recalc_totals(self):
         """ Recalculate subtotal, apply coupon discount, and update final total """
         items = self.items.filter(status__in=["active", "delivered"])
@@ -83,7 +99,8 @@ class OrderItem(models.Model):
         ('returned', 'Returned'),
         ("return_rejected", "Return Rejected"),
     ]
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    # Indexed by Meta.indexes (order, status)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', db_index=False)
     variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=8, decimal_places=2)  
@@ -99,7 +116,77 @@ class OrderItem(models.Model):
     return_requested_at = models.DateTimeField(null=True, blank=True)
     return_approved = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["order", "status"], name="orderitem_order_status_idx"),
+        ]
+
     def __str__(self):
         return f"{self.variant} x {self.quantity}"
 
-    
\ No newline at end of file
+
+# Stock held for a customer while they pay at the gateway (Razorpay).
+# The held quantity is taken off ProductVariant.stock when the hold is placed, so every
+# available-stock check counts it. A successful payment keeps it (the order uses it up),
+# an expired hold is handed back by orders.services.release_expired_reservations.
+class StockReservation(models.Model):
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    payment = models.ForeignKey("payments.Payment", on_delete=models.CASCADE, related_name="reservations")
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.variant} x {self.quantity} held until {self.expires_at:%d-%m-%Y %H:%M}"
+
+
+
+# Per day (local date of Order.created_at) and status totals of Order, kept up to date by
+# orders/signals.py and rebuilt by `manage.py rebuild_sales_summary`. Reports read this
+# instead of aggregating the whole Order table.
+class SalesDailySummary(models.Model):
+    date = models.DateField()
+    status = models.CharField(max_length=30, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    final_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    shipping_charge = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("date", "status")
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count} orders, ₹{self.final_amount}"
+
+
+def reports_storage():
+    return FileSystemStorage(location=settings.REPORTS_ROOT)
+
+
+# Sales report PDF for a date range, generated in the background (orders/reports.py).
+# fingerprint identifies the data it was built from, so an unchanged range is served as is.
+class SalesReport(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    ]
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    file = models.FileField(upload_to="sales/", storage=reports_storage, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["start_date", "end_date", "fingerprint"], name="salesreport_range_idx"),
+        ]
+
+    def __str__(self):
+        return f"Sales report {self.start_date or 'start'} - {self.end_date or 'today'} ({self.status})"
@@ -0,0 +1,164 @@
+import hashlib
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .models import Order, SalesReport
+from .summary import SALES_STATUSES, range_totals
+
+
+# Sales report PDFs are built off the request (orders/tasks.py) and kept in REPORTS_ROOT.
+# A report is reused for as long as what it shows for the range is unchanged (the
+# fingerprint); a changed range gets a new report, and older finished reports are removed
+# once it's ready.
+ORDER_CHUNK_SIZE = 2000
+REPORT_STALE_AFTER = timedelta(minutes=10)  # pending/running longer than this: worker died, queue again
+
+# The order columns draw_sales_report prints
+REPORT_COLUMNS = ("id", "created_at", "status", "final_amount", "user__first_name")
+
+
+def report_fingerprint(start=None, end=None):
+    """
+    Hash of everything the PDF for start..end shows: the range totals and every listed
+    order's row. One streamed values query, no model instances, so much cheaper than
+    building the PDF; it changes whenever the PDF would (a status move between sales
+    statuses, a customer renamed), which range totals alone don't.
+    """
+    digest = hashlib.sha1(f"{start}|{end}".encode())
+    totals = range_totals(start, end)
+    digest.update("|".join(f"{name}={totals[name]}" for name in sorted(totals)).encode())
+    rows = sales_orders(start, end).order_by("created_at", "id").values_list(*REPORT_COLUMNS)
+    for row in rows.iterator(chunk_size=ORDER_CHUNK_SIZE):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def request_sales_report(start=None, end=None):
+    """The report for start..end as of now, queued for generation if it isn't built (or being built) yet."""
+    from .tasks import enqueue_sales_report
+
+    fingerprint = report_fingerprint(start, end)
+    report = (
+        SalesReport.objects.filter(start_date=start, end_date=end, fingerprint=fingerprint)
+        .exclude(status="failed")
+        .order_by("-id")
+        .first()
+    )
+    if report and report.status in ("pending", "running") and report.created_at < timezone.now() - REPORT_STALE_AFTER:
+        SalesReport.objects.filter(pk=report.pk).update(status="failed", error="Timed out")
+        report = None
+    if report is None:
+        with transaction.atomic():
+            report = SalesReport.objects.create(start_date=start, end_date=end, fingerprint=fingerprint)
+            enqueue_sales_report(report.pk)
+    return report
+
+
+def sales_orders(start=None, end=None):
+    orders = Order.objects.filter(status__in=SALES_STATUSES)
+    if start and end:
+        orders = orders.filter(created_at__date__range=[start, end])
+    return orders
+
+
+def draw_sales_report(pdf, totals, orders, start=None, end=None):
+    width, height = A4
+
+    # Title
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(200, height - 50, "Sales Report")
+
+    # Date
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(50, height - 80, f"Generated on: {timezone.localtime().strftime('%Y-%m-%d %H:%M')}")
+    if start and end:
+        pdf.drawString(50, height - 95, f"Date Range: {start} to {end}")
+
+    # Summary
+    y = height - 120
+    summary = [
+        f"Total Orders: {totals['total_orders']}",
+        f"Total Revenue: Rs.{totals['total_revenue']:.2f}",
+        f"Total Discount: Rs.{totals['total_discount']:.2f}",
+        f"Total Tax: Rs.{totals['total_tax']:.2f}",
+        f"Total Shipping: Rs.{totals['total_shipping']:.2f}",
+    ]
+    pdf.setFont("Helvetica", 11)
+    for line in summary:
+        pdf.drawString(50, y, line)
+        y -= 20
+
+    # Table Header
+    y -= 20
+    pdf.setFont("Helvetica-Bold", 10)
+    pdf.drawString(50, y, "Order ID")
+    pdf.drawString(150, y, "User")
+    pdf.drawString(230, y, "Status")
+    pdf.drawString(330, y, "Final Amount")
+    pdf.drawString(400, y, "Date")
+    y -= 15
+    pdf.line(50, y, 500, y)
+    y -= 15
+
+    # Orders list, read in chunks rather than all at once
+    pdf.setFont("Helvetica", 9)
+    for order in orders:
+        if y < 80:
+            pdf.showPage()
+            y = height - 50
+            pdf.setFont("Helvetica", 9)
+
+        pdf.drawString(50, y, str(order.display_id))
+        pdf.drawString(150, y, str(order.user.first_name))
+        pdf.drawString(230, y, str(order.status))
+        pdf.drawString(330, y, f"Rs.{order.final_amount:.2f}")
+        pdf.drawString(400, y, order.created_at.strftime("%Y-%m-%d"))
+        y -= 20
+
+
+def generate_sales_report(report_id):
+    """Build the PDF for a queued SalesReport. Returns the report, or None if it was not pending."""
+    if not SalesReport.objects.filter(pk=report_id, status="pending").update(status="running"):
+        return None
+    report = SalesReport.objects.get(pk=report_id)
+
+    try:
+        orders = (
+            sales_orders(report.start_date, report.end_date)
+            .select_related("user")
+            .only(*REPORT_COLUMNS)
+            .order_by("created_at", "id")
+            .iterator(chunk_size=ORDER_CHUNK_SIZE)
+        )
+        with tempfile.TemporaryFile() as out:
+            pdf = canvas.Canvas(out, pagesize=A4)
+            draw_sales_report(pdf, range_totals(report.start_date, report.end_date), orders, report.start_date, report.end_date)
+            pdf.save()
+            out.seek(0)
+            report.file.save(f"sales_report_{report.pk}.pdf", File(out), save=False)
+    except Exception as e:
+        report.status = "failed"
+        report.error = str(e)
+        report.finished_at = timezone.now()
+        report.save(update_fields=["status", "error", "finished_at"])
+        raise
+
+    report.status = "ready"
+    report.finished_at = timezone.now()
+    report.save(update_fields=["file", "status", "finished_at"])
+
+    # Older finished reports for the same range are out of date now. One still being built
+    # is left alone; the next report to finish removes it.
+    older = SalesReport.objects.filter(
+        start_date=report.start_date, end_date=report.end_date, id__lt=report.id, status__in=("ready", "failed"),
+    )
+    for old in older:
+        old.file.delete(save=False)
+        old.delete()
+    return report
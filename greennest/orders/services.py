@@ -0,0 +1,217 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from cart.models import Cart
+from coupon.models import CouponUsage
+from products.models import ProductVariant
+from .models import Order, OrderItem, StockReservation
+
+
+# How long stock stays held for a customer paying at the gateway
+RESERVATION_TTL = timedelta(minutes=getattr(settings, "STOCK_RESERVATION_MINUTES", 15))
+
+
+class OutOfStock(ValueError):
+    pass
+
+
+def _quantities(priced):
+    quantities = {}
+    for line in priced.lines:
+        quantities[line.variant_id] = quantities.get(line.variant_id, 0) + line.quantity
+    return quantities
+
+
+def _stock_case(quantities):
+    return Case(
+        *[When(id=variant_id, then=Value(qty)) for variant_id, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def deduct_stock(quantities):
+    """
+    Take `quantities` ({variant_id: qty}) off stock in two statements whatever the basket size:
+    lock the rows in variant-id order (so concurrent checkouts cannot deadlock), then one
+    conditional UPDATE ... SET stock = stock - qty WHERE stock >= qty. Must run in a transaction.
+    """
+    if not quantities:
+        return
+    variant_ids = sorted(quantities)
+
+    stocks = dict(
+        ProductVariant.objects.select_for_update().filter(id__in=variant_ids).order_by("id").values_list("id", "stock")
+    )
+    short = [variant_id for variant_id in variant_ids if stocks.get(variant_id, 0) < quantities[variant_id]]
+    if short:
+        names = ", ".join(
+            f"{name} ({variant_type})"
+            for name, variant_type in ProductVariant.objects.filter(id__in=short).values_list("product__name", "variant_type")
+        )
+        raise OutOfStock(f"Insufficient stock for {names or 'an item in your cart'}")
+
+    enough = Q()
+    for variant_id in variant_ids:
+        enough |= Q(id=variant_id, stock__gte=quantities[variant_id])
+    updated = ProductVariant.objects.filter(enough).update(stock=F("stock") - _stock_case(quantities))
+    if updated != len(variant_ids):
+        raise OutOfStock("Insufficient stock for an item in your cart")
+
+
+def _lock_variants(variant_ids):
+    list(ProductVariant.objects.select_for_update().filter(id__in=sorted(variant_ids)).order_by("id").values_list("id"))
+
+
+def restock(quantities):
+    """Give `quantities` ({variant_id: qty}) back to stock in one UPDATE, locking in the same order as deduct_stock."""
+    if not quantities:
+        return
+    _lock_variants(quantities)
+    ProductVariant.objects.filter(id__in=list(quantities)).update(stock=F("stock") + _stock_case(quantities))
+
+
+# Stock reservations (Razorpay).
+# razorpay_checkout holds the cart's stock before sending the customer to the gateway:
+# the held units come off ProductVariant.stock right away, so the listing, cart and
+# checkout stock checks all see them without knowing about reservations. place_order
+# turns the payment's holds into the order's decrement, and anything not paid for in
+# RESERVATION_TTL is handed back by release_expired_reservations, which run_worker runs
+# every minute (orders/tasks.py).
+def reserve_stock(payment, priced, ttl=None, replacing=None):
+    """
+    Hold the stock of a PricedCart for `payment`; raises OutOfStock like deduct_stock.
+    `replacing` is a StockReservation queryset (an earlier attempt's holds) released in the
+    same transaction.
+    """
+    quantities = _quantities(priced)
+    expires_at = timezone.now() + (ttl or RESERVATION_TTL)
+    with transaction.atomic():
+        if replacing is not None:
+            # Holds, then every variant of both the release and the reserve, in id order, the
+            # same order settle_reservations takes them in. Releasing and then reserving would
+            # lock in two passes and can deadlock with a checkout locking the other way round.
+            held = list(replacing.select_for_update().order_by("id").values_list("variant_id", flat=True))
+            _lock_variants(set(quantities) | set(held))
+            release_reservations(replacing)
+        deduct_stock(quantities)
+        StockReservation.objects.bulk_create([
+            StockReservation(variant_id=variant_id, quantity=qty, payment=payment, expires_at=expires_at)
+            for variant_id, qty in quantities.items()
+        ])
+
+
+def release_reservations(reservations, limit=None, skip_locked=False):
+    """Hand the stock of a StockReservation queryset back and delete the holds. Returns the number released."""
+    with transaction.atomic():
+        holds = reservations.select_for_update(skip_locked=skip_locked).order_by("id")
+        if limit:
+            holds = holds[:limit]
+        holds = list(holds.values_list("id", "variant_id", "quantity"))
+        if not holds:
+            return 0
+
+        quantities = {}
+        for _, variant_id, qty in holds:
+            quantities[variant_id] = quantities.get(variant_id, 0) + qty
+        restock(quantities)
+        StockReservation.objects.filter(id__in=[hold_id for hold_id, _, _ in holds]).delete()
+    return len(holds)
+
+
+def release_expired_reservations(batch_size=500):
+    """Release every expired hold, `batch_size` per transaction. Holds locked by a callback are left for it."""
+    now = timezone.now()
+    released = 0
+    while True:
+        count = release_reservations(
+            StockReservation.objects.filter(expires_at__lte=now), limit=batch_size, skip_locked=True
+        )
+        released += count
+        if count < batch_size:
+            return released
+
+
+def settle_reservations(payment, quantities):
+    """
+    Use up `payment`'s holds for an order of `quantities`: held units are already off
+    stock, only the difference is deducted (or given back). If the holds were already
+    released (paid after the TTL), this is a plain deduct_stock. Must run in a transaction.
+    """
+    held = {}
+    holds = list(payment.reservations.select_for_update().order_by("id").values_list("id", "variant_id", "quantity"))
+    for _, variant_id, qty in holds:
+        held[variant_id] = held.get(variant_id, 0) + qty
+
+    # Lock every variant involved up front and in id order, deduct/restock then only re-lock
+    _lock_variants(set(quantities) | set(held))
+    deduct_stock({
+        variant_id: qty - held.get(variant_id, 0)
+        for variant_id, qty in quantities.items()
+        if qty > held.get(variant_id, 0)
+    })
+    restock({
+        variant_id: qty - quantities.get(variant_id, 0)
+        for variant_id, qty in held.items()
+        if qty > quantities.get(variant_id, 0)
+    })
+    if holds:
+        StockReservation.objects.filter(id__in=[hold_id for hold_id, _, _ in holds]).delete()
+
+
+def place_order(user, priced, address, payment_method, coupon=None, status="processing", totals=None, payment=None):
+    """
+    Turn a PricedCart (cart/pricing.py, or a payments PaidCart) into an Order: stock, order, items, coupon usage and
+    cart removal in one transaction, with a fixed number of statements. Item prices are the
+    ones the customer was shown. `totals` overrides the amounts (e.g. what the gateway charged),
+    `payment` is a gateway Payment whose stock holds the order uses up.
+    """
+    totals = totals or {
+        "subtotal": priced.items_total,
+        "shipping": priced.shipping,
+        "discount": priced.coupon_discount,
+        "total": priced.total,
+    }
+
+    quantities = _quantities(priced)
+
+    with transaction.atomic():
+        if payment is not None:
+            settle_reservations(payment, quantities)
+        else:
+            deduct_stock(quantities)
+
+        order = Order.objects.create(
+            user=user,
+            address=address,
+            total_amount=totals["subtotal"],
+            shipping_charge=totals["shipping"],
+            discount=totals["discount"],
+            final_amount=totals["total"],
+            coupon=coupon,
+            status=status,
+            payment_method=payment_method,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                variant_id=line.variant_id,
+                quantity=line.quantity,
+                price=line.discounted_price,
+                total_price=line.final_total,
+            )
+            for line in priced.lines
+        ])
+
+        if coupon:
+            CouponUsage.objects.update_or_create(
+                user=user,
+                coupon=coupon,
+                defaults={"used": True, "used_at": timezone.now()},
+            )
+
+        Cart.objects.filter(pk=priced.cart_id).delete()
+    return order
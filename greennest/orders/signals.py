@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Order
+from .summary import order_contribution, record_change
+
+
+@receiver(pre_save, sender=Order)
+def remember_loaded_contribution(sender, instance, **kwargs):
+    # Orders loaded with .only()/.defer() don't know what they contributed, read it
+    if instance.pk and getattr(instance, "_loaded_contribution", None) is None and not instance._state.adding:
+        loaded = Order.objects.filter(pk=instance.pk).first()
+        instance._loaded_contribution = loaded._loaded_contribution if loaded else None
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    if instance.get_deferred_fields():
+        instance.refresh_from_db(fields=list(instance.get_deferred_fields()))
+    new = order_contribution(instance)
+    record_change(getattr(instance, "_loaded_contribution", None), new)
+    instance._loaded_contribution = new
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    record_change(getattr(instance, "_loaded_contribution", None) or order_contribution(instance), None)
@@ -0,0 +1,160 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, TruncDate
+from django.utils import timezone
+
+
+# SalesDailySummary upkeep.
+# An order "contributes" (date, status, amounts) to one summary row. On every save the old
+# contribution (remembered when the order was loaded) is taken off and the new one added,
+# with F() updates, after the order's transaction commits: the checkout transaction never
+# waits on the day's row lock, at worst a crash in between leaves a gap that
+# rebuild_sales_summary fixes.
+AMOUNT_FIELDS = ("total_amount", "final_amount", "discount", "tax", "shipping_charge")
+SALES_STATUSES = ("completed", "delivered")  # what counts as a sale in the reports
+
+
+def order_contribution(order):
+    """(date, status, amounts) this order adds to the summary, None when not known (unsaved or deferred fields)."""
+    values = order.__dict__
+    if order.pk is None or any(name not in values for name in ("created_at", "status") + AMOUNT_FIELDS):
+        return None
+    if values["created_at"] is None:
+        return None
+    return (
+        timezone.localdate(values["created_at"]),
+        values["status"],
+        tuple(values[name] or 0 for name in AMOUNT_FIELDS),
+    )
+
+
+def _apply(contribution, sign):
+    from .models import SalesDailySummary
+
+    day, status, amounts = contribution
+    changes = {"order_count": F("order_count") + sign}
+    for name, amount in zip(AMOUNT_FIELDS, amounts):
+        changes[name] = F(name) + sign * amount
+
+    rows = SalesDailySummary.objects.filter(date=day, status=status)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SalesDailySummary.objects.create(
+                date=day, status=status, order_count=sign, **{name: sign * amount for name, amount in zip(AMOUNT_FIELDS, amounts)}
+            )
+    except IntegrityError:
+        # Created by a concurrent order in the meantime
+        rows.update(**changes)
+
+
+def record_change(old, new):
+    """Move an order's contribution from `old` to `new` (either may be None) once the transaction commits."""
+    if old == new:
+        return
+
+    def apply():
+        with transaction.atomic():
+            if old:
+                _apply(old, -1)
+            if new:
+                _apply(new, 1)
+
+    transaction.on_commit(apply)
+
+
+def rebuild_sales_summary(start=None, end=None):
+    """Recompute the summary rows for start..end (local dates, inclusive; default everything). Returns rows written."""
+    from .models import Order, SalesDailySummary
+
+    orders = Order.objects.annotate(day=TruncDate("created_at", tzinfo=timezone.get_current_timezone()))
+    rows = SalesDailySummary.objects.all()
+    if start:
+        orders = orders.filter(day__gte=start)
+        rows = rows.filter(date__gte=start)
+    if end:
+        orders = orders.filter(day__lte=end)
+        rows = rows.filter(date__lte=end)
+
+    totals = (
+        orders.order_by()
+        .values("day", "status")
+        .annotate(order_count=Count("id"), **{f"sum_{name}": Sum(name) for name in AMOUNT_FIELDS})
+    )
+    with transaction.atomic():
+        rows.delete()
+        created = SalesDailySummary.objects.bulk_create([
+            SalesDailySummary(
+                date=row["day"],
+                status=row["status"],
+                order_count=row["order_count"],
+                **{name: row[f"sum_{name}"] or 0 for name in AMOUNT_FIELDS},
+            )
+            for row in totals
+        ])
+    return len(created)
+
+
+def sales_totals(statuses=SALES_STATUSES, today=None):
+    """All-time totals plus today / last 7 days / last 30 days revenue for `statuses`, in one query."""
+    from .models import SalesDailySummary
+
+    today = today or timezone.localdate()
+    totals = SalesDailySummary.objects.filter(status__in=statuses).aggregate(
+        total_orders=Sum("order_count"),
+        total_revenue=Sum("final_amount"),
+        total_discount=Sum("discount"),
+        total_tax=Sum("tax"),
+        total_shipping=Sum("shipping_charge"),
+        daily_sales=Sum("final_amount", filter=Q(date=today)),
+        weekly_sales=Sum("final_amount", filter=Q(date__gte=today - timedelta(days=7))),
+        monthly_sales=Sum("final_amount", filter=Q(date__gte=today - timedelta(days=30))),
+    )
+    return {name: value or 0 for name, value in totals.items()}
+
+
+def range_totals(start=None, end=None, statuses=SALES_STATUSES):
+    """Order count and amount totals for local dates start..end (inclusive, open ended when None)."""
+    from .models import SalesDailySummary
+
+    rows = SalesDailySummary.objects.filter(status__in=statuses)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    totals = rows.aggregate(
+        total_orders=Sum("order_count"),
+        total_revenue=Sum("final_amount"),
+        total_discount=Sum("discount"),
+        total_tax=Sum("tax"),
+        total_shipping=Sum("shipping_charge"),
+    )
+    return {name: value or 0 for name, value in totals.items()}
+
+
+def sales_by_day(start, end=None, statuses=None):
+    """[(date, total_amount)] for start..end, over every status unless `statuses` is given."""
+    from .models import SalesDailySummary
+
+    rows = SalesDailySummary.objects.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    if statuses:
+        rows = rows.filter(status__in=statuses)
+    return list(rows.values("date").annotate(total=Sum("total_amount")).order_by("date").values_list("date", "total"))
+
+
+def sales_by_month(year, statuses=None):
+    """[(month number, total_amount)] for one year."""
+    from .models import SalesDailySummary
+
+    rows = SalesDailySummary.objects.filter(date__year=year)
+    if statuses:
+        rows = rows.filter(status__in=statuses)
+    return list(
+        rows.annotate(month=ExtractMonth("date")).values("month")
+        .annotate(total=Sum("total_amount")).order_by("month").values_list("month", "total")
+    )
@@ -0,0 +1,26 @@
+from jobs.queue import PRIORITY_LOW, task
+
+
+# Stock held for Razorpay payments that were never paid goes back on sale within a minute
+# of expiring (orders.services.reserve_stock). Not retried, the next minute's run does it.
+@task("orders.release_expired_reservations", max_attempts=1, every=60)
+def release_expired_holds():
+    from .services import release_expired_reservations
+
+    release_expired_reservations()
+
+
+# Background work for the admin side, run by `manage.py run_worker`. Report PDFs are CPU
+# heavy and rare: low priority, so they never hold up customer facing jobs. A failed report
+# is marked failed rather than retried; the next request for the range queues a new one
+# (also when a worker died mid-build, see orders.reports.REPORT_STALE_AFTER).
+@task("orders.generate_sales_report", priority=PRIORITY_LOW, max_attempts=1)
+def sales_report(report_id):
+    from .reports import generate_sales_report
+
+    generate_sales_report(report_id)
+
+
+def enqueue_sales_report(report_id):
+    """Queue building a SalesReport's PDF, with the current transaction."""
+    sales_report.enqueue(report_id, key=f"orders:sales-report:{report_id}")
@@ -1,3 +1,411 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as global_apps
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from greennest.testing import ExplainTestCase
+from jobs.models import Job
+from jobs.worker import claim, run_job, schedule_periodic_tasks
+from payments.models import Payment
+from payments.services import PaidCart, PaidLine
+from products.models import Category, Product, ProductVariant
+from users.models import Address, User
+from .invoices import invoice_items, invoice_pdf, invoice_version
+from .models import Order, OrderItem, SalesDailySummary, SalesReport, StockReservation
+from .reports import generate_sales_report, report_fingerprint, request_sales_report
+from .services import (
+    OutOfStock, deduct_stock, place_order, release_expired_reservations, release_reservations, reserve_stock,
+)
+from .summary import rebuild_sales_summary
+from .tasks import release_expired_holds
+
+
+class OrderIndexTests(ExplainTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        cls.order = Order.objects.create(user=cls.user, total_amount=100, final_amount=100, status="delivered")
+        OrderItem.objects.create(order=cls.order, quantity=1, price=100, total_price=100)
+
+    def test_orders_of_a_user(self):
+        self.assertUsesIndex(Order.objects.filter(user=self.user).order_by("-created_at"), "order_user_created_idx")
+
+    def test_orders_by_status(self):
+        orders = Order.objects.filter(status="delivered").order_by("-created_at")
+        self.assertUsesIndex(orders, "order_status_created_idx")
+
+    def test_items_of_an_order_by_status(self):
+        items = OrderItem.objects.filter(order=self.order, status__in=["active", "delivered"])
+        self.assertUsesIndex(items, "orderitem_order_status_idx")
+
+
+def basket(*lines):
+    """A PaidCart of (variant, quantity) lines at list price, the way place_order and reserve_stock read one."""
+    return PaidCart(cart_id=None, lines=tuple(
+        PaidLine(variant_id=variant.id, quantity=qty, discounted_price=variant.price, final_total=variant.price * qty)
+        for variant, qty in lines
+    ))
+
+
+class StockTestMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(category=Category.objects.create(name="Indoor"), name="Fern")
+        cls.small = ProductVariant.objects.create(product=product, variant_type="Small", price=Decimal("100"), stock=5)
+        cls.large = ProductVariant.objects.create(product=product, variant_type="Large", price=Decimal("250"), stock=2)
+        cls.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+
+    def stock(self):
+        return dict(ProductVariant.objects.filter(id__in=[self.small.id, self.large.id]).values_list("id", "stock"))
+
+    def assertStock(self, small, large):
+        self.assertEqual(self.stock(), {self.small.id: small, self.large.id: large})
+
+    def payment(self):
+        return Payment.objects.create(user=self.user, method="razorpay", amount=Decimal("100"))
+
+    def place(self, priced, **kwargs):
+        subtotal = sum(line.final_total for line in priced.lines)
+        totals = {"subtotal": subtotal, "shipping": 0, "discount": 0, "total": subtotal}
+        return place_order(self.user, priced, None, "Razorpay", totals=totals, **kwargs)
+
+
+class DeductStockTests(StockTestMixin, TestCase):
+
+    def test_deducts(self):
+        with transaction.atomic():
+            deduct_stock({self.small.id: 3, self.large.id: 2})
+        self.assertStock(2, 0)
+
+    def test_oversell_changes_nothing(self):
+        with self.assertRaisesMessage(OutOfStock, "Fern (Large)"):
+            with transaction.atomic():
+                deduct_stock({self.small.id: 1, self.large.id: 3})
+        self.assertStock(5, 2)
+
+    def test_order_takes_its_stock(self):
+        order = self.place(basket((self.small, 2), (self.large, 2)))
+        self.assertStock(3, 0)
+        self.assertEqual(
+            sorted(order.items.values_list("variant_id", "quantity", "total_price")),
+            [(self.small.id, 2, Decimal("200")), (self.large.id, 2, Decimal("500"))],
+        )
+
+    def test_oversold_order_is_not_placed(self):
+        with self.assertRaises(OutOfStock):
+            self.place(basket((self.small, 2), (self.large, 3)))
+        self.assertStock(5, 2)
+        self.assertFalse(Order.objects.exists())
+
+    def test_missing_variant_is_out_of_stock(self):
+        with self.assertRaises(OutOfStock):
+            with transaction.atomic():
+                deduct_stock({self.small.id: 1, 0: 1})
+        self.assertStock(5, 2)
+
+
+class ReservationTests(StockTestMixin, TestCase):
+
+    def test_reserve_takes_stock_and_holds_it(self):
+        payment = self.payment()
+        reserve_stock(payment, basket((self.small, 2), (self.large, 1)), ttl=timedelta(minutes=5))
+        self.assertStock(3, 1)
+        self.assertEqual(
+            dict(payment.reservations.values_list("variant_id", "quantity")), {self.small.id: 2, self.large.id: 1}
+        )
+
+    def test_reserve_beyond_stock_holds_nothing(self):
+        reserve_stock(self.payment(), basket((self.large, 2)))
+        payment = self.payment()
+        with self.assertRaises(OutOfStock):
+            reserve_stock(payment, basket((self.small, 1), (self.large, 1)))
+        self.assertStock(5, 0)
+        self.assertFalse(payment.reservations.exists())
+
+    def test_reserve_replacing_earlier_holds(self):
+        first, second = self.payment(), self.payment()
+        reserve_stock(first, basket((self.large, 2)))
+        reserve_stock(second, basket((self.large, 2)), replacing=StockReservation.objects.filter(payment=first))
+        self.assertStock(5, 0)
+        self.assertEqual(list(StockReservation.objects.values_list("payment_id", flat=True)), [second.id])
+
+    def test_release_gives_stock_back_once(self):
+        payment = self.payment()
+        reserve_stock(payment, basket((self.small, 2), (self.large, 2)))
+        self.assertEqual(release_reservations(payment.reservations.all()), 2)
+        self.assertEqual(release_reservations(payment.reservations.all()), 0)
+        self.assertStock(5, 2)
+
+    def test_release_expired_only(self):
+        expired, live = self.payment(), self.payment()
+        reserve_stock(expired, basket((self.small, 2)))
+        reserve_stock(live, basket((self.small, 1)))
+        expired.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(release_expired_reservations(batch_size=1), 1)
+        self.assertStock(4, 2)
+        self.assertTrue(live.reservations.exists())
+
+    def test_order_uses_up_the_holds(self):
+        payment = self.payment()
+        reserve_stock(payment, basket((self.small, 2), (self.large, 1)))
+        order = self.place(basket((self.small, 3)), payment=payment)
+        # 2 held + 1 more for small, the large hold handed back
+        self.assertStock(2, 2)
+        self.assertFalse(payment.reservations.exists())
+        self.assertEqual(order.items.get().quantity, 3)
+
+    def test_order_after_the_holds_expired(self):
+        payment = self.payment()
+        reserve_stock(payment, basket((self.large, 2)))
+        release_reservations(payment.reservations.all())
+        reserve_stock(self.payment(), basket((self.large, 1)))
+        with self.assertRaises(OutOfStock):
+            self.place(basket((self.large, 2)), payment=payment)
+        self.assertStock(5, 1)
+        self.assertFalse(Order.objects.exists())
+
+
+    def test_worker_gives_expired_holds_back(self):
+        abandoned = self.payment()
+        reserve_stock(abandoned, basket((self.large, 2)))
+        self.assertStock(5, 0)
+        abandoned.reservations.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        schedule_periodic_tasks()
+        for job_id in claim("w1", 10):
+            run_job(job_id)
+        self.assertStock(5, 2)
+        self.assertFalse(abandoned.reservations.exists())
+        self.assertTrue(Job.objects.filter(task=release_expired_holds.name, status="done").exists())
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentCheckoutTests(StockTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        # TransactionTestCase flushes the tables, setUpTestData isn't kept
+        self.setUpTestData()
+
+    def test_last_unit_is_sold_once(self):
+        ProductVariant.objects.filter(pk=self.large.pk).update(stock=1)
+        start = threading.Barrier(4)
+        results = []
+
+        def checkout():
+            try:
+                start.wait(5)
+                try:
+                    self.place(basket((self.large, 1)))
+                    results.append("ok")
+                except OutOfStock:
+                    results.append("out")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), ["ok", "out", "out", "out"])
+        self.assertStock(5, 0)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class LoadTestCommandTests(TestCase):
+
+    @override_settings(DEBUG=False)
+    def test_refuses_to_run_without_debug(self):
+        with self.assertRaisesMessage(CommandError, "--i-know-this-is-not-production"):
+            call_command("loadtest_checkout", customers=1, stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Category.objects.exists())
+
+
+class SalesSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+
+    def rows(self):
+        return list(
+            SalesDailySummary.objects.filter(order_count__gt=0).order_by("date", "status").values_list(
+                "date", "status", "order_count", "total_amount", "final_amount", "discount", "tax", "shipping_charge",
+            )
+        )
+
+    def assertMatchesRebuild(self):
+        kept = self.rows()
+        rebuild_sales_summary()
+        self.assertEqual(kept, self.rows())
+        return kept
+
+    def create(self, status="processing", amount="500.00"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(
+                user=self.user, status=status, total_amount=Decimal(amount), final_amount=Decimal(amount) + 50,
+                shipping_charge=50, discount=0, tax=Decimal("12.50"),
+            )
+
+    def save(self, order, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save(**kwargs)
+
+    def test_created_orders(self):
+        self.create()
+        self.create("delivered", "300.00")
+        self.create("delivered", "200.00")
+        today = timezone.localdate()
+        self.assertEqual([row[:3] for row in self.assertMatchesRebuild()], [
+            (today, "delivered", 2), (today, "processing", 1),
+        ])
+
+    def test_status_changes_into_and_out_of_counted_statuses(self):
+        order = self.create()
+        for status in ("delivered", "completed", "returned", "cancelled"):
+            order.status = status
+            self.save(order)
+            self.assertEqual([row[1:3] for row in self.assertMatchesRebuild()], [(status, 1)])
+
+    def test_amount_change(self):
+        order = self.create("delivered")
+        order.final_amount = Decimal("120.00")
+        order.discount = Decimal("430.00")
+        self.save(order, update_fields=["final_amount", "discount"])
+        self.assertEqual(self.assertMatchesRebuild()[0][4:6], (Decimal("120.00"), Decimal("430.00")))
+
+    def test_partially_loaded_order(self):
+        order_id = self.create().pk
+        order = Order.objects.only("id", "status").get(pk=order_id)
+        order.status = "delivered"
+        self.save(order, update_fields=["status"])
+        self.assertEqual([row[1:4] for row in self.assertMatchesRebuild()], [("delivered", 1, Decimal("500.00"))])
+
+    def test_deleted_order(self):
+        self.create("delivered")
+        order = self.create("delivered", "100.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.get(pk=order.pk).delete()
+        self.assertEqual([row[2:4] for row in self.assertMatchesRebuild()], [(1, Decimal("500.00"))])
+
+    def test_backfill_migration_matches_rebuild(self):
+        self.create()
+        self.create("delivered")
+        expected = self.assertMatchesRebuild()
+        SalesDailySummary.objects.all().delete()
+        import_module("orders.migrations.0009_backfill_sales_summary").backfill_sales_summary(global_apps, None)
+        self.assertEqual(self.rows(), expected)
+
+
+class SalesReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="buyer", email="buyer@example.com", password="x", first_name="Asha",
+        )
+        cls.admin = User.objects.create_user(username="admin", email="admin@example.com", password="x", is_staff=True)
+
+    def setUp(self):
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, storage.location)
+        patcher = mock.patch.object(SalesReport._meta.get_field("file"), "storage", storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def order(self, status="delivered"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(user=self.user, status=status, total_amount=100, final_amount=100)
+
+    def test_fingerprint_follows_what_the_pdf_shows(self):
+        order = self.order()
+        other = self.order("completed")
+        fingerprint = report_fingerprint()
+        self.assertEqual(report_fingerprint(), fingerprint)
+
+        # Same totals, different rows
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk=order.pk).update(status="completed")
+            Order.objects.filter(pk=other.pk).update(status="delivered")
+        self.assertNotEqual(report_fingerprint(), fingerprint)
+
+        fingerprint = report_fingerprint()
+        User.objects.filter(pk=self.user.pk).update(first_name="Asha R")
+        self.assertNotEqual(report_fingerprint(), fingerprint)
+
+    def test_finished_report_removes_older_finished_ones_only(self):
+        self.order()
+        ready = SalesReport.objects.create(fingerprint="old", status="ready")
+        ready.file.save("old.pdf", ContentFile(b"%PDF"), save=True)
+        building = SalesReport.objects.create(fingerprint="older", status="running")
+        report = request_sales_report()
+        generate_sales_report(report.pk)
+
+        self.assertEqual(
+            set(SalesReport.objects.values_list("id", "status")), {(building.id, "running"), (report.id, "ready")}
+        )
+        self.assertFalse(ready.file.storage.exists(ready.file.name))
+
+    def test_impossible_date_is_the_whole_range(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("download_sales_report_pdf"), {"start_date": "2024-02-30", "end_date": "2024-03-01"})
+        self.assertEqual(response.status_code, 302)
+        report = SalesReport.objects.get()
+        self.assertEqual((report.start_date, report.end_date), (None, None))
+
+
+class OrderExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="admin", email="admin@example.com", password="x", is_staff=True)
+        Order.objects.create(user=cls.admin, status="delivered", total_amount=100, final_amount=100)
+
+    def test_impossible_date_exports_everything(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("export_orders"), {"start_date": "2024-02-30", "end_date": "2024-03-01"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b"".join(response.streaming_content).decode().strip().splitlines()), 2)
+
+
+@override_settings(CACHES={"files": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class InvoiceTests(StockTestMixin, TestCase):
+
+    def setUp(self):
+        caches["files"].clear()
+        address = Address.objects.create(
+            user=self.user, full_name="Asha", phone="9876543210", line1="1 MG Road", city="Kochi", state="Kerala",
+            postal_code="682001",
+        )
+        self.order = Order.objects.create(
+            user=self.user, address=address, status="delivered", total_amount=350, final_amount=350,
+        )
+        for variant in (self.small, self.large):
+            OrderItem.objects.create(
+                order=self.order, variant=variant, quantity=1, price=variant.price, total_price=variant.price,
+            )
+
+    def test_deleted_variant(self):
+        before = invoice_version(self.order, invoice_items(self.order))
+        self.large.delete()
+
+        items = invoice_items(self.order)
+        self.assertIsNone(items[1].variant)
+        self.assertNotEqual(invoice_version(self.order, items), before)
+        self.assertTrue(invoice_pdf(self.order).startswith(b"%PDF"))
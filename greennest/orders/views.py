@@ -4,14 +4,16 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.cache import never_cache
 from django.utils.dateparse import parse_date
-from offer.utils import get_best_offer
 from django.utils import timezone
 from django.http import HttpResponse, Http404
 from django.db.models import Q, Prefetch
 from django.contrib import messages
 
 from .models import Order, OrderItem
+from .services import place_order
+from .invoices import invoice_pdf
 from cart.models import Cart, CartItem
+from cart.pricing import CartPricing, get_priced_cart
 from users.models import Address
 from wallet.models import Wallet, WalletTransaction
 from coupon.models import Coupon, CouponUsage
@@ -20,11 +22,6 @@ from django.db import transaction
 from django.db.models import F
 from decimal import Decimal, ROUND_HALF_UP
 from django.utils.text import slugify
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from io import BytesIO
 
 @login_required
 @never_cache
@@ -40,54 +37,36 @@ def checkout_address(request):
     if not cart or not cart.items.exists():
         return redirect('cart_detail')
 
-    for item in cart.items.all():
-        if item.variant.stock < item.quantity:
-            messages.error(request, f"{item.variant.product.name} is out of stock.")
+    priced = get_priced_cart(cart)
+    for line in priced.lines:
+        if not line.is_available:
+            messages.error(request, f"{line.variant.product.name} is out of stock.")
             return redirect("cart_detail")
-        
+
     # Calculate totals
-    cart_items = cart.items.all()
-    subtotal = 0
-    for item in cart.items.all():
-        variant = item.variant
-        best_offer = get_best_offer(variant)   
-        product_price = variant.price
-        discount_amount = 0
-        if best_offer:
-            discount_amount = (product_price * best_offer["discount"]) / 100  
-
-        final_price = best_offer["final_price"] if best_offer else product_price
-
-        item.offer_applied = best_offer["offer_type"] if best_offer else None
-        item.discounted_price = final_price
-        item.final_total = final_price * item.quantity
-
-        subtotal += item.final_total
-    shipping = 0 if subtotal > 500 else 50
+    subtotal = priced.items_total
+    shipping = priced.shipping
     discount = 0
-    total = subtotal + shipping - discount
     applied_coupon = None
 
     # Check session for applied coupon
     
     coupon_id = request.session.get("applied_coupon_id")
     if coupon_id:
-        try:
-            applied_coupon = Coupon.objects.get(id=coupon_id, active=True)
-            if applied_coupon.is_valid():
-                if subtotal >= applied_coupon.min_order_value:
-                    discount = applied_coupon.calculate_discount(subtotal)
-                else:
-                    messages.warning(
-                        request, 
-                        f"⚠️ Minimum order of ₹{applied_coupon.min_order_value} required to use this coupon."
-                    )
-                    request.session.pop("applied_coupon_id", None)  
-                    applied_coupon = None
+        applied_coupon = Coupon.objects.filter(id=coupon_id, active=True).first()
+        if applied_coupon and applied_coupon.is_valid():
+            if CartPricing.coupon_applies(applied_coupon, subtotal):
+                discount = applied_coupon.calculate_discount(subtotal)
             else:
-                request.session.pop("applied_coupon_id", None)
-        except Coupon.DoesNotExist:
+                messages.warning(
+                    request, 
+                    f"⚠️ Minimum order of ₹{applied_coupon.min_order_value} required to use this coupon."
+                )
+                request.session.pop("applied_coupon_id", None)  
+                applied_coupon = None
+        else:
             request.session.pop("applied_coupon_id", None)
+            applied_coupon = None
 
 
     total = subtotal + shipping - discount
@@ -181,24 +160,17 @@ def checkout_payment(request):
         return redirect("cart_detail")
 
     # --- Calculate totals ---
-    subtotal = 0
-    for item in cart.items.all():
-        variant = item.variant
-        best_offer = get_best_offer(variant)
-        product_price = variant.price
-        final_price = best_offer["final_price"] if best_offer else product_price
-        subtotal += final_price * item.quantity
-
-    shipping = 0 if subtotal > 500 else 50
-    discount = 0
     applied_coupon = None
     coupon_id = request.session.get("applied_coupon_id")
     if coupon_id:
         applied_coupon = Coupon.objects.filter(id=coupon_id, active=True).first()
-        if applied_coupon and applied_coupon.is_valid():
-            discount = applied_coupon.calculate_discount(subtotal)
 
-    total = subtotal + shipping - discount
+    priced = get_priced_cart(cart, coupon=applied_coupon)
+    subtotal = priced.items_total
+    shipping = priced.shipping
+    discount = priced.coupon_discount
+    applied_coupon = priced.coupon
+    total = priced.total
 
     if request.method == "POST":
         address_id = request.POST.get("address_id") or request.session.get("selected_address_id")
@@ -223,55 +195,15 @@ def checkout_payment(request):
         # For COD and Wallet → create order immediately
         if payment_method in ["cod", "wallet"]:
             try:
-                with transaction.atomic():
-                    order_status = "processing"
-                    order = Order.objects.create(
-                        user=user,
-                        address=selected_address,
-                        total_amount=subtotal,
-                        shipping_charge=shipping,
-                        discount=discount,
-                        final_amount=total,
-                        coupon=applied_coupon,
-                        status=order_status,
-                        payment_method=payment_method,
-                    )
-
-                    # Deduct stock + create order items
-                    for item in cart.items.select_related("variant").select_for_update():
-                        variant = item.variant
-                        variant.refresh_from_db()
-                        if variant.stock is not None and variant.stock >= item.quantity:
-                            variant.stock -= item.quantity
-                            variant.save()
-                        else:
-                            messages.error(request, f"Insufficient stock for {variant.name}")
-                            raise ValueError("Stock error")
-
-                        best_offer = get_best_offer(variant)
-                        product_price = variant.price
-                        final_price = best_offer["final_price"] if best_offer else product_price
-
-                        OrderItem.objects.create(
-                            order=order,
-                            variant=variant,
-                            quantity=item.quantity,
-                            price=final_price,
-                            total_price=final_price * item.quantity,
-                        )
-
-                    # Mark coupon usage
-                    if applied_coupon:
-                        CouponUsage.objects.update_or_create(
-                            user=user,
-                            coupon=applied_coupon,
-                            defaults={"used": True, "used_at": timezone.now()},
-                        )
-
-                    # Clear cart
-                    cart.delete()
-                    request.session.pop("applied_coupon_id", None)
-                    request.session.pop("selected_address_id", None)
+                order = place_order(
+                    user=user,
+                    priced=priced,
+                    address=selected_address,
+                    payment_method=payment_method,
+                    coupon=applied_coupon,
+                )
+                request.session.pop("applied_coupon_id", None)
+                request.session.pop("selected_address_id", None)
 
                 if payment_method == "cod":
                     return redirect("cod_payment", order_id=order.id)
@@ -614,152 +546,9 @@ def request_return_item(request, order_id, item_id):
 @login_required
 def download_invoice(request, order_id):
     
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    items = order.items.all()
-
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Register font
-    font_name_to_use = "Arial"
-    pdfmetrics.registerFont(TTFont("Arial", "arial.ttf"))
-    p.setFont(font_name_to_use, 12)
-
-    def q2(val):
-        return Decimal(val).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-    items_to_show = items.exclude(status__in=["cancelled", "returned"])
-
-    # --- Totals ---
-    if items_to_show.exists():
-        subtotal = sum(item.total_price for item in items_to_show)
-        tax = sum(q2(item.total_price * getattr(item.variant.product, "tax_rate", 0) / 100)
-                  for item in items_to_show)
-        shipping = order.shipping_charge or Decimal("0.00")
-    else:
-        subtotal = Decimal("0.00")
-        tax = Decimal("0.00")
-        shipping = Decimal("0.00")
-
-    # --- Discounts ---
-    coupon_discount = Decimal("0.00")
-    other_discount = getattr(order, "other_discount", Decimal("0.00"))
-
-    if order.coupon and subtotal > 0:
-        original_subtotal = sum(item.price * item.quantity for item in items)
-        coupon_discount = (subtotal / original_subtotal * order.discount) if original_subtotal > 0 else order.discount
-
-    # --- Final Amount ---
-    final_amount = q2(subtotal + shipping - coupon_discount - other_discount + tax)
-
-    # ------------------ HEADER ------------------
-    company_name = "GreenNest Pvt Ltd"
-    company_address = "123, MG Road, TVPM, Kerala, 682001"
-    company_phone = "+91-9876543210"
-    company_email = "greennest.ecom@gmail.com"
-
-    p.setFont(font_name_to_use, 14)
-    p.drawCentredString(width / 2, height - 50, company_name)
-
-    p.setFont(font_name_to_use, 10)
-    p.drawCentredString(width / 2, height - 65, company_address)
-    p.drawCentredString(width / 2, height - 80, f"Phone: {company_phone} | Email: {company_email}")
-
-    p.setLineWidth(1)
-    p.line(40, height - 90, width - 40, height - 90)
-
-    p.setFont(font_name_to_use, 14)
-    if order.status.lower() == "delivered":
-        title_text = f"Invoice No: {order.display_id}"
-    else:
-        title_text = f"Order Summary ({order.status.capitalize()})"
-    p.drawCentredString(width / 2, height - 110, title_text)
-
-    p.setFont(font_name_to_use, 10)
-    p.drawString(50, height - 115, f"Date: {order.created_at.strftime('%d %b %Y')}")
-    p.drawString(50, height - 130, f"Status: {order.status}")
-
-    # ------------------ CUSTOMER ADDRESS ------------------
-    y = height - 160
-    p.setFont(font_name_to_use, 12)
-    p.drawString(50, y, "Shipping Address:")
-    y -= 15
-    p.setFont(font_name_to_use, 10)
-    p.drawString(50, y, order.address.full_name)
-    y -= 15
-    p.drawString(50, y, f"{order.address.line1}, {order.address.line2}")
-    y -= 15
-    p.drawString(50, y, f"{order.address.city}, {order.address.state}")
-    y -= 15
-    p.drawString(50, y, f"Phone: {order.address.phone}")
-
-    # ------------------ ITEMS TABLE ------------------
-    y -= 30
-    p.setFont(font_name_to_use, 12)
-    p.drawString(50, y, "Product")
-    p.drawString(250, y, "Price")
-    p.drawString(350, y, "Qty")
-    p.drawString(400, y, "Total")
-    y -= 20
-
-    p.setFont(font_name_to_use, 10)
-
-    for item in items_to_show:
-        p.drawString(50, y, f"{item.variant.product.name} ({item.variant.variant_type})")
-        p.drawRightString(320, y, f"{item.price:.2f}")
-        p.drawRightString(370, y, str(item.quantity))
-        p.drawRightString(470, y, f"{item.total_price:.2f}")
-        y -= 15
-        if y < 100:
-            p.showPage()
-            y = height - 50
-            p.setFont(font_name_to_use, 10)
-
-    # ------------------ TOTALS ------------------
-    y -= 20
-    line_height = 15
-    p.setFont(font_name_to_use, 10)
-
-    p.drawString(350, y, "Subtotal:")
-    p.drawRightString(width - 50, y, f"{subtotal:.2f}")
-    y -= line_height
-
-    p.drawString(350, y, "Shipping:")
-    p.drawRightString(width - 50, y, f"{shipping:.2f}")
-    y -= line_height
-
-    if coupon_discount > 0:
-        p.drawString(350, y, "Coupon Discount:")
-        p.drawRightString(width - 50, y, f"-{coupon_discount:.2f}")
-        y -= line_height
-
-    if other_discount > 0:
-        p.drawString(350, y, "Other Discount:")
-        p.drawRightString(width - 50, y, f"-{other_discount:.2f}")
-        y -= line_height
-
-    p.drawString(350, y, "Tax:")
-    p.drawRightString(width - 50, y, f"{tax:.2f}")
-    y -= line_height + 5
-
-    p.setFont(font_name_to_use, 12)
-    if order.status.lower() == "delivered":
-        p.drawString(350, y, "Final Amount:")
-        p.drawRightString(width - 50, y, f"{final_amount:.2f}")
-    else:
-        p.drawString(350, y, "Payable Amount:")
-        p.drawRightString(width - 50, y, f"{final_amount:.2f}")
-
-    # ------------------ FOOTER ------------------
-    p.setFont(font_name_to_use, 8)
-    p.drawString(50, 50, "Thank you for shopping with us!")
-
-    p.showPage()
-    p.save()
+    order = get_object_or_404(Order.objects.select_related("address"), id=order_id, user=request.user)
 
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type="application/pdf")
+    response = HttpResponse(invoice_pdf(order), content_type="application/pdf")
     filename = "invoice" if order.status.lower() == "delivered" else "order_summary"
     response["Content-Disposition"] = f'attachment; filename="{filename}_{order.display_id}.pdf"'
     return response
@@ -0,0 +1,170 @@
+import threading
+import time
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Razorpay gateway adapter.
+# One client per process on a pooled requests.Session: keep-alive connections are reused
+# instead of a TLS handshake per call. Every call has a (connect, read) timeout, connection
+# errors are retried a bounded number of times (GETs also on 502/503/504, order creation is
+# not idempotent so it is never re-sent once it reached Razorpay), and a circuit breaker
+# fails fast while the gateway keeps failing, so a slow gateway cannot pin every web worker.
+# RAZORPAY_BASE_URL points it at another server, e.g. `manage.py fake_razorpay` locally.
+DEFAULT_BASE_URL = "https://api.razorpay.com"
+DEFAULT_TIMEOUT = (3.05, 10)  # seconds to connect, seconds to wait for the response
+DEFAULT_RETRIES = 2
+DEFAULT_POOL_SIZE = 20
+BREAKER_FAILURES = 5          # consecutive failures that open the breaker
+BREAKER_RESET = 30            # seconds before a trial call is let through
+
+
+class GatewayError(Exception):
+    pass
+
+
+class GatewayUnavailable(GatewayError):
+    """The gateway timed out, could not be reached, or the breaker is open."""
+
+
+class CircuitBreaker:
+    """Per-process breaker: closed -> open after `failures` in a row -> one trial call after `reset` seconds."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self._lock = threading.Lock()
+        self._count = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial or time.monotonic() - self._opened_at < self.reset:
+                raise GatewayUnavailable("Payment gateway is temporarily unavailable")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self._count = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._count += 1
+            self._trial = False
+            if self._opened_at is not None or self._count >= self.failures:
+                self._opened_at = time.monotonic()
+
+
+class _TimeoutSession(requests.Session):
+    # The razorpay client passes no timeout, this gives every request one
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
+def build_session(timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, pool_size=DEFAULT_POOL_SIZE):
+    session = _TimeoutSession(timeout)
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),  # read/status retries only; connect errors retry for any method
+        backoff_factor=0.2,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class RazorpayGateway:
+
+    def __init__(self, key_id, key_secret, base_url=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 pool_size=DEFAULT_POOL_SIZE, breaker=None):
+        self.key_id = key_id
+        self.client = razorpay.Client(
+            session=build_session(timeout, retries, pool_size),
+            auth=(key_id, key_secret),
+            base_url=base_url or DEFAULT_BASE_URL,
+        )
+        self.breaker = breaker or CircuitBreaker()
+
+    def _call(self, func, *args):
+        self.breaker.before_call()
+        try:
+            result = func(*args)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise GatewayUnavailable(f"Payment gateway did not respond: {e.__class__.__name__}") from e
+        except razorpay.errors.ServerError as e:
+            self.breaker.record_failure()
+            raise GatewayError(str(e) or "Payment gateway error") from e
+        except (razorpay.errors.BadRequestError, razorpay.errors.GatewayError) as e:
+            # The gateway answered, it is up
+            self.breaker.record_success()
+            raise GatewayError(str(e)) from e
+        self.breaker.record_success()
+        return result
+
+    def create_order(self, amount_in_paise, currency="INR", **extra):
+        return self._call(self.client.order.create, {
+            "amount": amount_in_paise,
+            "currency": currency,
+            "payment_capture": "1",
+            **extra,
+        })
+
+    def fetch_payment(self, payment_id):
+        return self._call(self.client.payment.fetch, payment_id)
+
+    def refund_payment(self, payment_id, amount_in_paise):
+        return self._call(self.client.payment.refund, payment_id, {"amount": amount_in_paise})
+
+    def verify_payment_signature(self, params):
+        # Local HMAC check, no HTTP call; raises razorpay.errors.SignatureVerificationError
+        return self.client.utility.verify_payment_signature(params)
+
+    def verify_webhook_signature(self, body, signature, secret):
+        # Same, for the X-Razorpay-Signature header of a webhook call
+        return self.client.utility.verify_webhook_signature(body, signature, secret)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide RazorpayGateway, built from settings on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = RazorpayGateway(
+                    settings.RAZORPAY_KEY_ID,
+                    settings.RAZORPAY_KEY_SECRET,
+                    base_url=getattr(settings, "RAZORPAY_BASE_URL", None),
+                    timeout=getattr(settings, "RAZORPAY_TIMEOUT", DEFAULT_TIMEOUT),
+                    retries=getattr(settings, "RAZORPAY_MAX_RETRIES", DEFAULT_RETRIES),
+                    pool_size=getattr(settings, "RAZORPAY_POOL_SIZE", DEFAULT_POOL_SIZE),
+                )
+    return _gateway
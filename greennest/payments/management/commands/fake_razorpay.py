@@ -0,0 +1,145 @@
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class FakeRazorpayHandler(BaseHTTPRequestHandler):
+    """Answers the few Razorpay API calls the shop makes, with configurable latency and failures."""
+
+    server_version = "FakeRazorpay/1.0"
+    orders = {}
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _misbehave(self):
+        # Returns True when the request was answered with a failure
+        server = self.server
+        delay = server.latency + random.uniform(0, server.jitter)
+        if random.random() < server.hang_rate:
+            delay = server.hang
+        time.sleep(delay)
+        if random.random() < server.error_rate:
+            self._json(500, {"error": {"code": "SERVER_ERROR", "description": "Fake gateway error"}})
+            return True
+        return False
+
+    def _json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(raw or "{}")
+        return {key: values[0] for key, values in parse_qs(raw).items()}
+
+    def do_POST(self):
+        body = self._body()
+        if self.path == "/v1/orders":
+            if self._misbehave():
+                return
+            order = {
+                "id": f"order_{uuid.uuid4().hex[:14]}",
+                "entity": "order",
+                "amount": body.get("amount"),
+                "currency": body.get("currency", "INR"),
+                "receipt": body.get("receipt"),
+                "status": "created",
+                "created_at": int(time.time()),
+            }
+            self.orders[order["id"]] = order
+            return self._json(200, order)
+
+        if self.path == "/fake/pay":
+            # Stands in for the customer paying in checkout.js: the fields razorpay_callback receives
+            order_id = body.get("order_id")
+            if order_id not in self.orders:
+                return self._json(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "Unknown order"}})
+            payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+            signature = hmac.new(
+                settings.RAZORPAY_KEY_SECRET.encode(), f"{order_id}|{payment_id}".encode(), hashlib.sha256
+            ).hexdigest()
+            self.orders[order_id]["status"] = "paid"
+            return self._json(200, {
+                "razorpay_order_id": order_id,
+                "razorpay_payment_id": payment_id,
+                "razorpay_signature": signature,
+            })
+
+        if self.path.startswith("/v1/payments/") and self.path.endswith("/refund"):
+            if self._misbehave():
+                return
+            return self._json(200, {
+                "id": f"rfnd_{uuid.uuid4().hex[:14]}",
+                "entity": "refund",
+                "amount": body.get("amount"),
+                "payment_id": self.path.split("/")[3],
+                "status": "processed",
+            })
+
+        self._json(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "Not found"}})
+
+    def do_GET(self):
+        if self._misbehave():
+            return
+        if self.path.startswith("/v1/orders/"):
+            order = self.orders.get(self.path.rsplit("/", 1)[-1])
+            if order:
+                return self._json(200, order)
+        elif self.path.startswith("/v1/payments/"):
+            return self._json(200, {
+                "id": self.path.rsplit("/", 1)[-1],
+                "entity": "payment",
+                "status": "captured",
+                "captured": True,
+            })
+        self._json(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "Not found"}})
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local stand-in for the Razorpay API (orders, payments, refunds, plus POST /fake/pay to sign a payment) "
+        "to benchmark checkout offline. Point RAZORPAY_BASE_URL at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=50, help="Milliseconds added to every API call.")
+        parser.add_argument("--jitter", type=float, default=0, help="Up to this many extra random milliseconds.")
+        parser.add_argument("--error-rate", type=float, default=0, help="Share of calls answered with a 500 (0-1).")
+        parser.add_argument("--hang-rate", type=float, default=0, help="Share of calls that hang for --hang seconds (0-1).")
+        parser.add_argument("--hang", type=float, default=60, help="Seconds a hanging call takes.")
+        parser.add_argument("--verbose", action="store_true", help="Log every request.")
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options["host"], options["port"]), FakeRazorpayHandler)
+        server.daemon_threads = True
+        server.latency = options["latency"] / 1000
+        server.jitter = options["jitter"] / 1000
+        server.error_rate = options["error_rate"]
+        server.hang_rate = options["hang_rate"]
+        server.hang = options["hang"]
+        server.verbose = options["verbose"]
+
+        self.stdout.write(f"Fake Razorpay on http://{options['host']}:{options['port']} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from payments.services import finalize_paid_payments
+
+
+class Command(BaseCommand):
+    help = "Place the orders of paid Razorpay payments that are still waiting (run from cron, e.g. every minute)."
+
+    def handle(self, *args, **options):
+        count = finalize_paid_payments()
+        self.stdout.write(self.style.SUCCESS(f"Placed {count} order(s)."))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_hot_query_indexes'),
+        ('payments', '0006_payment_checkout_data'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('razorpay_order_id__isnull', False)), fields=['razorpay_order_id'], name='payment_rzp_order_idx'),
+        ),
+    ]
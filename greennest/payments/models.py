@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
 from orders.models import Order
 
@@ -11,12 +12,15 @@ class Payment(models.Model):
 
     STATUS_CHOICES = [
         ("pending", "Pending"),
+        ("paid", "Paid"),  # captured at the gateway, order not placed yet (payments.services)
         ("success", "Success"),
         ("failed", "Failed"),
+        ("refund_pending", "Refund pending"),  # captured, but no order could be placed for it
         ("refunded", "Refunded"),
     ]
 
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="payments")
+    # Empty while a gateway payment is pending, set once the order is placed
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="payments", null=True, blank=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     method = models.CharField(max_length=20, choices=METHOD_CHOICES)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -29,10 +33,20 @@ class Payment(models.Model):
     razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_payment_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_signature = models.CharField(max_length=200, blank=True, null=True)
+    # What the customer checked out (amounts, address, coupon), so the order can be
+    # placed from the webhook/worker without their session
+    checkout_data = models.JSONField(blank=True, null=True)
 
     # Refund tracking
     refund_id = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Callback/webhook lookup; COD and wallet payments have no gateway order
+            models.Index(fields=["razorpay_order_id"], condition=Q(razorpay_order_id__isnull=False), name="payment_rzp_order_idx"),
+        ]
+
     def __str__(self):
-        return f"Payment #{self.id} | {self.order.display_id} | {self.method} - {self.amount} ({self.status})"
+        order = self.order.display_id if self.order else "no order"
+        return f"Payment #{self.id} | {order} | {self.method} - {self.amount} ({self.status})"
@@ -0,0 +1,194 @@
+import logging
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from coupon.models import Coupon
+from orders.services import OutOfStock, place_order, release_reservations
+from users.models import Address
+from .gateway import get_gateway
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+
+# Razorpay payments are confirmed in two steps:
+# record_payment marks the Payment "paid" (from the browser callback or the webhook,
+# whichever comes first, the other is a no-op) and queues it, finalize_payment then places
+# the order from Payment.checkout_data off the request path (payments/tasks.py).
+# checkout_data holds the priced lines the customer was charged for, so the order is
+# what was paid for whatever happened to the cart since. When that order can't be placed
+# (the record doesn't add up to the charge, or the stock is gone), the money goes back.
+class CheckoutMismatch(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class PaidLine:
+    variant_id: int
+    quantity: int
+    discounted_price: Decimal
+    final_total: Decimal
+
+
+@dataclass(frozen=True)
+class PaidCart:
+    # The fields place_order reads off a PricedCart
+    cart_id: int
+    lines: tuple
+
+
+def checkout_data(priced, address):
+    """What razorpay_checkout stores on the Payment for a PricedCart: its lines and the amounts charged."""
+    return {
+        "cart_id": priced.cart_id,
+        "address_id": address.id if address else None,
+        "coupon_id": priced.coupon.id if priced.coupon else None,
+        "subtotal": str(priced.items_total),
+        "shipping": str(priced.shipping),
+        "discount": str(priced.coupon_discount),
+        "total": str(priced.total),
+        "lines": [
+            {
+                "variant_id": line.variant_id,
+                "quantity": line.quantity,
+                "price": str(line.discounted_price),
+                "total": str(line.final_total),
+            }
+            for line in priced.lines
+        ],
+    }
+
+
+def paid_cart(payment):
+    """(PaidCart, totals) from payment.checkout_data, checked against the amount charged. Raises CheckoutMismatch."""
+    data = payment.checkout_data or {}
+    try:
+        lines = tuple(
+            PaidLine(
+                variant_id=int(line["variant_id"]),
+                quantity=int(line["quantity"]),
+                discounted_price=Decimal(line["price"]),
+                final_total=Decimal(line["total"]),
+            )
+            for line in data.get("lines") or ()
+        )
+        totals = {key: Decimal(data[key]) for key in ("subtotal", "shipping", "discount", "total")}
+    except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+        raise CheckoutMismatch(f"Checkout record is incomplete: {e!r}") from e
+
+    if not lines:
+        raise CheckoutMismatch("No priced lines were recorded at checkout")
+    if any(line.quantity <= 0 or line.final_total != line.discounted_price * line.quantity for line in lines):
+        raise CheckoutMismatch("A recorded line does not add up")
+    if sum(line.final_total for line in lines) != totals["subtotal"]:
+        raise CheckoutMismatch("Recorded lines do not add up to the subtotal")
+    if totals["subtotal"] + totals["shipping"] - totals["discount"] != totals["total"]:
+        raise CheckoutMismatch("Recorded totals do not add up")
+    # payment.amount is what the gateway order was created for, i.e. what was captured
+    if totals["total"] != payment.amount:
+        raise CheckoutMismatch(f"Recorded total {totals['total']} is not the {payment.amount} charged")
+    return PaidCart(cart_id=data.get("cart_id"), lines=lines), totals
+
+
+# A capture confirmed by the gateway is recorded for a pending Payment, and also for one a
+# callback with a bad (or forged) signature marked failed: the money was taken, so the order
+# is placed, from stock again as the holds are gone, or refunded when that stock is sold.
+RECORDABLE_STATUSES = ("pending", "failed")
+
+
+def record_payment(razorpay_order_id, razorpay_payment_id, signature=None):
+    """Mark the Payment for a gateway order as paid and queue its order. Returns the Payment (or None)."""
+    from .tasks import enqueue_finalize
+
+    payment = Payment.objects.filter(razorpay_order_id=razorpay_order_id).only("id", "user_id", "status").first()
+    if payment is None:
+        return None
+    with transaction.atomic():
+        updated = Payment.objects.filter(pk=payment.pk, status__in=RECORDABLE_STATUSES).update(
+            status="paid",
+            razorpay_payment_id=razorpay_payment_id,
+            razorpay_signature=signature,
+        )
+        if updated:
+            enqueue_finalize(payment.pk)
+    return payment
+
+
+def finalize_payment(payment_id):
+    """Place the order for a paid Payment. Idempotent: returns None when there is nothing (left) to do."""
+    with transaction.atomic():
+        payment = (
+            Payment.objects.select_for_update(of=("self",))
+            .select_related("user")
+            .filter(pk=payment_id, status="paid", order__isnull=True)
+            .first()
+        )
+        if payment is None:
+            return None
+
+        data = payment.checkout_data or {}
+        try:
+            with transaction.atomic():
+                paid, totals = paid_cart(payment)
+                coupon = Coupon.objects.filter(id=data["coupon_id"]).first() if data.get("coupon_id") else None
+
+                # Order totals are the amounts charged by Razorpay
+                order = place_order(
+                    user=payment.user,
+                    priced=paid,
+                    address=Address.objects.filter(id=data.get("address_id"), user=payment.user).first(),
+                    payment_method="Razorpay",
+                    coupon=coupon,
+                    payment=payment,
+                    totals=totals,
+                )
+        except (CheckoutMismatch, OutOfStock) as e:
+            # Money was captured but this order can't be placed: refund it rather than leave it.
+            # Anything else (database trouble) raises, and the job is retried.
+            logger.error("Refunding payment %s, no order placed: %s", payment.pk, e)
+            refund_later(payment)
+            return None
+
+        payment.status = "success"
+        payment.order = order
+        payment.save(update_fields=["status", "order"])
+    return order
+
+
+def finalize_paid_payments():
+    """Finalize every paid Payment still without an order (e.g. queued before a restart). Returns orders placed."""
+    placed = 0
+    for payment_id in Payment.objects.filter(status="paid", order__isnull=True).order_by("id").values_list("id", flat=True):
+        try:
+            if finalize_payment(payment_id):
+                placed += 1
+        except Exception:
+            logger.exception("Could not finalize payment %s", payment_id)
+    return placed
+
+
+def refund_later(payment):
+    """Mark a captured Payment refund_pending, give its stock holds back and queue the refund. In a transaction."""
+    from .tasks import enqueue_refund
+
+    payment.status = "refund_pending"
+    payment.save(update_fields=["status"])
+    release_reservations(payment.reservations.all())
+    enqueue_refund(payment.pk)
+
+
+def refund_payment(payment_id):
+    """
+    Refund a refund_pending Payment in full at the gateway. A GatewayError raises (the job
+    retries). Razorpay refuses to refund more than was captured, so a retry after a refund
+    that went through but wasn't recorded fails instead of paying out twice.
+    """
+    payment = Payment.objects.filter(pk=payment_id, status="refund_pending").first()
+    if payment is None:
+        return None
+    refund = get_gateway().refund_payment(payment.razorpay_payment_id, int(payment.amount * 100))
+    Payment.objects.filter(pk=payment.pk, status="refund_pending").update(status="refunded", refund_id=refund["id"])
+    logger.info("Payment %s refunded (%s)", payment.pk, refund["id"])
+    return refund["id"]
@@ -0,0 +1,28 @@
+from jobs.queue import PRIORITY_HIGH, task
+
+
+# Payment work, run by `manage.py run_worker`. The Payment row itself stays the durable
+# record (status "paid", no order yet): `manage.py finalize_payments` still picks up
+# anything that never made it through the queue.
+@task("payments.finalize_payment", priority=PRIORITY_HIGH, retry_delay=5)
+def finalize(payment_id):
+    from .services import finalize_payment
+
+    finalize_payment(payment_id)
+
+
+def enqueue_finalize(payment_id):
+    """Queue placing the order for a paid Payment, with the current transaction. Once per payment."""
+    finalize.enqueue(payment_id, key=f"payments:finalize:{payment_id}")
+
+
+@task("payments.refund_payment", priority=PRIORITY_HIGH, max_attempts=8, retry_delay=30)
+def refund(payment_id):
+    from .services import refund_payment
+
+    refund_payment(payment_id)
+
+
+def enqueue_refund(payment_id):
+    """Queue refunding a captured Payment no order could be placed for, with the current transaction. Once per payment."""
+    refund.enqueue(payment_id, key=f"payments:refund:{payment_id}")
@@ -1,3 +1,214 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from cart.models import Cart, CartItem
+from cart.pricing import CartPricing
+from greennest.testing import ExplainTestCase
+from jobs.models import Job
+from orders.models import Order, StockReservation
+from orders.services import reserve_stock
+from products.models import Category, Product, ProductVariant
+from users.models import Address, User
+from .models import Payment
+from .services import checkout_data, finalize_payment, record_payment, refund_payment
+
+
+class PaymentIndexTests(ExplainTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="payer", email="payer@example.com", password="x")
+        Payment.objects.create(user=user, method="razorpay", amount=100, razorpay_order_id="order_test")
+
+    def test_payment_by_gateway_order(self):
+        self.assertUsesIndex(Payment.objects.filter(razorpay_order_id="order_test"), "payment_rzp_order_idx")
+
+
+class PaymentTestMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(category=Category.objects.create(name="Indoor"), name="Fern")
+        cls.fern = ProductVariant.objects.create(product=product, variant_type="Small", price=Decimal("120"), stock=5)
+        cls.palm = ProductVariant.objects.create(product=product, variant_type="Large", price=Decimal("300"), stock=5)
+        cls.user = User.objects.create_user(username="payer", email="payer@example.com", password="x")
+        cls.address = Address.objects.create(
+            user=cls.user, full_name="Payer", phone="9999999999", line1="1 Leaf Street",
+            city="Kochi", state="Kerala", postal_code="682001",
+        )
+
+    def checkout(self, quantity=2):
+        """A cart of `quantity` ferns, priced and held like razorpay_checkout does, with a pending Payment."""
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, variant=self.fern, quantity=quantity)
+        priced = CartPricing(self.cart).price()
+        payment = Payment.objects.create(
+            user=self.user, method="razorpay", amount=priced.total, razorpay_order_id="order_1",
+            checkout_data=checkout_data(priced, self.address),
+        )
+        reserve_stock(payment, priced)
+        return payment
+
+    def stock(self, variant):
+        return ProductVariant.objects.get(pk=variant.pk).stock
+
+    def jobs(self, task):
+        return Job.objects.filter(task=task).count()
+
+
+class RecordPaymentTests(PaymentTestMixin, TestCase):
+
+    def test_callback_and_webhook_queue_one_order(self):
+        payment = self.checkout()
+        record_payment("order_1", "pay_1", "sig")
+        record_payment("order_1", "pay_2")
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.razorpay_payment_id), ("paid", "pay_1"))
+        self.assertEqual(self.jobs("payments.finalize_payment"), 1)
+
+    def test_unknown_gateway_order(self):
+        self.assertIsNone(record_payment("order_missing", "pay_1"))
+        self.assertEqual(self.jobs("payments.finalize_payment"), 0)
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET="whsec")
+class WebhookTests(PaymentTestMixin, TestCase):
+
+    def post(self, body, signature=None):
+        body = json.dumps(body)
+        signature = signature or hmac.new(b"whsec", body.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse("razorpay_webhook"), body, content_type="application/json", HTTP_X_RAZORPAY_SIGNATURE=signature,
+        )
+
+    def captured(self):
+        return {
+            "event": "payment.captured",
+            "payload": {"payment": {"entity": {"id": "pay_1", "order_id": "order_1"}}},
+        }
+
+    def test_repeated_delivery_is_recorded_once(self):
+        payment = self.checkout()
+        self.assertEqual(self.post(self.captured()).status_code, 200)
+        self.assertEqual(self.post(self.captured()).status_code, 200)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "paid")
+        self.assertEqual(self.jobs("payments.finalize_payment"), 1)
+
+    def test_bad_signature(self):
+        payment = self.checkout()
+        self.assertEqual(self.post(self.captured(), signature="0" * 64).status_code, 400)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "pending")
+
+    def test_capture_after_a_failed_callback_places_the_order(self):
+        payment = self.checkout()
+        self.client.force_login(self.user)
+        self.client.post(reverse("razorpay_callback"), {
+            "razorpay_order_id": "order_1", "razorpay_payment_id": "pay_1", "razorpay_signature": "forged",
+        })
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "failed")
+        self.assertEqual(self.stock(self.fern), 5)
+
+        self.assertEqual(self.post(self.captured()).status_code, 200)
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.razorpay_payment_id), ("paid", "pay_1"))
+        order = finalize_payment(payment.pk)
+        self.assertEqual(order.final_amount, payment.amount)
+        self.assertEqual(self.stock(self.fern), 3)
+
+    def test_capture_after_a_failed_callback_is_refunded_when_sold_out(self):
+        payment = self.checkout()
+        self.client.force_login(self.user)
+        self.client.post(reverse("razorpay_callback"), {
+            "razorpay_order_id": "order_1", "razorpay_payment_id": "pay_1", "razorpay_signature": "forged",
+        })
+        ProductVariant.objects.filter(pk=self.fern.pk).update(stock=1)
+
+        self.post(self.captured())
+        with self.assertLogs("payments.services", "ERROR"):
+            self.assertIsNone(finalize_payment(payment.pk))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "refund_pending")
+        self.assertEqual(self.jobs("payments.refund_payment"), 1)
+
+    def test_other_events_are_acknowledged(self):
+        self.checkout()
+        self.assertEqual(self.post({"event": "payment.failed", "payload": {}}).status_code, 200)
+        self.assertEqual(self.jobs("payments.finalize_payment"), 0)
+
+
+class FinalizePaymentTests(PaymentTestMixin, TestCase):
+
+    def paid(self, **changes):
+        payment = self.checkout()
+        record_payment("order_1", "pay_1")
+        Payment.objects.filter(pk=payment.pk).update(**changes)
+        return payment
+
+    def test_order_is_placed_once(self):
+        payment = self.paid()
+        order = finalize_payment(payment.pk)
+        self.assertIsNone(finalize_payment(payment.pk))
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.order), ("success", order))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(order.final_amount, payment.amount)
+        self.assertEqual(order.address, self.address)
+        self.assertEqual(self.stock(self.fern), 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_order_is_what_was_paid_for(self):
+        payment = self.paid()
+        # The customer kept shopping in another tab after paying
+        CartItem.objects.filter(cart=self.cart).update(quantity=4)
+        CartItem.objects.create(cart=self.cart, variant=self.palm, quantity=1)
+
+        order = finalize_payment(payment.pk)
+        self.assertEqual(list(order.items.values_list("variant_id", "quantity")), [(self.fern.id, 2)])
+        self.assertEqual(self.stock(self.palm), 5)
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_pending_payment_is_not_finalized(self):
+        payment = self.checkout()
+        self.assertIsNone(finalize_payment(payment.pk))
+        self.assertFalse(Order.objects.exists())
+
+    def test_mismatch_is_refunded(self):
+        payment = self.paid(amount=Decimal("1.00"))
+        with self.assertLogs("payments.services", "ERROR"):
+            self.assertIsNone(finalize_payment(payment.pk))
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "refund_pending")
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(self.fern), 5)
+        self.assertEqual(Job.objects.get(task="payments.refund_payment").args, [payment.pk])
+        # Queued once however often it is retried
+        self.assertIsNone(finalize_payment(payment.pk))
+        self.assertEqual(self.jobs("payments.refund_payment"), 1)
+
+
+class RefundPaymentTests(PaymentTestMixin, TestCase):
+
+    def test_refunded_in_full_once(self):
+        payment = self.checkout()
+        Payment.objects.filter(pk=payment.pk).update(status="refund_pending", razorpay_payment_id="pay_1")
+        gateway = mock.Mock()
+        gateway.refund_payment.return_value = {"id": "rfnd_1"}
+
+        with mock.patch("payments.services.get_gateway", return_value=gateway), self.assertLogs("payments.services"):
+            self.assertEqual(refund_payment(payment.pk), "rfnd_1")
+            self.assertIsNone(refund_payment(payment.pk))
+
+        gateway.refund_payment.assert_called_once_with("pay_1", int(payment.amount * 100))
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.refund_id), ("refunded", "rfnd_1"))
@@ -6,4 +6,7 @@ urlpatterns = [
     path("wallet/<int:order_id>/", views.wallet_payment, name="wallet_payment"),
     path("razorpay/checkout/", views.razorpay_checkout, name="razorpay_checkout"),
     path("payments/razorpay/callback/", views.razorpay_callback, name="razorpay_callback"),
+    path("razorpay/webhook/", views.razorpay_webhook, name="razorpay_webhook"),
+    path("processing/<int:payment_id>/", views.payment_processing, name="payment_processing"),
+    path("status/<int:payment_id>/", views.payment_status, name="payment_status"),
 ]
@@ -1,5 +1,11 @@
+import json
+
 from django.utils import timezone
-import razorpay
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -8,16 +14,17 @@ from django.db import transaction
 from decimal import Decimal
 
 from coupon.models import Coupon, CouponUsage
-from offer.utils import get_best_offer
+from cart.pricing import get_priced_cart
 from users.models import Address
-from orders.models import Order, OrderItem
+from orders.models import Order, StockReservation
+from orders.services import OutOfStock, release_reservations, reserve_stock
 from payments.models import Payment
 from wallet.models import Wallet, WalletTransaction
 from cart.models import Cart
+from payments.gateway import GatewayError, get_gateway
+from payments.services import checkout_data, record_payment
 
 
-client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-
 # COD Payment
 @login_required
 def cod_payment(request, order_id):
@@ -90,36 +97,61 @@ def wallet_payment(request, order_id):
 
 # Razorpay Checkout
 @login_required
-@login_required
 def razorpay_checkout(request):
     cart_data = request.session.get('razorpay_cart_data')
     if not cart_data:
         messages.error(request, "Session expired. Please try again.")
         return redirect("checkout_payment")
 
-    # Convert amounts from string to Decimal
-    total_amount = Decimal(cart_data['total'])
+    cart = Cart.objects.filter(user=request.user).first()
+    if not cart:
+        messages.error(request, "Your cart is empty.")
+        return redirect("cart_detail")
+    coupon = Coupon.objects.filter(id=cart_data.get('coupon_id')).first() if cart_data.get('coupon_id') else None
+    address = Address.objects.filter(id=cart_data.get('address_id'), user=request.user).first()
+
+    # Charge for the cart as priced now, and record those lines: the order is placed from
+    # them (payments.services), not from whatever the cart holds by the time the money arrives
+    priced = get_priced_cart(cart, coupon=coupon)
+    if priced.is_empty:
+        messages.error(request, "Your cart is empty.")
+        return redirect("cart_detail")
+    total_amount = priced.total
 
     # Convert to paise
     amount_in_paise = int(total_amount * 100)
 
     amount_in_rupees = amount_in_paise / 100
 
+    # Create pending Payment without order yet, and hold the cart's stock for it
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                user=request.user,
+                method="razorpay",
+                amount=total_amount,
+                status="pending",
+                checkout_data=checkout_data(priced, address),
+            )
+            # A new attempt replaces the customer's earlier unfinished ones
+            earlier_holds = StockReservation.objects.filter(payment__user=request.user, payment__status="pending")
+            reserve_stock(payment, priced, replacing=earlier_holds.exclude(payment=payment))
+    except OutOfStock as e:
+        messages.error(request, str(e))
+        return redirect("checkout_payment")
+
     # Create Razorpay order
-    razorpay_order = client.order.create({
-        "amount": amount_in_paise,
-        "currency": "INR",
-        "payment_capture": "1"
-    })
-
-    # Create pending Payment without order yet
-    payment = Payment.objects.create(
-        user=request.user,
-        method="razorpay",
-        amount=total_amount,
-        status="pending",
-        razorpay_order_id=razorpay_order["id"],
-    )
+    try:
+        razorpay_order = get_gateway().create_order(amount_in_paise)
+    except GatewayError:
+        release_reservations(payment.reservations.all())
+        payment.status = "failed"
+        payment.save(update_fields=["status"])
+        messages.error(request, "Could not reach the payment gateway. Please try again.")
+        return redirect("checkout_payment")
+
+    payment.razorpay_order_id = razorpay_order["id"]
+    payment.save(update_fields=["razorpay_order_id"])
 
     context = {
         "razorpay_order_id": razorpay_order["id"],
@@ -132,6 +164,8 @@ def razorpay_checkout(request):
 
 
 # Razorpay Callback
+# Only checks the signature and records the payment, the order is placed in the
+# background (payments.services) and the processing page polls payment_status for it.
 @login_required
 def razorpay_callback(request):
     if request.method != "POST":
@@ -141,89 +175,79 @@ def razorpay_callback(request):
     razorpay_order_id = request.POST.get("razorpay_order_id")
     signature = request.POST.get("razorpay_signature")
 
-    payment = Payment.objects.filter(razorpay_order_id=razorpay_order_id).first()
+    payment = Payment.objects.filter(razorpay_order_id=razorpay_order_id, user=request.user).first()
     if not payment:
         messages.error(request, "Payment record not found ❌")
         return redirect("checkout_payment")
 
     try:
-        params_dict = {
+        get_gateway().verify_payment_signature({
             "razorpay_order_id": razorpay_order_id,
             "razorpay_payment_id": payment_id,
             "razorpay_signature": signature
-        }
-        client.utility.verify_payment_signature(params_dict)
+        })
+    except Exception as e:
+        if Payment.objects.filter(pk=payment.pk, status="pending").update(status="failed"):
+            release_reservations(payment.reservations.all())
+        messages.error(request, f"Payment failed ❌ Reason: {str(e)}")
+        return redirect("checkout_payment")
 
-        with transaction.atomic():
-            # Fetch session data
-            cart_data = request.session.get('razorpay_cart_data')
-            if not cart_data:
-                raise ValueError("Session expired")
+    record_payment(razorpay_order_id, payment_id, signature)
 
-            # Create Order
-            order = Order.objects.create(
-                user=request.user,
-                address_id=cart_data['address_id'],
-                total_amount=Decimal(cart_data['subtotal']),
-                shipping_charge=Decimal(cart_data['shipping']),
-                discount=Decimal(cart_data['discount']),
-                final_amount=Decimal(cart_data['total']),
-                coupon_id=cart_data.get('coupon_id'),
-                status='processing',
-                payment_method='Razorpay',
-            )
+    # Clear session
+    request.session.pop('razorpay_cart_data', None)
+    request.session.pop("applied_coupon_id", None)
+    request.session.pop("selected_address_id", None)
+
+    return redirect("payment_processing", payment_id=payment.id)
+
+
+# Razorpay Webhook
+# Confirms payments whose browser never came back to the callback. Razorpay retries
+# until it gets a 2xx, record_payment makes repeats (and the callback) no-ops.
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    if not settings.RAZORPAY_WEBHOOK_SECRET:
+        return HttpResponseBadRequest("Webhook not configured")
+    try:
+        get_gateway().verify_webhook_signature(
+            request.body.decode(),
+            request.headers.get("X-Razorpay-Signature", ""),
+            settings.RAZORPAY_WEBHOOK_SECRET,
+        )
+        event = json.loads(request.body)
+    except Exception:
+        return HttpResponseBadRequest("Invalid signature")
+
+    if event.get("event") in ("payment.captured", "order.paid"):
+        entity = event.get("payload", {}).get("payment", {}).get("entity", {})
+        if entity.get("order_id") and entity.get("id"):
+            record_payment(entity["order_id"], entity["id"])
+    return HttpResponse(status=200)
 
-            # Deduct stock & create OrderItems
-            cart = Cart.objects.filter(user=request.user).first()
-            if not cart:
-                raise ValueError("Cart not found")
-
-            for item in cart.items.select_related("variant").select_for_update():
-                variant = item.variant
-                variant.refresh_from_db()
-                if variant.stock is not None and variant.stock >= item.quantity:
-                    variant.stock -= item.quantity
-                    variant.save()
-                else:
-                    raise ValueError(f"Insufficient stock for {variant.name}")
-
-                best_offer = get_best_offer(variant)
-                final_price = best_offer["final_price"] if best_offer else variant.price
-
-                OrderItem.objects.create(
-                    order=order,
-                    variant=variant,
-                    quantity=item.quantity,
-                    price=final_price,
-                    total_price=final_price * item.quantity,
-                )
-
-            # Mark coupon usage
-            if cart_data.get('coupon_id'):
-                CouponUsage.objects.update_or_create(
-                    user=request.user,
-                    coupon_id=cart_data['coupon_id'],
-                    defaults={"used": True, "used_at": timezone.now()},
-                )
-
-            # Update Payment
-            payment.status = "success"
-            payment.razorpay_payment_id = payment_id
-            payment.razorpay_signature = signature
-            payment.order = order
-            payment.save()
-
-            # Clear cart & session
-            cart.delete()
-            request.session.pop('razorpay_cart_data', None)
-            request.session.pop("applied_coupon_id", None)
-            request.session.pop("selected_address_id", None)
 
+@login_required
+@never_cache
+def payment_processing(request, payment_id):
+    payment = get_object_or_404(Payment, id=payment_id, user=request.user)
+    if payment.status == "success" and payment.order_id:
         messages.success(request, "Payment successful via Razorpay ✅")
-        return redirect("order_success", order_id=order.id)
+        return redirect("order_success", order_id=payment.order_id)
+    return render(request, "payment_processing.html", {"payment": payment})
 
-    except Exception as e:
-        payment.status = "failed"
-        payment.save()
-        messages.error(request, f"Payment failed ❌ Reason: {str(e)}")
-        return redirect("checkout_payment")
+
+# Polled by payment_processing.html, one indexed lookup
+@login_required
+@never_cache
+def payment_status(request, payment_id):
+    payment = Payment.objects.filter(id=payment_id, user=request.user).values("status", "order_id").first()
+    if payment is None:
+        return JsonResponse({"status": "unknown"}, status=404)
+
+    redirect_url = None
+    if payment["status"] == "success" and payment["order_id"]:
+        redirect_url = reverse("order_success", args=[payment["order_id"]])
+    elif payment["status"] in ("failed", "refund_pending", "refunded"):
+        redirect_url = reverse("razorpay_failed_payment")
+    return JsonResponse({"status": payment["status"], "redirect": redirect_url})
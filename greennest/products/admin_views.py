@@ -4,6 +4,7 @@ import re
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .models import Category, Product, ProductVariant, VariantImage
+from .search import search_products
 from django.views.decorators.cache import never_cache
 from django.core.paginator import Paginator
 from django.core.files.base import ContentFile
@@ -34,7 +35,7 @@ def admin_product_list(request):
 
     # Filter products by name if search query exists
     if search_query:
-        products = Product.objects.filter(name__icontains=search_query).prefetch_related("variants__images").order_by("-id")
+        products = search_products(Product.objects.prefetch_related("variants__images"), search_query)
     else:
         products = Product.objects.prefetch_related("variants__images").order_by("-id")
     
@@ -0,0 +1,35 @@
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from offer.index import get_offer_index
+
+
+# Shared catalog version. Bumped after any change to what the storefront shows
+# (products, categories, variant prices, images, offers - see products/signals.py
+# and offer/signals.py); cached pages and fragments put it in their cache keys.
+CATALOG_VERSION_KEY = "catalog_version"
+CATALOG_CACHE_TIMEOUT = 15 * 60  # seconds, upper bound for catalog fragments
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(CATALOG_VERSION_KEY, version, None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def catalog_cache_timeout():
+    """Seconds a catalog fragment may be cached: never past the next offer start/end."""
+    expires_at = get_offer_index().expires_at
+    if expires_at is None:
+        return CATALOG_CACHE_TIMEOUT
+    remaining = int((expires_at - timezone.now()).total_seconds()) + 1
+    return max(1, min(CATALOG_CACHE_TIMEOUT, remaining))
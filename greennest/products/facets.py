@@ -0,0 +1,87 @@
+from django.db.models import Case, Count, Exists, IntegerField, Max, Min, OuterRef, Q, Subquery, Value, When
+
+from offer.models import VariantEffectivePrice
+
+
+# Sidebar facets for the product listing, from one grouped aggregate query.
+# Products are grouped by (category, light requirement, price bucket, in price range),
+# which is a handful of rows; every facet is then summed from those rows in Python.
+# Like most shops, a facet ignores its own filter (ticking "Low" still shows the
+# Medium/Bright counts) and applies the others.
+LIGHT_CHOICES = [
+    ("Low", "Low Light"),
+    ("Medium", "Medium Light"),
+    ("Bright", "Bright Light"),
+]
+
+# (low, high) in rupees on the cheapest offer price, high is exclusive, None = no upper bound
+PRICE_BUCKETS = [(0, 250), (250, 500), (500, 1000), (1000, None)]
+
+
+def _bucket_case():
+    whens = []
+    for number, (low, high) in enumerate(PRICE_BUCKETS):
+        condition = Q(facet_min_price__gte=low)
+        if high is not None:
+            condition &= Q(facet_min_price__lt=high)
+        whens.append(When(condition, then=Value(number)))
+    return Case(*whens, default=Value(None), output_field=IntegerField())
+
+
+def get_facets(products, categories=(), lights=(), min_price=None, max_price=None):
+    """
+    Facet counts for `products` (the listing queryset before category/light/price filters):
+    {"categories": {name: n}, "lights": {value: n}, "price_buckets": [...], "price_bounds": {"min", "max"}}
+    """
+    listed = VariantEffectivePrice.objects.filter(variant__product=OuterRef("pk"), variant__stock__gt=0)
+    in_range = listed
+    if min_price:
+        in_range = in_range.filter(final_price__gte=min_price)
+    if max_price:
+        in_range = in_range.filter(final_price__lte=max_price)
+
+    rows = (
+        products.order_by()
+        .annotate(
+            facet_min_price=Subquery(listed.order_by("final_price").values("final_price")[:1]),
+            facet_max_price=Subquery(listed.order_by("-final_price").values("final_price")[:1]),
+        )
+        .annotate(facet_bucket=_bucket_case(), facet_in_range=Exists(in_range))
+        .values("category__name", "light_requirement", "facet_bucket", "facet_in_range")
+        .annotate(count=Count("pk"), low=Min("facet_min_price"), high=Max("facet_max_price"))
+    )
+
+    price_filtered = bool(min_price or max_price)
+    category_counts = {}
+    light_counts = {}
+    bucket_counts = [0] * len(PRICE_BUCKETS)
+    low = high = None
+
+    for row in rows:
+        category_ok = not categories or row["category__name"] in categories
+        light_ok = not lights or row["light_requirement"] in lights
+        price_ok = not price_filtered or row["facet_in_range"]
+
+        if light_ok and price_ok:
+            name = row["category__name"]
+            category_counts[name] = category_counts.get(name, 0) + row["count"]
+        if category_ok and price_ok:
+            light = row["light_requirement"]
+            light_counts[light] = light_counts.get(light, 0) + row["count"]
+        if category_ok and light_ok:
+            if row["facet_bucket"] is not None:
+                bucket_counts[row["facet_bucket"]] += row["count"]
+            if row["low"] is not None and (low is None or row["low"] < low):
+                low = row["low"]
+            if row["high"] is not None and (high is None or row["high"] > high):
+                high = row["high"]
+
+    return {
+        "categories": category_counts,
+        "lights": light_counts,
+        "price_buckets": [
+            {"min": bucket_low, "max": bucket_high, "count": count}
+            for (bucket_low, bucket_high), count in zip(PRICE_BUCKETS, bucket_counts)
+        ],
+        "price_bounds": {"min": low, "max": high},
+    }
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Recompute the product search vectors (e.g. after bulk imports or raw SQL edits)."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.update_index()
+        self.stdout.write(self.style.SUCCESS(f"{type(backend).__name__}: indexed {count} product(s)."))
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:57
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# GIN indexes only exist on PostgreSQL; other databases use products.search.SimpleSearchBackend
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_search_vector_gin "
+        "ON products_product USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_name_trgm "
+        "ON products_product USING gin (name gin_trgm_ops)"
+    )
+    # icontains compiles to UPPER(name::text) LIKE UPPER('%q%')
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_name_upper_trgm "
+        "ON products_product USING gin ((UPPER(name::text)) gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        """
+        UPDATE products_product AS p SET search_vector =
+            setweight(to_tsvector('english', coalesce(p.name, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(c.name, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(p.light_requirement, '')), 'C')
+            || setweight(to_tsvector('english', coalesce(p.description, '')), 'D')
+        FROM products_category AS c
+        WHERE c.id = p.category_id
+        """
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_search_vector_gin")
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_name_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_name_upper_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_productvariant_is_active'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -1,4 +1,13 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from decimal import Decimal
+
+from django.db.models import (
+    BigIntegerField, Case, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Mod, Round
+from django.db.models.lookups import Exact
+from django.utils import timezone
 
 
 # Category Model (dynamic)
@@ -20,12 +29,96 @@ class Product(models.Model):
     light_requirement = models.CharField(max_length=100, blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by products.search (PostgreSQL only), see products/signals.py
+    search_vector = SearchVectorField(null=True, editable=False)
     
 
     def __str__(self):
         return f"{self.name} ({self.category.name})"
 
 
+def _running_offers(model, field, outer_field, at):
+    # Running offers for the outer row, best first
+    return model.objects.filter(
+        **{field: OuterRef(outer_field)},
+        is_active=True,
+        start_date__lte=at,
+        end_date__gte=at,
+    ).order_by("-discount_percentage")
+
+
+def _top_discount(offers):
+    # Highest running discount, NULL when there is no offer
+    return Subquery(offers.values("discount_percentage")[:1], output_field=IntegerField())
+
+
+def _applied_discount(offers):
+    # The top offer only counts when it is within 1-90%, otherwise 0
+    applied = offers.annotate(
+        applied=Case(
+            When(discount_percentage__gte=1, discount_percentage__lte=90, then=F("discount_percentage")),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    ).values("applied")[:1]
+    return Coalesce(Subquery(applied, output_field=IntegerField()), Value(0))
+
+
+class ProductVariantQuerySet(models.QuerySet):
+    def with_effective_price(self, at=None):
+        """
+        Annotate best_discount, best_offer_type and final_price in SQL, with the same
+        rules as offer.utils.get_best_offer (1-90% clamp, product offer wins ties, and
+        round-half-even to paise like Python's round()).
+        """
+        from offer.models import ProductOffer, CategoryOffer
+
+        at = at or timezone.now()
+        product_offers = _running_offers(ProductOffer, "product_id", "product_id", at)
+        category_offers = _running_offers(CategoryOffer, "category_id", "product__category_id", at)
+
+        qs = self.annotate(
+            product_discount=_top_discount(product_offers),
+            category_discount=_top_discount(category_offers),
+            product_applied=_applied_discount(product_offers),
+            category_applied=_applied_discount(category_offers),
+        )
+
+        product_wins = Q(product_applied__gte=F("category_applied")) | Q(price=0)
+
+        # price * (100 - discount) in 1/10000 rupees, as an integer (exact on every backend:
+        # SQLite would do the decimal math in floats); half-even to paise is
+        # (n + 50) div 100, minus one on an exact half with an even result (n % 200 == 50)
+        units = ExpressionWrapper(
+            Cast(Round(F("price") * 100), BigIntegerField())
+            * (100 - Greatest("product_applied", "category_applied")),
+            output_field=BigIntegerField(),
+        )
+        paise = ExpressionWrapper(
+            (units + 50) / 100 - Case(
+                When(Q(Exact(Mod(units, 200), 50)), then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            output_field=BigIntegerField(),
+        )
+
+        return qs.annotate(
+            best_discount=Case(
+                When(product_wins, then=Coalesce("product_discount", Value(0))),
+                default=F("category_discount"),
+                output_field=IntegerField(),
+            ),
+            best_offer_type=Case(
+                When(product_wins & Q(product_discount__isnull=False), then=Value("Product Offer")),
+                When(product_wins, then=Value(None)),
+                default=Value("Category Offer"),
+                output_field=models.CharField(),
+            ),
+            final_price=Cast(paise * Value(Decimal("0.01")), output_field=DecimalField(max_digits=8, decimal_places=2)),
+        )
+
+
 # Product Variant (dynamic type + price + stock)
 class ProductVariant(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="variants")
@@ -34,9 +127,33 @@ class ProductVariant(models.Model):
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
 
+    objects = ProductVariantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Sellable variants of a product, cheapest first (listing, detail, price subqueries)
+            models.Index(fields=["product", "price"], condition=Q(is_active=True, stock__gt=0), name="variant_in_stock_idx"),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.variant_type} (₹{self.price}, Stock: {self.stock})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember pricing fields, so stock-only saves can skip the effective price refresh
+        instance._loaded_pricing = instance.pricing_state()
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Read by post_save receivers (offer and catalog cache refreshes)
+        self.pricing_changed = self._state.adding or getattr(self, "_loaded_pricing", None) != self.pricing_state()
+        super().save(*args, **kwargs)
+        self._loaded_pricing = self.pricing_state()
+
+    def pricing_state(self):
+        return (self.__dict__.get("price"), self.__dict__.get("is_active"), self.__dict__.get("product_id"))
+
     def main_image(self):
         """Return first image of the variant as main image"""
         return self.images.first()
@@ -45,8 +162,9 @@ class ProductVariant(models.Model):
     #  for every where --best offer info
     @property
     def best_offer_info(self):
-        from offer.utils import get_best_offer
-        return get_best_offer(self)
+        # Memoized per instance and per request, see offer.utils.get_cached_best_offer
+        from offer.utils import get_cached_best_offer
+        return get_cached_best_offer(self)
 
     @property
     def discounted_price(self):
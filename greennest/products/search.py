@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+
+# Product search.
+# PostgreSQL: Product.search_vector (name > category > light requirement > description)
+# is kept up to date by products/signals.py and GIN indexed, names also have a trigram
+# index for typos/partial words. Results are ranked by full-text rank + name similarity.
+# Other databases (SQLite locally) get SimpleSearchBackend: icontains, same interface.
+SEARCH_CONFIG = "english"
+
+
+class PostgresSearchBackend:
+
+    def _vector(self):
+        from django.contrib.postgres.search import SearchVector
+        from .models import Category
+
+        # A subquery, not category__name: UPDATE cannot join
+        category_name = Subquery(Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1])
+        return (
+            SearchVector("name", weight="A", config=SEARCH_CONFIG)
+            + SearchVector(category_name, weight="B", config=SEARCH_CONFIG)
+            + SearchVector("light_requirement", weight="C", config=SEARCH_CONFIG)
+            + SearchVector("description", weight="D", config=SEARCH_CONFIG)
+        )
+
+    def update_index(self, product_ids=None, category_ids=None):
+        from .models import Product
+
+        products = Product.objects.all()
+        if product_ids is not None:
+            products = products.filter(id__in=product_ids)
+        if category_ids is not None:
+            products = products.filter(category_id__in=category_ids)
+        return products.update(search_vector=self._vector())
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+
+        search_query = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+        return queryset.filter(
+            Q(search_vector=search_query)
+            | Q(name__trigram_word_similar=query)
+            | Q(name__icontains=query)
+        ).annotate(
+            # Coalesce: a NULL vector (not indexed yet) would sort first under DESC
+            search_rank=Coalesce(SearchRank(F("search_vector"), search_query), Value(0.0))
+            + TrigramWordSimilarity(query, "name"),
+        ).order_by("-search_rank", "-id")
+
+
+class SimpleSearchBackend:
+    """icontains over the same fields; every word has to match somewhere. For SQLite/local use."""
+
+    fields = ("name", "category__name", "light_requirement", "description")
+
+    def update_index(self, product_ids=None, category_ids=None):
+        return 0
+
+    def search(self, queryset, query):
+        for word in query.split():
+            match = Q()
+            for field in self.fields:
+                match |= Q(**{f"{field}__icontains": word})
+            queryset = queryset.filter(match)
+        return queryset.annotate(
+            search_rank=Case(
+                When(name__icontains=query, then=Value(1.0)),
+                When(category__name__icontains=query, then=Value(0.5)),
+                default=Value(0.1),
+                output_field=FloatField(),
+            )
+        ).order_by("-search_rank", "-id")
+
+
+def get_search_backend():
+    # settings.PRODUCT_SEARCH_BACKEND = "dotted.path.Backend" overrides the vendor default
+    backend_path = getattr(settings, "PRODUCT_SEARCH_BACKEND", None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return SimpleSearchBackend()
+
+
+def search_products(queryset, query):
+    """Filter a Product queryset by a search string, best matches first (annotates search_rank)."""
+    query = (query or "").strip()
+    if not query:
+        return queryset
+    return get_search_backend().search(queryset, query)
+
+
+def update_search_index(product_ids=None, category_ids=None):
+    return get_search_backend().update_index(product_ids=product_ids, category_ids=category_ids)
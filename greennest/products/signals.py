@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Category, Product, ProductVariant, VariantImage
+from .search import update_search_index
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=VariantImage)
+@receiver(post_delete, sender=VariantImage)
+def catalog_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+# Stock-only saves (every order) keep the catalog caches
+@receiver(post_save, sender=ProductVariant)
+def variant_changed(sender, instance, **kwargs):
+    if getattr(instance, "pricing_changed", True):
+        transaction.on_commit(bump_catalog_version)
+
+
+# Keep Product.search_vector in step with the searched fields (no-op outside PostgreSQL)
+@receiver(post_save, sender=Product)
+def product_search_changed(sender, instance, **kwargs):
+    update_search_index(product_ids=[instance.id])
+
+
+@receiver(post_save, sender=Category)
+def category_search_changed(sender, instance, created, **kwargs):
+    if not created:
+        update_search_index(category_ids=[instance.id])
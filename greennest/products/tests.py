@@ -1,3 +1,123 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Exists, OuterRef
 from django.test import TestCase
+from django.utils import timezone
+
+from greennest.testing import ExplainTestCase
+from offer.models import CategoryOffer, ProductOffer, VariantEffectivePrice
+from offer.utils import _apply_best_offer
+from .facets import get_facets
+from .models import Category, Product, ProductVariant
+
+
+class VariantIndexTests(ExplainTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Ferns")
+        cls.product = Product.objects.create(category=category, name="Boston fern")
+        ProductVariant.objects.create(product=cls.product, variant_type="Small", price=199, stock=3)
+        ProductVariant.objects.create(product=cls.product, variant_type="Large", price=499, stock=0)
+
+    def test_in_stock_variants_of_a_product(self):
+        variants = ProductVariant.objects.filter(product=self.product, is_active=True, stock__gt=0).order_by("price")
+        self.assertUsesIndex(variants, "variant_in_stock_idx")
+
+
+class EffectivePriceTests(TestCase):
+    # (price, product offer %, category offer %), None = no offer
+    CASES = [
+        ("199.00", None, None),
+        ("199.00", 10, None),
+        ("199.00", None, 10),
+        ("199.00", 10, 10),       # tie: product offer wins
+        ("199.00", 5, 20),
+        ("199.00", 20, 5),
+        # 1-90% clamp
+        ("199.00", 0, None),
+        ("199.00", 1, None),
+        ("199.00", 90, None),
+        ("199.00", 91, None),
+        ("199.00", 91, 5),
+        ("199.00", 5, 91),
+        ("199.00", 95, 95),
+        ("199.00", 0, 0),
+        # round half-even to paise
+        ("10.05", 50, None),      # 5.025 -> 5.02
+        ("10.15", 50, None),      # 5.075 -> 5.08
+        ("12.50", 1, None),       # 12.375 -> 12.38
+        ("0.30", 25, None),       # 0.225 -> 0.22
+        ("0.10", None, 25),       # 0.075 -> 0.08
+        ("0.00", None, 10),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        window = {"start_date": now - timedelta(days=1), "end_date": now + timedelta(days=1)}
+        cls.expected = {}
+        for n, (price, product_discount, category_discount) in enumerate(cls.CASES):
+            category = Category.objects.create(name=f"Category {n}")
+            product = Product.objects.create(category=category, name=f"Plant {n}")
+            variant = ProductVariant.objects.create(product=product, variant_type="Pot", price=Decimal(price), stock=1)
+            if product_discount is not None:
+                ProductOffer.objects.create(product=product, discount_percentage=product_discount, **window)
+            if category_discount is not None:
+                CategoryOffer.objects.create(category=category, discount_percentage=category_discount, **window)
+            cls.expected[variant.id] = _apply_best_offer(Decimal(price), product_discount, category_discount)
+
+    def test_sql_annotation_matches_python_rules(self):
+        for variant in ProductVariant.objects.with_effective_price():
+            expected = self.expected[variant.id]
+            with self.subTest(price=variant.price, case=self.CASES[list(self.expected).index(variant.id)]):
+                self.assertEqual(variant.final_price, expected["final_price"])
+                self.assertEqual(variant.best_discount, expected["discount"])
+                self.assertEqual(variant.best_offer_type, expected["offer_type"])
+
+
+class FacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        indoor = Category.objects.create(name="Indoor")
+        outdoor = Category.objects.create(name="Outdoor")
+        now = timezone.now()
+
+        def product(name, category, light, *variants):
+            product = Product.objects.create(name=name, category=category, light_requirement=light)
+            for price, stock in variants:
+                ProductVariant.objects.create(product=product, variant_type=f"{price}", price=Decimal(price), stock=stock)
+            return product
+
+        product("Snake plant", indoor, "Low", ("200", 3), ("800", 0))  # the 800 one is out of stock
+        product("Fiddle leaf", indoor, "Bright", ("600", 2))
+        hosta = product("Hosta", outdoor, "Low", ("1200", 1))
+        product("Lavender", outdoor, "Medium", ("300", 5))
+        product("Rose", outdoor, "Low", ("150", 0))  # nothing in stock: not listed
+        ProductOffer.objects.create(
+            product=hosta, discount_percentage=50, start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+        )
+
+    def listed(self):
+        # The listing queryset before its sidebar filters, as user_product_list builds it
+        in_stock = VariantEffectivePrice.objects.filter(variant__product=OuterRef("pk"), variant__stock__gt=0)
+        return Product.objects.filter(Exists(in_stock), is_active=True)
+
+    def test_counts_and_bounds(self):
+        with self.assertNumQueries(1):
+            facets = get_facets(self.listed())
+        self.assertEqual(facets["categories"], {"Indoor": 2, "Outdoor": 2})
+        self.assertEqual(facets["lights"], {"Low": 2, "Bright": 1, "Medium": 1})
+        self.assertEqual([bucket["count"] for bucket in facets["price_buckets"]], [1, 1, 2, 0])
+        # Offer price of the Hosta (600), stocked variants only for the Snake plant (200)
+        self.assertEqual(facets["price_bounds"], {"min": Decimal("200"), "max": Decimal("600")})
 
-# Create your tests here.
+    def test_each_facet_ignores_its_own_filter(self):
+        facets = get_facets(self.listed(), categories=["Outdoor"], lights=["Low"], min_price="250", max_price="700")
+        self.assertEqual(facets["categories"], {"Outdoor": 1})
+        self.assertEqual(facets["lights"], {"Low": 1, "Medium": 1})
+        # Buckets and bounds ignore the price filter
+        self.assertEqual([bucket["count"] for bucket in facets["price_buckets"]], [0, 0, 1, 0])
+        self.assertEqual(facets["price_bounds"], {"min": Decimal("600"), "max": Decimal("600")})
@@ -5,12 +5,15 @@ from django.views.decorators.cache import never_cache
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.http import JsonResponse
-from django.db.models import Min, Max, Prefetch
+from django.db.models import Exists, OuterRef, Prefetch, Subquery
 
 from cart.models import Cart
 from wishlist.models import WishlistItem
 from .models import Product, ProductVariant, Category
-from offer.utils import get_best_offer
+from .facets import LIGHT_CHOICES, get_facets
+from .search import search_products
+from offer.models import VariantEffectivePrice
+from offer.utils import attach_best_offers
 
 
 @login_required(login_url='user_login')
@@ -24,18 +27,28 @@ def user_product_list(request):
     max_price = request.GET.get("max_price")
     sort_option = request.GET.get("sort", "")
 
-    # Prefetch variants with stock
+    # In-stock sellable variants, priced from the materialized offer table
+    # (kept current by offer signals and the worker's every-minute offer.tasks refresh)
+    sellable_variants = VariantEffectivePrice.objects.filter(
+        variant__product=OuterRef("pk"), variant__stock__gt=0
+    )
+    listed_variants = sellable_variants
+    if min_price:
+        listed_variants = listed_variants.filter(final_price__gte=min_price)
+    if max_price:
+        listed_variants = listed_variants.filter(final_price__lte=max_price)
+
+    # Prefetch variants with stock, cheapest (after offers) first
     variant_qs = ProductVariant.objects.filter(
         is_active=True, stock__gt=0
-    ).order_by("price")
+    ).order_by("effective_price__final_price", "price").prefetch_related("images")
 
     products = Product.objects.filter(
+        Exists(sellable_variants),
         is_active=True,
-        variants__stock__gt=0
     ).prefetch_related(
         Prefetch("variants", queryset=variant_qs, to_attr="available_variants"),
-        "variants__images"
-    ).distinct()
+    )
 
     # Wishlist variant ids
     wishlist_variant_ids = []
@@ -44,17 +57,17 @@ def user_product_list(request):
 
     # Filters
     if search_query:
-        products = products.filter(name__icontains=search_query)
+        products = search_products(products, search_query)
+    # Sidebar facets are counted before the sidebar's own filters
+    facet_products = products
+    if min_price or max_price:
+        products = products.filter(Exists(listed_variants))
     if categories:
         products = products.filter(category__name__in=categories)
     if sizes:
         products = products.filter(size__in=sizes)
     if lights:
         products = products.filter(light_requirement__in=lights)
-    if min_price:
-        products = products.filter(variants__price__gte=min_price).distinct()
-    if max_price:
-        products = products.filter(variants__price__lte=max_price).distinct()
 
     # Sorting
     if sort_option == "name_asc":
@@ -62,15 +75,26 @@ def user_product_list(request):
     elif sort_option == "name_desc":
         products = products.order_by("-name")
     elif sort_option == "price_asc":
-        products = products.annotate(min_price=Min("variants__price")).order_by("min_price")
+        products = products.annotate(
+            min_price=Subquery(listed_variants.order_by("final_price").values("final_price")[:1])
+        ).order_by("min_price")
     elif sort_option == "price_desc":
-        products = products.annotate(max_price=Max("variants__price")).order_by("-max_price")
+        products = products.annotate(
+            max_price=Subquery(listed_variants.order_by("-final_price").values("final_price")[:1])
+        ).order_by("-max_price")
 
     # Pagination
     page = request.GET.get("page", 1)
     paginator = Paginator(products, 9)
     page_obj = paginator.get_page(page)
 
+    # Resolve offers for the whole page at once
+    attach_best_offers(
+        product.available_variants[0]
+        for product in page_obj
+        if getattr(product, "available_variants", None)
+    )
+
     # AJAX Load More
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         data = []
@@ -120,7 +144,14 @@ def user_product_list(request):
 
 
     # Pass context for normal render
-    all_categories = Category.objects.filter(is_active=True)
+    facets = get_facets(facet_products, categories, lights, min_price, max_price)
+    all_categories = list(Category.objects.filter(is_active=True))
+    for category in all_categories:
+        category.product_count = facets["categories"].get(category.name, 0)
+    light_options = [
+        {"value": value, "label": label, "count": facets["lights"].get(value, 0)}
+        for value, label in LIGHT_CHOICES
+    ]
    
     context = {
         "products": page_obj,
@@ -133,7 +164,9 @@ def user_product_list(request):
         "max_price": max_price,
         "sort_option": sort_option,
         "wishlist_variant_ids": list(wishlist_variant_ids),
-        
+        "light_options": light_options,
+        "price_buckets": facets["price_buckets"],
+        "price_bounds": facets["price_bounds"],
     }
     return render(request, "user/product_list.html", context)
 
@@ -148,7 +181,10 @@ def user_product_detail(request, pk):
 
     # Variants ordered by price
     variants = product.variants.filter(is_active=True).order_by("price").prefetch_related("images")
-    cheapest_variant = variants.first()
+    cheapest_variant = variants[0] if variants else None
+
+    # One offer resolution for every variant shown on the page
+    attach_best_offers(variants)
 
     # Best offer for cheapest variant
     best_offer = cheapest_variant.best_offer_info if cheapest_variant else None
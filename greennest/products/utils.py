@@ -0,0 +1,46 @@
+from django.db.models import OuterRef, Prefetch, Subquery
+
+from offer.utils import attach_best_offers
+from .models import Product, ProductVariant, VariantImage
+
+
+def get_featured_products(limit=12):
+    """
+    Newest sellable products with their cheapest active variant, its first image and best offer.
+    Three queries whatever the limit (offers come from the in-process offer index).
+    """
+    cheapest_variant = ProductVariant.objects.filter(
+        product=OuterRef("pk"), is_active=True
+    ).order_by("price", "id").values("id")[:1]
+
+    variant_ids = list(
+        Product.objects.filter(is_active=True, category__is_active=True)
+        .annotate(featured_variant_id=Subquery(cheapest_variant))
+        .filter(featured_variant_id__isnull=False)
+        .order_by("-created_at", "-id")
+        .values_list("featured_variant_id", flat=True)[:limit]
+    )
+
+    variants = {
+        variant.id: variant
+        for variant in ProductVariant.objects.filter(id__in=variant_ids)
+        .select_related("product__category")
+        .prefetch_related(Prefetch("images", queryset=VariantImage.objects.order_by("id"), to_attr="ordered_images"))
+    }
+    offers = attach_best_offers(variants.values())
+
+    featured = []
+    for variant_id in variant_ids:
+        variant = variants.get(variant_id)
+        if variant is None:
+            continue
+        offer_info = offers[variant_id]
+        featured.append({
+            "product": variant.product,
+            "variant": variant,
+            "image": variant.ordered_images[0] if variant.ordered_images else None,
+            "original_price": variant.price,
+            "final_price": offer_info["final_price"],
+            "discount": offer_info["discount"],
+        })
+    return featured
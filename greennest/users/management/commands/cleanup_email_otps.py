@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.models import EmailOTP
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the rows left in users_emailotp now that OTPs live in the cache, a batch per statement "
+        "so the table is never locked for long. Safe to run repeatedly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows deleted per statement.")
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        deleted = 0
+        while True:
+            ids = list(EmailOTP.objects.order_by("id").values_list("id", flat=True)[:options["batch_size"]])
+            if not ids:
+                break
+            count, _ = EmailOTP.objects.filter(id__in=ids).delete()
+            deleted += count
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} OTP row(s)."))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:05
+
+from django.db import migrations
+
+
+# Trigram indexes for the admin user/order searches, PostgreSQL only.
+# icontains compiles to UPPER(col::text) LIKE UPPER('%q%'), so the index is on that expression.
+TRGM_INDEXES = {
+    "users_user_first_name_trgm": "first_name",
+    "users_user_last_name_trgm": "last_name",
+    "users_user_email_trgm": "email",
+    "users_user_username_trgm": "username",
+}
+
+
+def create_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, column in TRGM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON users_user USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRGM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_profile_avatar'),
+        # pg_trgm is created there
+        ('products', '0010_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
@@ -15,6 +15,8 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+# No longer written: OTPs are kept in the cache (users/otp.py). Rows left from before
+# are removed by `manage.py cleanup_email_otps`.
 class EmailOTP(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     otp = models.CharField(max_length=6)
@@ -0,0 +1,146 @@
+import math
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+
+# Email OTPs live in the cache, not the users_emailotp table: one key per user, written
+# with the OTP's lifetime as its timeout, so expiry is the cache's job and a signup storm
+# makes no database writes. Only an HMAC of the code is stored, and a code is used up by
+# whoever deletes the key first. The code itself is made by the job that mails it
+# (users/tasks.py), so the plain code is never written anywhere. Sending and checking codes are rate limited per user and
+# per client IP with token buckets (RateLimit below).
+OTP_TTL = getattr(settings, "OTP_TTL_SECONDS", 60)
+
+# A store of its own, so page and catalog churn cannot evict live codes or reset limits
+cache = caches["otp"]
+
+
+class RateLimit:
+    """
+    Token bucket, `count` tokens per `period` seconds holding at most `burst`, kept in the
+    cache as a GCRA "theoretical arrival time" (one float per key). Read-then-write, not a
+    compare-and-swap: requests racing on the same key can overshoot by the number in flight.
+    """
+
+    def __init__(self, name, count, period, burst=None):
+        self.name = name
+        self.interval = period / count
+        self.burst = burst or count
+
+    def _key(self, key):
+        return f"ratelimit:{self.name}:{key}"
+
+    def _next(self, key, now):
+        tat = max(cache.get(self._key(key), now), now) + self.interval
+        return tat, tat - now - self.interval * self.burst
+
+    def wait(self, key, now=None):
+        """Seconds until `key` has a token (0 when it has one now), without taking it."""
+        _, wait = self._next(key, now or time.time())
+        return max(0, wait)
+
+    def take(self, key, now=None):
+        now = now or time.time()
+        tat, wait = self._next(key, now)
+        if wait > 0:
+            return wait
+        cache.set(self._key(key), tat, math.ceil(tat - now))
+        return 0
+
+
+SEND_PER_USER = RateLimit("otp-send-user", count=1, period=60)                  # a new code a minute, as before
+SEND_PER_IP = RateLimit("otp-send-ip", count=20, period=60 * 60, burst=10)
+VERIFY_PER_USER = RateLimit("otp-verify-user", count=5, period=OTP_TTL)       # 5 guesses per code lifetime
+VERIFY_PER_IP = RateLimit("otp-verify-ip", count=60, period=60 * 60, burst=20)
+
+OTP_VALID = "valid"
+OTP_INVALID = "invalid"
+OTP_EXPIRED = "expired"
+
+
+class OTPRateLimited(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = math.ceil(retry_after)
+        super().__init__(f"Too many attempts, try again in {self.retry_after} seconds")
+
+
+def _take_all(*limits):
+    # Take a token from every (limit, key) or from none of them
+    limits = [(limit, key) for limit, key in limits if key is not None]
+    wait = max((limit.wait(key) for limit, key in limits), default=0)
+    if wait > 0:
+        raise OTPRateLimited(wait)
+    for limit, key in limits:
+        limit.take(key)
+
+
+def _otp_key(user):
+    return f"otp:{user.pk}"
+
+
+def _digest(user, otp):
+    return salted_hmac("users.otp", f"{user.pk}:{otp}").hexdigest()
+
+
+def client_ip(request):
+    """
+    The client's address for the per-IP limits, from the META key OTP_CLIENT_IP_HEADER names.
+    None (no per-IP limits, the per-user ones still apply) when it is not configured.
+    """
+    header = getattr(settings, "OTP_CLIENT_IP_HEADER", None)
+    if not header:
+        return None
+    # X-Forwarded-For style lists: the last address is the one our own proxy added
+    return request.META.get(header, "").split(",")[-1].strip() or None
+
+
+def issue_otp(user):
+    """A new OTP for `user`, the previous one stops working. Only its HMAC is kept."""
+    otp = f"{secrets.randbelow(9000) + 1000}"
+    cache.set(_otp_key(user), _digest(user, otp), OTP_TTL)
+    return otp
+
+
+def send_otp(user, email=None, ip=None):
+    """Queue a mail with a new OTP for `user` to `email` (default their address). Raises OTPRateLimited."""
+    from .tasks import send_otp_email
+
+    _take_all((SEND_PER_USER, user.pk), (SEND_PER_IP, ip))
+    send_otp_email.enqueue(user.pk, email or user.email)
+
+
+def prune_expired():
+    """
+    Delete the expired entries of a file based otp store, the number deleted. FileBasedCache
+    only drops an expired file when that key is read again, and most never are (abandoned
+    signups, idle rate limit buckets): without this the store fills up with dead entries
+    until a cull evicts live codes at random. Other backends expire entries themselves.
+    """
+    if not isinstance(cache, FileBasedCache):
+        return 0
+    pruned = 0
+    for name in cache._list_cache_files():
+        try:
+            with open(name, "rb") as f:
+                pruned += cache._is_expired(f)  # deletes the file when it is
+        except FileNotFoundError:
+            pass  # used up or pruned by someone else meanwhile
+    return pruned
+
+
+def verify_otp(user, otp, ip=None):
+    """OTP_VALID (and the code is used up), OTP_INVALID or OTP_EXPIRED. Raises OTPRateLimited."""
+    _take_all((VERIFY_PER_USER, user.pk), (VERIFY_PER_IP, ip))
+    digest = cache.get(_otp_key(user))
+    if digest is None:
+        return OTP_EXPIRED
+    if not constant_time_compare(digest, _digest(user, otp)):
+        return OTP_INVALID
+    # One use: of two requests with the right code, only the one that deletes the key wins
+    return OTP_VALID if cache.delete(_otp_key(user)) else OTP_EXPIRED
+
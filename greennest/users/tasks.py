@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+
+from jobs.queue import PRIORITY_HIGH, task
+from mailer.sender import send_message
+from .otp import issue_otp, prune_expired
+
+
+# Mail sent off the request path, run by `manage.py run_worker`.
+@task("users.send_otp_email", priority=PRIORITY_HIGH, max_attempts=3, retry_delay=5)
+def send_otp_email(user_id, email):
+    # The code is made when the mail goes out, so it is never stored in the queue: a resend
+    # (or a retry) replaces it and only the newest code works
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    otp = issue_otp(user)
+    send_message(email, "Your OTP Code", f"Your OTP is {otp}. It expires in 1 minute.")
+
+
+# Run by the worker every minute: keeps the otp store down to its live codes and buckets
+@task("users.prune_otp_cache", max_attempts=1, every=60)
+def prune_otp_cache():
+    prune_expired()
@@ -1,3 +1,145 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import RequestFactory, TestCase, override_settings
+
+from jobs.models import Job
+from jobs.worker import claim, run_job, schedule_periodic_tasks
+from .models import User
+from .otp import (
+    OTP_EXPIRED, OTP_INVALID, OTP_VALID, SEND_PER_USER, OTPRateLimited, RateLimit, _take_all, client_ip, issue_otp,
+    prune_expired, send_otp, verify_otp,
+)
+
+
+class OTPCacheMixin:
+    # A private in-memory store per test, instead of the shared "otp" cache
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("users.otp.cache", LocMemCache(f"otp-{self.id()}", {}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class RateLimitTests(OTPCacheMixin, TestCase):
+
+    def test_burst_then_one_token_per_interval(self):
+        limit = RateLimit("test", count=2, period=60)
+        self.assertEqual([limit.take("k", now=1000), limit.take("k", now=1000)], [0, 0])
+        self.assertAlmostEqual(limit.take("k", now=1000), 30)
+        self.assertAlmostEqual(limit.take("k", now=1010), 20)
+        self.assertEqual(limit.take("k", now=1030), 0)
+
+    def test_wait_does_not_take(self):
+        limit = RateLimit("test", count=1, period=60)
+        self.assertEqual(limit.wait("k", now=1000), 0)
+        self.assertEqual(limit.take("k", now=1000), 0)
+        self.assertAlmostEqual(limit.wait("k", now=1000), 60)
+        self.assertAlmostEqual(limit.wait("k", now=1000), 60)
+
+    def test_keys_are_separate(self):
+        limit = RateLimit("test", count=1, period=60)
+        self.assertEqual(limit.take("a", now=1000), 0)
+        self.assertEqual(limit.take("b", now=1000), 0)
+
+    def test_take_all_takes_from_none_when_one_is_empty(self):
+        user_limit = RateLimit("user", count=1, period=60)
+        ip_limit = RateLimit("ip", count=1, period=60)
+        ip_limit.take("1.2.3.4")
+        with self.assertRaises(OTPRateLimited):
+            _take_all((user_limit, 1), (ip_limit, "1.2.3.4"))
+        self.assertEqual(user_limit.wait(1), 0)
+
+    def test_take_all_skips_missing_keys(self):
+        ip_limit = RateLimit("ip", count=1, period=60)
+        ip_limit.take("1.2.3.4")
+        _take_all((RateLimit("user", count=1, period=60), 1), (ip_limit, None))
+
+
+class OTPTests(OTPCacheMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="otp", email="otp@example.com", password="x")
+
+    def test_code_works_once(self):
+        otp = issue_otp(self.user)
+        self.assertEqual(verify_otp(self.user, otp), OTP_VALID)
+        self.assertEqual(verify_otp(self.user, otp), OTP_EXPIRED)
+
+    def test_wrong_code(self):
+        otp = issue_otp(self.user)
+        self.assertEqual(verify_otp(self.user, "0000" if otp != "0000" else "1111"), OTP_INVALID)
+        self.assertEqual(verify_otp(self.user, otp), OTP_VALID)
+
+    def test_new_code_replaces_the_old_one(self):
+        old = issue_otp(self.user)
+        new = issue_otp(self.user)
+        if old != new:
+            self.assertEqual(verify_otp(self.user, old), OTP_INVALID)
+        self.assertEqual(verify_otp(self.user, new), OTP_VALID)
+
+    def test_guesses_are_limited(self):
+        otp = issue_otp(self.user)
+        wrong = "0000" if otp != "0000" else "1111"
+        for _ in range(5):
+            verify_otp(self.user, wrong)
+        with self.assertRaises(OTPRateLimited):
+            verify_otp(self.user, otp)
+
+    def test_send_queues_a_mail_job_without_the_code(self):
+        send_otp(self.user)
+        job = Job.objects.get(task="users.send_otp_email")
+        self.assertEqual(job.args, [self.user.pk, "otp@example.com"])
+
+    def test_one_send_a_minute(self):
+        send_otp(self.user)
+        with self.assertRaises(OTPRateLimited) as raised:
+            send_otp(self.user, email="new@example.com")
+        self.assertLessEqual(raised.exception.retry_after, SEND_PER_USER.interval)
+        self.assertEqual(Job.objects.filter(task="users.send_otp_email").count(), 1)
+
+
+class ClientIPTests(TestCase):
+
+    def test_no_header_configured_means_no_ip(self):
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+        with override_settings(OTP_CLIENT_IP_HEADER=None):
+            self.assertIsNone(client_ip(request))
+
+    @override_settings(OTP_CLIENT_IP_HEADER="HTTP_X_FORWARDED_FOR")
+    def test_last_address_of_the_trusted_header(self):
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 203.0.113.7")
+        self.assertEqual(client_ip(request), "203.0.113.7")
+        self.assertIsNone(client_ip(RequestFactory().get("/", REMOTE_ADDR="10.0.0.1")))
+
+
+class PruneOTPCacheTests(TestCase):
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.cache = FileBasedCache(location, {})
+        patcher = mock.patch("users.otp.cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_worker_deletes_expired_entries_only(self):
+        self.cache.set("otp:1", "digest", 0)  # expired as soon as written
+        self.cache.set("ratelimit:otp-send-ip:1.2.3.4", 1000.0, 0)
+        self.cache.set("otp:2", "digest", 60)
+        self.assertEqual(len(self.cache._list_cache_files()), 3)
+
+        schedule_periodic_tasks()
+        for job_id in claim("w1", 10):
+            run_job(job_id)
+
+        self.assertEqual(len(self.cache._list_cache_files()), 1)
+        self.assertEqual(self.cache.get("otp:2"), "digest")
+
+    def test_other_backends_are_left_alone(self):
+        with mock.patch("users.otp.cache", LocMemCache("otp-prune", {})):
+            self.assertEqual(prune_expired(), 0)
@@ -1,4 +1,3 @@
-import random
 import re
 
 from django.urls import reverse
@@ -7,9 +6,6 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import never_cache
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth import authenticate, get_user_model, login, logout
-from django.core.mail import send_mail
-from django.utils import timezone
-from datetime import timedelta
 from django.contrib import messages
 from django.http import JsonResponse
 from datetime import datetime
@@ -17,15 +13,23 @@ from django.contrib.auth import update_session_auth_hash
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.core.signing import Signer, BadSignature
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from coupon.services import create_referral_coupon
 
-from .models import EmailOTP,Profile, Address
+from .models import Profile, Address
+from .otp import OTP_EXPIRED, OTP_VALID, OTPRateLimited, client_ip, send_otp, verify_otp as verify_otp_code
 from products.models import Product, ProductVariant
-from offer.models import ProductOffer, CategoryOffer
+from products.cache import catalog_version, catalog_cache_timeout
+from products.utils import get_featured_products
 
 User = get_user_model()  
 signer = Signer()
 
+FEATURED_PRODUCTS_LIMIT = 12  # three carousel slides on the home page
+
 def user_signup(request):
     if request.user.is_authenticated:
         return redirect('user_home')
@@ -56,17 +60,21 @@ def user_signup(request):
             messages.error(request, "Email is already registered.")
             return redirect('user_signup')
         
-        user = User.objects.create(
-            username=email,   
-            email=email,
-            first_name=name,  
-            password=make_password(password),  
-            is_active=False  
-        )
+        try:
+            with transaction.atomic():
+                user = User.objects.create(
+                    username=email,   
+                    email=email,
+                    first_name=name,  
+                    password=make_password(password),  
+                    is_active=False  
+                )
+                send_otp(user, ip=client_ip(request))
+        except OTPRateLimited as e:
+            messages.error(request, f"Too many sign ups from your network. Please try again in {e.retry_after} seconds.")
+            return redirect('user_signup')
         # Store user id in session
         request.session['pending_user_id'] = user.id
-        
-        send_otp_email(user) 
 
         # --- handle referral ---
         if invite_token:
@@ -90,17 +98,6 @@ def generate_invite_link(request):
     return render(request, "users/invite.html", {"invite_url": invite_url})
 
 
-def send_otp_email(user):
-    otp = f"{random.randint(1000, 9999)}"
-    print(otp)
-    EmailOTP.objects.update_or_create(user=user, defaults={'otp': otp, 'created_at': timezone.now()})
-    send_mail(
-        "Your OTP Code",
-        f"Your OTP is {otp}. It expires in 1 minute.",
-        "greennest.ecom@gmail.com",
-        [user.email],
-    )
-
 def verify_otp(request):
     # redirect to signup if no session
     user_id = request.session.get('pending_user_id')
@@ -109,7 +106,6 @@ def verify_otp(request):
     
 
     user = get_object_or_404(User, pk=user_id)
-    otp_obj = get_object_or_404(EmailOTP, user=user)
 
     if request.method == "POST":
         entered_otp = (
@@ -121,16 +117,20 @@ def verify_otp(request):
         if len(entered_otp) != 4:
             messages.error(request, "Please enter the complete 4-digit OTP.")
             return render(request, "users/verify_otp.html")
-        
-        if otp_obj.is_expired():
-            otp_obj.delete()
+
+        try:
+            result = verify_otp_code(user, entered_otp, ip=client_ip(request))
+        except OTPRateLimited as e:
+            messages.error(request, f"Too many attempts. Please try again in {e.retry_after} seconds.")
+            return render(request, "users/verify_otp.html")
+
+        if result == OTP_EXPIRED:
             context = {"otp_expired": True}
             return render(request, "users/verify_otp.html", context)
         
-        if entered_otp == otp_obj.otp:
+        if result == OTP_VALID:
             user.is_active = True
             user.save()
-            otp_obj.delete()
             del request.session['pending_user_id']
             messages.success(request, "Your account has been verified! Please log in.")
             return redirect('user_home')
@@ -149,17 +149,15 @@ def resend_otp_ajax(request):
             return JsonResponse({"success": False, "message": "Session expired. Please sign up again."})
 
         user = get_object_or_404(User, pk=user_id)
-        otp_obj, created = EmailOTP.objects.get_or_create(user=user)
 
-        if otp_obj.created_at and timezone.now() - otp_obj.created_at < timedelta(minutes=1):
-            remaining = 60 - int((timezone.now() - otp_obj.created_at).total_seconds())
+        try:
+            send_otp(user, ip=client_ip(request))
+        except OTPRateLimited as e:
             return JsonResponse({
                 "success": False, 
-                "message": f"Please wait {remaining} seconds before requesting a new OTP.",
-                "remaining": remaining
+                "message": f"Please wait {e.retry_after} seconds before requesting a new OTP.",
+                "remaining": e.retry_after
             })
-
-        send_otp_email(user)
         return JsonResponse({"success": True, "message": "New OTP sent successfully."})
 
     return JsonResponse({"success": False, "message": "Invalid request."})
@@ -197,40 +195,17 @@ def user_logout(request):
 @never_cache
 @login_required(login_url='user_login')
 def user_home(request):
-    products = Product.objects.all()
-
-    product_list = []
-    for product in products:
-        variant = product.variants.first()  
-        if not variant:
-            continue
-
-        # original price
-        price = variant.price
-
-        # check product offer
-        product_offer = ProductOffer.objects.filter(product=product, is_active=True).first()
-        category_offer = CategoryOffer.objects.filter(category=product.category, is_active=True).first()
-
-        discount = 0
-        if product_offer:
-            discount = product_offer.discount_percentage
-        elif category_offer:
-            discount = category_offer.discount_percentage
-
-        final_price = price
-        if discount > 0:
-            final_price = price - (price * discount / 100)
-
-        product_list.append({
-            "product": product,
-            "variant": variant,
-            "original_price": price,
-            "final_price": round(final_price, 2),
-            "discount": discount,
-        })
+    # Featured grid is the same for every user: rendered once per catalog version
+    cache_key = f"user_home:featured:{catalog_version()}"
+    featured_products = cache.get(cache_key)
+    if featured_products is None:
+        featured_products = render_to_string(
+            "users/user_home_featured.html",
+            {"product_list": get_featured_products(limit=FEATURED_PRODUCTS_LIMIT)},
+        )
+        cache.set(cache_key, featured_products, catalog_cache_timeout())
 
-    return render(request, "users/user_home.html", {"product_list": product_list})
+    return render(request, "users/user_home.html", {"featured_products": mark_safe(featured_products)})
 
 def forget_password(request):
     if request.method == "POST":
@@ -241,12 +216,14 @@ def forget_password(request):
         
         try:
             user = User.objects.get(email=email)
-            send_otp_email(user)
+            send_otp(user, ip=client_ip(request))
             request.session['reset_user_id'] = user.id
             messages.success(request, "OTP sent to your email. Please verify to reset your password.")
             return redirect('verify_reset_otp')
         except User.DoesNotExist:
             messages.error(request, "User does not exist.")
+        except OTPRateLimited as e:
+            messages.error(request, f"Please wait {e.retry_after} seconds before requesting a new OTP.")
     
     return render(request, 'users/user_Forget_Password.html')
 
@@ -257,7 +234,6 @@ def verify_reset_otp(request):
         return redirect('forget_password')
 
     user = get_object_or_404(User, pk=user_id)
-    otp_obj = get_object_or_404(EmailOTP, user=user)
     
     if request.method == "POST":
         entered_otp = (
@@ -267,12 +243,17 @@ def verify_reset_otp(request):
             request.POST.get("otp4", "")
         )
 
-        if otp_obj.is_expired():
+        try:
+            result = verify_otp_code(user, entered_otp, ip=client_ip(request))
+        except OTPRateLimited as e:
+            messages.error(request, f"Too many attempts. Please try again in {e.retry_after} seconds.")
+            return render(request, "users/verify_reset_otp.html")
+
+        if result == OTP_EXPIRED:
             context = {"otp_expired": True}
             return render(request, "users/verify_reset_otp.html", context)
 
-        if entered_otp == otp_obj.otp:
-            otp_obj.delete() # OTP verified, delete it
+        if result == OTP_VALID:
             # Add a flag so reset page can be shown
             request.session['otp_verified_for_reset'] = True
             return redirect('reset_password')
@@ -539,33 +520,21 @@ def change_email(request):
             return redirect("change_email")
 
         # 2. Send OTP to new email
+        try:
+            send_otp(request.user, email=new_email, ip=client_ip(request))
+        except OTPRateLimited as e:
+            messages.error(request, f"Please wait {e.retry_after} seconds before requesting a new OTP.")
+            return redirect("change_email")
+
         request.session["pending_email_user_id"] = request.user.id
         request.session["pending_new_email"] = new_email
 
-        # Temporarily create OTP linked to user
-        send_otp_change_email(request.user, override_email=new_email)
-
         messages.info(request, "We sent an OTP to your new email. Please verify.")
         return redirect("verify_email_change_otp")
 
     return render(request, "users/profile_change_email.html")
 
 
-def send_otp_change_email(user, override_email=None):
-    otp = f"{random.randint(1000, 9999)}"
-    EmailOTP.objects.update_or_create(user=user, defaults={'otp': otp, 'created_at': timezone.now()})
-    try:
-        send_mail(
-            "Your OTP Code",
-            f"Your OTP is {otp}. It expires in 1 minute.",
-            "greennest.ecom@gmail.com",
-            [override_email or user.email],
-        )
-        print("[DEBUG] OTP email sent successfully.")
-    except Exception as e:
-        print(f"[ERROR] Failed to send OTP email: {e}")
-
-
 
 @login_required(login_url="user_login")
 @never_cache
@@ -578,7 +547,6 @@ def verify_email_change_otp(request):
         return redirect("update_email")
 
     user = get_object_or_404(User, pk=user_id)
-    otp_obj = get_object_or_404(EmailOTP, user=user)
 
     if request.method == "POST":
         entered_otp = (
@@ -588,18 +556,22 @@ def verify_email_change_otp(request):
             request.POST.get("otp4", "")
         )
 
-        if otp_obj.is_expired():
-            otp_obj.delete()
+        try:
+            result = verify_otp_code(user, entered_otp, ip=client_ip(request))
+        except OTPRateLimited as e:
+            messages.error(request, f"Too many attempts. Please try again in {e.retry_after} seconds.")
+            return render(request, "users/verify_email_change_otp.html")
+
+        if result == OTP_EXPIRED:
             messages.error(request, "OTP expired. Please try again.")
             return redirect("update_email")
 
-        if entered_otp == otp_obj.otp:
+        if result == OTP_VALID:
             # ✅ Update email
             user.email = new_email
             user.username = new_email  # if you use email as username
             user.save()
 
-            otp_obj.delete()
             del request.session["pending_email_user_id"]
             del request.session["pending_new_email"]
 
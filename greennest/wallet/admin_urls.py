@@ -3,5 +3,6 @@ from . import admin_views as views
 
 urlpatterns=[
     path("",views.wallet_list,name="admin_wallet_list"),
-    path("wallet-details/<int:transaction_id>/",views.wallet_detials,name="admin_wallet_details")
+    path("wallet-details/<int:transaction_id>/",views.wallet_detials,name="admin_wallet_details"),
+    path("export/",views.export_wallet_transactions,name="export_wallet_transactions"),
 ]
\ No newline at end of file
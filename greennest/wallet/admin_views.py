@@ -2,7 +2,9 @@ from django.views.decorators.cache import never_cache
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
+from django.utils.dateparse import parse_date
 from .models import Wallet, WalletTransaction
+from greennest.exports import EXPORT_CHUNK_SIZE, export_response
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -19,4 +21,30 @@ def wallet_list(request):
 
 def wallet_detials(request,transaction_id):
     tx = get_object_or_404(WalletTransaction.objects.select_related("wallet__user"), id=transaction_id)
-    return render(request,"admin/wallet_details.html",{"tx":tx})
\ No newline at end of file
+    return render(request,"admin/wallet_details.html",{"tx":tx})
+
+
+# Streamed CSV/XLSX of wallet transactions (?start_date=&end_date=&format=xlsx)
+@user_passes_test(is_admin)
+@never_cache
+def export_wallet_transactions(request):
+    transactions = WalletTransaction.objects.all()
+    try:
+        start_date = parse_date(request.GET.get("start_date") or "")
+        end_date = parse_date(request.GET.get("end_date") or "")
+    except ValueError:
+        # Well formed but no such day (2024-02-30): no date filter, like no dates
+        start_date = end_date = None
+    if start_date:
+        transactions = transactions.filter(created_at__date__gte=start_date)
+    if end_date:
+        transactions = transactions.filter(created_at__date__lte=end_date)
+
+    rows = transactions.order_by("created_at", "id").values_list(
+        "id", "created_at", "wallet__user__email", "transaction_type", "amount", "description",
+    )
+    header = ["ID", "Date", "Email", "Type", "Amount", "Description"]
+    return export_response(
+        header, rows.iterator(chunk_size=EXPORT_CHUNK_SIZE), "wallet_transactions", request.GET.get("format"),
+        title="Wallet transactions",
+    )
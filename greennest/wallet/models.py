@@ -9,11 +9,17 @@ class Wallet(models.Model):
         return f"{self.user.username}'s Wallet - ₹{self.balance}"
 
 class WalletTransaction(models.Model):
-    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="transactions")
+    # Indexed by Meta.indexes (wallet, created_at)
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="transactions", db_index=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     transaction_type = models.CharField(max_length=20, choices=[("credit", "Credit"), ("debit", "Debit")])
     description = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["wallet", "-created_at"], name="wallettx_wallet_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.transaction_type} ₹{self.amount} ({self.wallet.user.username})"
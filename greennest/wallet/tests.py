@@ -1,3 +1,33 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from greennest.testing import ExplainTestCase
+from users.models import User
+from .models import Wallet, WalletTransaction
+
+
+class WalletIndexTests(ExplainTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="saver", email="saver@example.com", password="x")
+        cls.wallet = Wallet.objects.create(user=user, balance=100)
+        WalletTransaction.objects.create(wallet=cls.wallet, amount=100, transaction_type="credit")
+
+    def test_transactions_of_a_wallet(self):
+        self.assertUsesIndex(self.wallet.transactions.order_by("-created_at"), "wallettx_wallet_created_idx")
+
+
+class WalletExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="admin", email="admin@example.com", password="x", is_staff=True)
+        wallet = Wallet.objects.create(user=cls.admin, balance=100)
+        WalletTransaction.objects.create(wallet=wallet, amount=100, transaction_type="credit")
+
+    def test_impossible_date_exports_everything(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("export_wallet_transactions"), {"start_date": "2024-02-30"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b"".join(response.streaming_content).decode().strip().splitlines()), 2)
@@ -5,7 +5,6 @@ from django.contrib import messages
 from .models import Wallet, WalletTransaction
     
 import json
-import razorpay
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
@@ -13,6 +12,7 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from .models import Wallet, WalletTransaction
+from payments.gateway import GatewayError, get_gateway
 
 # Show wallet balance and transactions
 @login_required
@@ -31,12 +31,10 @@ def create_wallet_order(request):
         if amount <= 0:
             return JsonResponse({"error": "Invalid amount"}, status=400)
 
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        razorpay_order = client.order.create({
-            "amount": amount * 100,  # convert rupees to paise
-            "currency": "INR",
-            "payment_capture": "1"
-        })
+        try:
+            razorpay_order = get_gateway().create_order(amount * 100)  # convert rupees to paise
+        except GatewayError:
+            return JsonResponse({"error": "Payment gateway is not responding, please try again."}, status=503)
 
         # Save order in session (or DB if you want to track properly)
         request.session["wallet_recharge_amount"] = amount
@@ -56,10 +54,8 @@ def verify_wallet_payment(request):
     if request.method == "POST":
         data = json.loads(request.body)
 
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-
         try:
-            client.utility.verify_payment_signature({
+            get_gateway().verify_payment_signature({
                 "razorpay_order_id": data["razorpay_order_id"],
                 "razorpay_payment_id": data["razorpay_payment_id"],
                 "razorpay_signature": data["razorpay_signature"]
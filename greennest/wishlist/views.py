@@ -5,20 +5,23 @@ from django.http import JsonResponse
 
 from .models import WishlistItem
 from products.models import ProductVariant
+from offer.utils import get_best_offers
 
 
 @login_required
 @never_cache
 def wishlist_view(request):
-    wishlist_items = WishlistItem.objects.filter(user=request.user)
+    wishlist_items = WishlistItem.objects.filter(user=request.user).select_related("variant__product")
     count = wishlist_items.count()
 
+    # Resolve offers for every wishlist line at once
+    offers = get_best_offers(item.variant for item in wishlist_items)
+
     wishlist_with_prices = []
     for item in wishlist_items:
         variant = item.variant
 
-        # Use centralized property for best offer
-        offer_info = getattr(variant, "best_offer_info", None)
+        offer_info = offers.get(variant.id)
         final_price = offer_info["final_price"] if offer_info else variant.price
 
         wishlist_with_prices.append({